@@ -23,13 +23,23 @@ Where/when ***possible***, both parameters and return values follow this order:
 # Pylint runs from another directory, ignore relative import warnings
 # pylint: disable=W0403
 
+import httplib
 import json
+import socket
+import time
 from autotest.client import utils
 from autotest.client.shared import error
 from images import DockerImages
 from output import OutputGood
 from output import TextTable
 from config import get_as_list
+from lookup import LookupIndex
+from networking import ContainerPort
+import docker_api
+import dockercmd
+import inventory
+import metrics
+import names
 
 
 # Many attributes simply required here
@@ -47,8 +57,15 @@ class DockerContainer(object):  # pylint: disable=R0902
     #: *  size could be None if data was not requested
     #: *  links is either None, or a list of tuple((child,alias))
     #:    strings.
-    __slots__ = ["image_name", "command", "ports", "container_name",
-                 "long_id", "created", "status", "size", "links"]
+    #: Names, links and port list are parsed from raw strings when first
+    #: read, so invalid names raise ``ValueError`` then.
+    __slots__ = ["image_name", "command", "ports", "long_id", "created",
+                 "status", "size", "_raw_name", "_parsed_name",
+                 "_port_list"]
+
+    #: Attributes compared by ``__eq__()``
+    fields = ("image_name", "command", "ports", "container_name",
+              "long_id", "created", "status", "size", "links")
 
     def __init__(self, image_name, command, ports=None, container_name=None):
         """
@@ -67,8 +84,9 @@ class DockerContainer(object):  # pylint: disable=R0902
             self.ports = ''
         else:
             self.ports = ports
-        pcn = self.parse_container_name
-        self.container_name, self.links = pcn(container_name)
+        self._raw_name = container_name
+        self._parsed_name = None
+        self._port_list = None
 
         #: These are typically all generated at runtime
         self.long_id = None
@@ -82,13 +100,65 @@ class DockerContainer(object):  # pylint: disable=R0902
 
         :param other: An instance of this class (or subclass) for comparison.
         """
-        self_val = [getattr(self, name) for name in self.__slots__]
-        other_val = [getattr(other, name) for name in self.__slots__]
+        self_val = [getattr(self, name) for name in self.fields]
+        other_val = [getattr(other, name) for name in self.fields]
         for _self, _other in zip(self_val, other_val):
             if _self != _other:
                 return False
         return True
 
+    # private methods don't need docstrings
+    def _name_links(self):  # pylint: disable=C0111
+        if self._parsed_name is None:
+            self._parsed_name = self.parse_container_name(self._raw_name)
+        return self._parsed_name
+
+    @property
+    def container_name(self):
+        """
+        String name of container, parsed on first access
+        """
+        return self._name_links()[0]
+
+    @container_name.setter
+    def container_name(self, value):
+        # pylint: disable=C0111
+        try:
+            links = self._name_links()[1]
+        except ValueError:
+            links = None
+        self._parsed_name = (value, links)
+
+    @property
+    def links(self):
+        """
+        None or list of (child, alias) tuples, parsed on first access
+        """
+        return self._name_links()[1]
+
+    @links.setter
+    def links(self, value):
+        # pylint: disable=C0111
+        self._parsed_name = (self._name_links()[0], value)
+
+    @property
+    def port_list(self):
+        """
+        List of ``networking.ContainerPort`` for published ``ports``,
+        parsed on first access after ``ports`` changed.
+        """
+        if self._port_list is None or self._port_list[0] != self.ports:
+            parsed = []
+            for portstr in self.ports.split(','):
+                try:
+                    components = ContainerPort.split_to_component(
+                        portstr.strip())
+                except ValueError:
+                    continue  # Not published, or not IPv4
+                parsed.append(ContainerPort(*components))
+            self._port_list = (self.ports, parsed)
+        return self._port_list[1]
+
     def __str__(self):
         """
         Represent instance in a human-readable form
@@ -233,6 +303,14 @@ class DockerContainersBase(object):
         """
         return self.get_container_list()
 
+    def index_containers(self):
+        """
+        Return name and ID indexes of ``list_containers()``
+
+        :return: ``lookup.LookupIndex`` instance
+        """
+        return LookupIndex(self.list_containers(), 'container_name')
+
     def list_containers_with_name(self, container_name):
         """
         Return a python-list of DockerContainer-like instances
@@ -240,8 +318,7 @@ class DockerContainersBase(object):
         :param container_name: String name of container
         :return: Python list of DockerContainer-like instances
         """
-        clist = self.list_containers()
-        return [cnt for cnt in clist if cnt.cmp_name(container_name)]
+        return self.index_containers().with_name(container_name)
 
     def list_containers_with_cid(self, cid):
         """
@@ -250,8 +327,16 @@ class DockerContainersBase(object):
         :param cid: String of long or short container id
         :return: Python list of DockerContainer-like instances
         """
-        clist = self.list_containers()
-        return [cnt for cnt in clist if cnt.cmp_id(cid)]
+        return self.index_containers().with_id(cid)
+
+    def list_containers_with_cids(self, cids):
+        """
+        Return dictionary of each container id to list of its matches
+
+        :param cids: Iterable of long or short container id strings
+        :return: Dictionary of cid to list of DockerContainer-like instances
+        """
+        return self.index_containers().with_ids(cids)
 
     def list_container_ids(self):
         """
@@ -273,6 +358,18 @@ class DockerContainersBase(object):
         del long_id  # Keep pylint quiet
         return None
 
+    def get_containers_metadata(self, long_ids):
+        """
+        Return dictionary of each long_id to its implementation-specific
+        metadata
+
+        :param long_ids: Iterable of container long-id strings
+        :return: Dictionary of long_id to None if invalid/not found or
+                 implementation-specific value
+        """
+        return dict((long_id, self.get_container_metadata(long_id))
+                    for long_id in long_ids)
+
     def json_by_long_id(self, long_id):
         """
         Return json-object for container with long_id if supported by
@@ -313,16 +410,18 @@ class DockerContainersBase(object):
         :param prefix: Name prefix string
         :param suffix: Name suffix string
         :param length: Length of random string (greater than 1)
-        :return: Container name guaranteed to not be in-use.
+        :return: Container name never issued before in this process, and
+                 very unlikely in-use (see
+                 ``dockercmd.DockerCmd.retry_name_conflict``)
         """
         assert length > 1
         if prefix:
             prefix = "%s-%s" % (self.subtest.__class__.__name__, prefix)
         else:
             prefix = self.subtest.__class__.__name__
-        all_containers = [_.container_name for _ in self.list_containers()]
-        check = lambda name: name not in all_containers
-        return utils.get_unique_name(check, prefix, suffix, length)
+        if suffix:
+            suffix = "-%s" % suffix
+        return names.registry.issue(prefix + "-", suffix, length)
 
     def kill_container_by_long_id(self, long_id):
         """
@@ -406,6 +505,28 @@ class DockerContainersBase(object):
         else:
             raise ValueError("Multiple containers with name found: %s" % cnts)
 
+    def remove_many(self, containers):
+        """
+        Remove those of many containers which exist, listing them only once
+
+        :param containers: Iterable of container names, long or short IDs
+        :raise: Same as remove_by_id()
+        :return: Dictionary of each container to None if it didn't exist,
+                 or same value as remove_by_id()
+        """
+        containers = list(containers)
+        result = dict.fromkeys(containers)
+        for container in self._existing_containers(containers):
+            result[container] = self.remove_by_id(container)
+        return result
+
+    # private methods don't need docstrings
+    def _existing_containers(self, containers):  # pylint: disable=C0111
+        index = self.index_containers()
+        return [container for container in containers
+                if index.with_name(container) or
+                (container and index.with_prefix(container))]
+
     def wait_by_long_id(self, long_id):
         """
         Block for container to exit, if not already.
@@ -468,10 +589,26 @@ class DockerContainersCLI(DockerContainersBase):
     #: Extra arguments to use with remove methods
     remove_args = None
 
+    #: Seconds kill and wait methods reuse metadata from
+    #: ``get_containers_metadata()`` or ``get_container_metadata()``, unless
+    #: any docker command which may change containers ran since (see
+    #: ``inventory.generation()``).
+    metadata_ttl = 1.0
+
+    #: Maximum container IDs passed to a single ``docker inspect``, or
+    #: ``docker ps`` re-reading rows of changed containers.
+    inspect_batch = 100
+
+    #: Maximum ``docker rm`` commands ``remove_many()`` runs at once,
+    #: None to use ``docker_batch_workers`` config. option.
+    remove_concurrency = None
+
     def __init__(self, subtest, timeout=120, verbose=False):
         super(DockerContainersCLI, self).__init__(subtest,
                                                   timeout,
                                                   verbose)
+        # long_id -> (inventory generation, time fetched, metadata)
+        self._metadata = {}
 
     def get_container_list(self):
         """
@@ -508,6 +645,14 @@ class DockerContainersCLI(DockerContainersBase):
         texttable = TextTable(stdout_strip)
         return [self._dc_from_row(row) for row in texttable]
 
+    def docker_command(self, cmd):
+        """
+        Return full command line executing docker subcommand cmd
+
+        :param cmd: Command which should be called using docker
+        """
+        return "%s %s" % (self.subtest.config['docker_path'], cmd)
+
     def docker_cmd(self, cmd, timeout=None):
         """
         Called on to execute docker subcommand cmd with timeout
@@ -516,13 +661,22 @@ class DockerContainersCLI(DockerContainersBase):
         :param timeout: Override self.timeout if not None
         :return: autotest.client.utils.CmdResult instance
         """
-        docker_cmd = ("%s %s" % (self.subtest.config['docker_path'],
-                                 cmd))
+        docker_cmd = self.docker_command(cmd)
         if timeout is None:
             timeout = self.timeout
-        return utils.run(docker_cmd,
-                         verbose=self.verbose,
-                         timeout=timeout)
+        try:
+            cmdresult = utils.run(docker_cmd,
+                                  verbose=self.verbose,
+                                  timeout=timeout)
+        except error.CmdError, detail:
+            inventory.command_executed(cmd)
+            # Failed commands take time too
+            metrics.record_result(cmd, getattr(detail, 'result_obj',
+                                               None))
+            raise
+        inventory.command_executed(cmd)
+        metrics.record_result(cmd, cmdresult)
+        return cmdresult
 
     def docker_cmd_check(self, cmd, timeout=None):
         """
@@ -532,9 +686,75 @@ class DockerContainersCLI(DockerContainersBase):
         OutputGood(result)
         return result
 
+    # private methods don't need docstrings
+    def _docker_cmd_overridden(self):  # pylint: disable=C0111
+        docker_cmd = getattr(self.__class__.docker_cmd, 'im_func', None)
+        return docker_cmd is not DockerContainersCLI.docker_cmd.im_func
+
+    # private methods don't need docstrings
+    def _shared_inventory(self):  # pylint: disable=C0111
+        # Overridden docker_cmd() or docker_command() may talk to a
+        # different daemon
+        docker_command = getattr(self.__class__.docker_command, 'im_func',
+                                 None)
+        if (self._docker_cmd_overridden() or
+                docker_command is not
+                DockerContainersCLI.docker_command.im_func):
+            return None
+        return inventory.get_inventory(self.subtest.config)
+
+    # private methods don't need docstrings
+    def _run_many(self, cmds):  # pylint: disable=C0111
+        if not self._docker_cmd_overridden():
+            return dockercmd.run_many(self.subtest, cmds,
+                                      self.remove_concurrency, self.timeout,
+                                      self.docker_command)
+        # Overridden docker_cmd() may run commands some other way
+        cmdresults = []
+        for cmd in cmds:
+            try:
+                cmdresults.append(self.docker_cmd(cmd, self.timeout))
+            except error.CmdError, detail:
+                cmdresults.append(detail.result_obj)
+        return cmdresults
+
     def list_containers(self):
+        shared = self._shared_inventory()
+        if shared is None:
+            return self._list_containers()
+        return shared.list_containers((self.__class__, self.get_size),
+                                      self._list_containers,
+                                      self._list_container_rows)
+
+    def index_containers(self):
+        shared = self._shared_inventory()
+        if shared is None:
+            return LookupIndex(self._list_containers(), 'container_name')
+        return shared.index_containers((self.__class__, self.get_size),
+                                       self._list_containers,
+                                       self._list_container_rows)
+
+    # private methods don't need docstrings
+    def _list_containers(self):  # pylint: disable=C0111
         return self._parse_lines(self.get_container_list())
 
+    # private methods don't need docstrings
+    def _list_container_rows(self, long_ids):  # pylint: disable=C0111
+        # Current rows of a few changed containers, None to list all
+        if len(long_ids) > self.inspect_batch:
+            return None
+        cmd = "ps -a --no-trunc"
+        if self.get_size:
+            cmd += " --size"
+        for long_id in sorted(long_ids):
+            cmd += " --filter id=%s" % long_id
+        try:
+            stdout = self.docker_cmd(cmd, self.timeout).stdout
+        except error.CmdError:
+            return None
+        return [cntr for cntr in self._parse_lines(stdout.strip())
+                if cntr.long_id in long_ids]
+
     def get_container_metadata(self, long_id):
         try:
             cmdresult = self.docker_cmd('inspect "%s"' % str(long_id),
@@ -544,6 +764,7 @@ class DockerContainersCLI(DockerContainersBase):
                 if len(_json) > 0:
                     # No items in _json list should be empty either
                     if all([len(item) > 0 for item in _json]):
+                        self._remember_json(long_id, _json)
                         return _json
             #  failed command, empty list, or empty list item
             return None
@@ -553,6 +774,56 @@ class DockerContainersCLI(DockerContainersBase):
                                   str(details))
             return None
 
+    def get_containers_metadata(self, long_ids):
+        """
+        Inspect many containers with one ``docker inspect`` per
+        ``inspect_batch`` of them.
+
+        :param long_ids: Iterable of container long-ids, short-ids or names
+        :return: Dictionary of each long_id to None if not found, or
+                 same value as ``get_container_metadata()``
+        """
+        long_ids = list(long_ids)
+        result = dict.fromkeys(long_ids)
+        for start in xrange(0, len(long_ids), self.inspect_batch):
+            batch = long_ids[start:start + self.inspect_batch]
+            cmd = 'inspect %s' % ' '.join('"%s"' % str(long_id)
+                                          for long_id in batch)
+            try:
+                stdout = self.docker_cmd(cmd, self.timeout).stdout
+            except error.CmdError, details:
+                # Non-zero exit when any of them wasn't found
+                stdout = getattr(getattr(details, 'result_obj', None),
+                                 'stdout', '')
+            try:
+                items = json.loads(stdout.strip())
+            except (TypeError, ValueError), details:
+                self.subtest.logdebug("docker %s output unparsable: %s",
+                                      cmd, details)
+                continue
+            for item in items:
+                if not item:
+                    continue
+                item_id = item.get('Id', item.get('ID', ''))
+                name = item.get('Name', '').lstrip('/')
+                for long_id in batch:
+                    if long_id == name or (long_id and
+                                           item_id.startswith(long_id)):
+                        result[long_id] = [item]
+                        self._remember_json(long_id, result[long_id])
+        return result
+
+    # private methods don't need docstrings
+    def _remember_json(self, long_id, _json):  # pylint: disable=C0111
+        self._metadata[long_id] = (inventory.generation(), time.time(), _json)
+
+    def _recent_json(self, long_id):  # pylint: disable=C0111
+        cached = self._metadata.get(long_id)
+        if (cached is not None and cached[0] == inventory.generation() and
+                time.time() - cached[1] < self.metadata_ttl):
+            return cached[2]
+        return self.json_by_long_id(long_id)
+
     def json_by_long_id(self, long_id):
         _json = self.get_container_metadata(long_id)
         if _json is None:
@@ -569,7 +840,7 @@ class DockerContainersCLI(DockerContainersBase):
         """
         # Raise KeyError if not found
         try:
-            _json = self.json_by_long_id(long_id)
+            _json = self._recent_json(long_id)
         except TypeError:  # NoneType object blah blah blah
             raise KeyError("Container %s not found" % long_id)
         pid = _json[0]["State"]["Pid"]
@@ -621,6 +892,38 @@ class DockerContainersCLI(DockerContainersBase):
         else:
             return dkrcmd("rm %s" % (image_id), self.timeout)
 
+    def remove_many(self, containers):
+        """
+        Force-remove those of many containers which exist, with their
+        volumes (or with ``remove_args`` when set), running up to
+        ``remove_concurrency`` ``docker rm`` at once.
+
+        :param containers: Iterable of container names, long or short IDs
+        :raise DockerOutputError: When ``verify_output`` is True and output
+                                  of any ``docker rm`` is bad, after all ran.
+        :return: Dictionary of each container to None if it didn't exist,
+                 or its ``autotest.client.utils.CmdResult`` instance
+                 (with non-zero ``exit_status`` if removal failed).
+        """
+        containers = list(containers)
+        # One inspect per inspect_batch, instead of listing all containers
+        metadata = self.get_containers_metadata(containers)
+        existing = [container for container in containers
+                    if metadata[container] is not None]
+        if self.remove_args is not None:
+            remove_args = self.remove_args
+        else:
+            remove_args = "--force --volumes"
+        cmds = ["rm %s %s" % (remove_args, container)
+                for container in existing]
+        cmdresults = self._run_many(cmds)
+        result = dict.fromkeys(containers)
+        result.update(zip(existing, cmdresults))
+        if self.verify_output:
+            for cmdresult in cmdresults:
+                OutputGood(cmdresult)
+        return result
+
     def wait_by_long_id(self, long_id):
         """
         :return: autotest.client.utils.CmdResult instance
@@ -630,7 +933,7 @@ class DockerContainersCLI(DockerContainersBase):
             super(DockerContainersCLI, self).wait_by_long_id(long_id)
         except RuntimeError:
             pass  # expected
-        _json = self.json_by_long_id(long_id)[0]
+        _json = self._recent_json(long_id)[0]
         if not _json["State"]["Running"]:
             return  # already exited
         if self.verify_output:
@@ -640,6 +943,112 @@ class DockerContainersCLI(DockerContainersBase):
         return dkrcmd("wait %s" % (long_id), self.timeout)
 
 
+class DockerContainersAPI(DockerContainersCLI):
+
+    """
+    DockerContainer-like instance collection listed through the remote API
+    at ``docker_socket``, other operations run docker CLI.  Instance
+    ``created`` attributes are unix time integers, and ``command`` is not
+    quoted.  Listing falls back to docker CLI if daemon can't be reached
+    and no ``filters`` are set.
+    """
+
+    #: Dictionary of server-side filter name to list of values applied to
+    #: every listing (e.g. ``{'status': ['exited']}``), None for all.
+    filters = None
+
+    # private methods don't need docstrings
+    def _shared_inventory(self):  # pylint: disable=C0111
+        # Filtered listings aren't the shared ones
+        if self.filters:
+            return None
+        return super(DockerContainersAPI, self)._shared_inventory()
+
+    def get_container_json(self, **filters):
+        """
+        Return list of container dictionaries from ``/containers/json``
+
+        :param filters: Server-side filters in addition to ``filters``
+        :raises ValueError: On daemon error response
+        :raises socket.error: When daemon could not be contacted
+        """
+        merged = dict(self.filters or {})
+        merged.update(filters)
+        params = {'all': 1}
+        if self.get_size:
+            params['size'] = 1
+        if merged:
+            params['filters'] = json.dumps(merged)
+        client = docker_api.get_config_client(self.subtest.config)[0]
+        return docker_api.get_json(client,
+                                   docker_api.query('/containers/json',
+                                                    **params),
+                                   self.timeout)
+
+    # private methods don't need docstrings
+    @staticmethod
+    def _ports_from_json(ports):  # pylint: disable=C0111
+        # Same format as docker ps PORTS column
+        strs = []
+        for port in ports or []:
+            if port.get('IP'):
+                strs.append("%s:%s->%s/%s" % (port['IP'], port['PublicPort'],
+                                              port['PrivatePort'],
+                                              port['Type']))
+            else:
+                strs.append("%s/%s" % (port['PrivatePort'], port['Type']))
+        return ", ".join(strs)
+
+    # private methods don't need docstrings
+    def _dc_from_json(self, item):  # pylint: disable=C0111
+        # Same format as docker ps NAMES column
+        names = ",".join(name.lstrip('/') for name in item['Names'])
+        dcntr = DockerContainer(item['Image'], item['Command'],
+                                self._ports_from_json(item.get('Ports')),
+                                names)
+        dcntr.long_id = item['Id']
+        dcntr.created = item.get('Created')
+        dcntr.status = item.get('Status')
+        if self.get_size:
+            dcntr.size = ("%s B (virtual %s B)"
+                          % (item.get('SizeRw', 0),
+                             item.get('SizeRootFs', 0)))
+        return dcntr
+
+    # private methods don't need docstrings
+    def _list_containers(self, **filters):  # pylint: disable=C0111
+        try:
+            items = self.get_container_json(**filters)
+        except (socket.error, httplib.HTTPException, ValueError), detail:
+            if self.filters:
+                raise
+            self.subtest.logdebug("Listing containers through remote API "
+                                  "failed: %s, using CLI", detail)
+            return super(DockerContainersAPI, self)._list_containers()
+        return [self._dc_from_json(item) for item in items]
+
+    # private methods don't need docstrings
+    def _list_container_rows(self, long_ids):  # pylint: disable=C0111
+        if len(long_ids) > self.inspect_batch:
+            return None
+        cntrs = self._list_containers(id=sorted(long_ids))
+        return [cntr for cntr in cntrs if cntr.long_id in long_ids]
+
+    def list_containers_with_name(self, container_name):
+        if self._shared_inventory() is not None:
+            sup = super(DockerContainersAPI, self)
+            return sup.list_containers_with_name(container_name)
+        cntrs = self._list_containers(name=[str(container_name)])
+        return [cntr for cntr in cntrs if cntr.cmp_name(container_name)]
+
+    def list_containers_with_cid(self, cid):
+        if self._shared_inventory() is not None:
+            sup = super(DockerContainersAPI, self)
+            return sup.list_containers_with_cid(cid)
+        cntrs = self._list_containers(id=[str(cid)])
+        return [cntr for cntr in cntrs if cntr.cmp_id(cid)]
+
+
 class DockerContainers(DockerImages):
 
     """
@@ -647,4 +1056,5 @@ class DockerContainers(DockerImages):
     """
 
     #: Mapping of interface short-name string to DockerContainersBase subclass.
-    interfaces = {'cli': DockerContainersCLI}
+    interfaces = {'cli': DockerContainersCLI,
+                  'api': DockerContainersAPI}
@@ -70,6 +70,30 @@ class DockerContainerTest(ContainersTestBase):
         self.assertNotEqual(len(str(dc)), 0)
         self.assertNotEqual(len(repr(dc)), 0)
 
+    def test_lazy(self):
+        dc = self.DC(None, "/bin/true", "0.0.0.0:80->8080/tcp, 22/tcp", "a,")
+        self.assertFalse(hasattr(dc, '__dict__'))
+        # Invalid name raises only once read
+        self.assertRaises(ValueError, getattr, dc, 'container_name')
+        dc.container_name = "foobar"
+        self.assertEqual((dc.container_name, dc.links), ("foobar", None))
+        self.assertEqual(len(dc.port_list), 1)
+        self.assertEqual(dc.port_list[0].host_port, 80)
+        self.assertTrue(dc.port_list is dc.port_list)
+        dc.ports = ''
+        self.assertEqual(dc.port_list, [])
+
+    def test_many(self):
+        # Benchmark-sized listing, parsing nothing until read
+        dcs = [self.DC("busybox", "/bin/true", "0.0.0.0:%d->80/tcp" % i,
+                       "child%d/alias,name%d" % (i, i))
+               for i in xrange(10000)]
+        self.assertTrue(all(dc._parsed_name is None for dc in dcs))
+        self.assertEqual(dcs[-1].container_name, "name9999")
+        self.assertEqual(dcs[-1].links, [("child9999", "alias")])
+        self.assertEqual(dcs[-1].port_list[0].host_port, 9999)
+        self.assertEqual(dcs[0]._parsed_name, None)
+
     def test_parse_empty(self):
         pcn = self.DC.parse_container_name
         self.assertRaises(ValueError, pcn, '')
@@ -178,6 +202,7 @@ mock('autotest.client.shared.base_job')
 mock('autotest.client.shared.job')
 mock('autotest.client.shared.utils')
 mock('autotest.client.job')
+mock('autotest.client.shared.service')
 setattr(mock('autotest.client.shared.error'), 'TestFail', Exception)
 setattr(mock('autotest.client.shared.error'), 'TestError', Exception)
 setattr(mock('autotest.client.shared.error'), 'TestNAError', Exception)
@@ -280,6 +305,120 @@ class DockerContainersTest(DockerContainersTestBase):
 
         self.assertNotEqual(len(dcc.json_by_name("suspicious_pare")), 0)
 
+    def test_lazy_listing(self):
+        # Count parse calls while listing, then while reading fields
+        calls = []
+        dc_class = self.containers.DockerContainer
+        cp_class = self.containers.ContainerPort
+        parse_name = dc_class.__dict__['parse_container_name']
+        split_port = cp_class.__dict__['split_to_component']
+
+        def counted(name, func):
+            def wrapper(*args):
+                calls.append(name)
+                return func(*args)
+            return staticmethod(wrapper)
+
+        dc_class.parse_container_name = counted('name', parse_name.__func__)
+        cp_class.split_to_component = counted('port', split_port.__func__)
+        try:
+            dcc = self.containers.DockerContainersCLI(self.fake_subtest)
+            cl = dcc.list_containers()
+            self.assertEqual(len(cl), 8)
+            self.assertEqual(calls, [])
+            self.assertEqual(cl[5].container_name, 'suspicious_pare')
+            self.assertEqual(len(cl[5].links), 3)
+            self.assertEqual(calls, ['name'])
+            self.assertEqual(len(cl[1].port_list), 2)
+            self.assertEqual(len(cl[1].port_list), 2)
+            self.assertEqual(calls, ['name', 'port', 'port'])
+        finally:
+            dc_class.parse_container_name = parse_name
+            cp_class.split_to_component = split_port
+
+    def test_bulk_metadata(self):
+        dcc = self.containers.DockerContainersCLI(self.fake_subtest)
+        long_id = ("abf8c40b19e353ff1f67e3a26a967c14944b07b8f5aceb752f781f"
+                   "fca285a2a9")
+        metadata = dcc.get_containers_metadata([long_id, long_id[:12],
+                                                "nonexistent"])
+        self.assertEqual(metadata[long_id][0]['Config']['Hostname'],
+                         "28a7fbe6d375")
+        self.assertEqual(metadata[long_id[:12]], metadata[long_id])
+        self.assertEqual(metadata["nonexistent"], None)
+        # Reused by kill/wait until stale or changed
+        self.assertTrue(dcc._recent_json(long_id) is metadata[long_id])
+        dcc.docker_cmd("rm %s" % long_id)
+        self.assertFalse(dcc._recent_json(long_id) is metadata[long_id])
+        # Also stale after a mutating command from any other interface
+        metadata = dcc.get_containers_metadata([long_id])
+        self.assertTrue(dcc._recent_json(long_id) is metadata[long_id])
+        import inventory
+        inventory.command_executed("stop %s" % long_id)
+        self.assertFalse(dcc._recent_json(long_id) is metadata[long_id])
+        metadata = dcc.get_containers_metadata([long_id])
+        inventory.command_executed("ps --all")
+        self.assertTrue(dcc._recent_json(long_id) is metadata[long_id])
+
+    def test_container_rows(self):
+        dcc = self.containers.DockerContainersCLI(self.fake_subtest)
+        long_id = ("ef0fe72271778aefcb5cf6015f30067fbe"
+                   "01f05996a123037f65db0b82795915")
+        rows = dcc._list_container_rows(set([long_id, 'gone']))
+        self.assertEqual([row.long_id for row in rows], [long_id])
+        dcc.inspect_batch = 1
+        self.assertEqual(dcc._list_container_rows(set([long_id, 'gone'])),
+                         None)
+
+    def test_remove_many(self):
+        from xceptions import DockerOutputError
+        dcc = self.containers.DockerContainersCLI(self.fake_subtest)
+        self.fake_subtest.config['docker_path'] = 'echo'
+        # Fake inspect only knows one container
+        dcc.get_containers_metadata = lambda names: dict(
+            (name, None if name == 'nonexistent' else [{}])
+            for name in names)
+        result = dcc.remove_many(['cocky_albattani', 'ef0fe7227177',
+                                  'nonexistent'])
+        self.assertEqual(result['nonexistent'], None)
+        self.assertEqual(result['cocky_albattani'].stdout,
+                         'rm --force --volumes cocky_albattani\n')
+        self.assertEqual(result['ef0fe7227177'].exit_status, 0)
+        dcc.remove_args = '--volumes'
+        dcc.verify_output = True
+        self.assertEqual(dcc.remove_many(['cocky_albattani'])[
+            'cocky_albattani'].stdout, 'rm --volumes cocky_albattani\n')
+        dcc.remove_args = '--volumes; echo "Error: bad"'
+        self.assertRaises(DockerOutputError,
+                          dcc.remove_many, ['cocky_albattani'])
+
+    def test_remove_many_overridden(self):
+        metadata = lambda names: dict((name, [{}]) for name in names)
+
+        class PrefixedCLI(self.containers.DockerContainersCLI):
+
+            def docker_command(self, cmd):
+                return "echo -H remote %s" % cmd
+
+        dcc = PrefixedCLI(self.fake_subtest)
+        dcc.get_containers_metadata = metadata
+        self.assertEqual(dcc.remove_many(['foo'])['foo'].stdout,
+                         '-H remote rm --force --volumes foo\n')
+
+        class RemoteCLI(self.containers.DockerContainersCLI):
+            cmds = []
+
+            def docker_cmd(self, cmd, timeout=None):
+                self.cmds.append(cmd)
+                return "result of %s" % cmd
+
+        dcc = RemoteCLI(self.fake_subtest)
+        dcc.get_containers_metadata = metadata
+        self.assertEqual(dcc.remove_many(['foo', 'bar']),
+                         {'foo': 'result of rm --force --volumes foo',
+                          'bar': 'result of rm --force --volumes bar'})
+        self.assertEqual(len(dcc.cmds), 2)
+
     def test_noports(self):
         dcc = self.containers.DockerContainersCLI(self.fake_subtest)
         short_id = "ac8c9fa367f9"
@@ -350,5 +489,88 @@ class DockerContainersTest(DockerContainersTestBase):
         for exp in expected:
             self.assertTrue(exp in dcntr.list_container_ids())
 
+
+class FakeResponse(object):
+
+    def __init__(self, status, body):
+        self.status = status
+        self.body = body
+
+    def read(self):
+        return self.body
+
+
+class FakeClient(object):
+
+    def __init__(self, status, body):
+        self.status = status
+        self.body = body
+        self.resources = []
+
+    def request(self, method, resource, body=None, headers=None,
+                timeout=None):
+        self.resources.append(resource)
+        return FakeResponse(self.status, self.body)
+
+
+class DockerContainersAPITest(DockerContainersTestBase):
+
+    containers_json = """[{
+        "Id": "abf8c40b19e353ff1f67e3a26a967c14944b07b8f5aceb752f781ffca285a2a9",
+        "Names": ["/child0/alias0", "/suspicious_pare"],
+        "Image": "busybox:latest",
+        "Command": "/bin/sh -c sleep 10m",
+        "Created": 1395841362,
+        "Status": "Up 79 seconds",
+        "Ports": [{"IP": "0.0.0.0", "PrivatePort": 8765,
+                   "PublicPort": 5678, "Type": "tcp"},
+                  {"PrivatePort": 22, "Type": "tcp"}],
+        "SizeRw": 77, "SizeRootFs": 1024}]"""
+
+    def setUp(self):
+        super(DockerContainersAPITest, self).setUp()
+        import docker_api
+        self.docker_api = docker_api
+        self.client = FakeClient(200, self.containers_json)
+        docker_api.get_client('/var/run/docker.sock')[0] = self.client
+
+    def tearDown(self):
+        self.docker_api._clients.clear()
+        super(DockerContainersAPITest, self).tearDown()
+
+    def test_list(self):
+        dcntr = self.containers.DockerContainers(self.fake_subtest, 'api')
+        self.assertEqual(dcntr.interface_shortname, 'api')
+        dcntr.get_size = True
+        cnt = dcntr.list_containers()[0]
+        self.assertEqual(self.client.resources,
+                         ['/containers/json?all=1&size=1'])
+        self.assertEqual(cnt.container_name, 'suspicious_pare')
+        self.assertEqual(cnt.links, [('child0', 'alias0')])
+        self.assertEqual(cnt.ports, '0.0.0.0:5678->8765/tcp, 22/tcp')
+        self.assertEqual(cnt.created, 1395841362)
+        self.assertEqual(cnt.size, '77 B (virtual 1024 B)')
+
+    def test_filters(self):
+        dcntr = self.containers.DockerContainersAPI(self.fake_subtest)
+        dcntr.filters = {'status': ['running']}
+        cnts = dcntr.list_containers_with_name('suspicious_pare')
+        self.assertEqual(len(cnts), 1)
+        self.assertEqual(dcntr.list_containers_with_cid('abf8c40b19e3'),
+                         cnts)
+        resource = self.client.resources[0]
+        self.assertTrue(resource.startswith('/containers/json?all=1&'))
+        self.assertTrue('%22running%22' in resource)
+        self.assertTrue('%22suspicious_pare%22' in resource)
+
+    def test_fallback(self):
+        self.client.status = 500
+        dcntr = self.containers.DockerContainersAPI(self.fake_subtest)
+        # CLI listing from fake run()
+        self.assertEqual(len(dcntr.list_containers()), 8)
+        dcntr.filters = {'status': ['running']}
+        self.assertRaises(ValueError, dcntr.list_containers)
+
+
 if __name__ == '__main__':
     unittest.main()
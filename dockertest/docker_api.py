@@ -0,0 +1,518 @@
+"""
+Docker remote-API execution backend for ``dockercmd`` module classes
+
+A small set of frequently used docker subcommands (``ps``, ``inspect``,
+``kill``, ``rm``, ``rmi``, ``wait``, ``images``, ``top``) are translated
+into HTTP requests against the daemon's unix socket.  Results are returned
+as ``CmdResult`` instances shaped like the docker CLI produces them.
+Anything not understood here (unknown subcommands or options, shell
+syntax, non-default daemon address) returns ``None`` so callers can fall
+back to executing the docker CLI.
+"""
+
+# Pylint runs from a different directory, it's fine to import this way
+# pylint: disable=W0403
+
+import httplib
+import json
+import re
+import shlex
+import socket
+import threading
+import time
+import urllib
+from autotest.client import utils
+from docker_daemon import SocketClient
+
+
+#: Shell characters making command-line interpretation ambiguous
+SHELL_CHARS = re.compile(r"""[$`|;&<>*?(){}\\\n]""")
+
+#: Docker (global) options selecting a different daemon than docker_socket
+HOST_OPTIONS = re.compile(r"(^|\s)(-H|--host)(=|\s|$)")
+
+#: Private cache of socket path to shared SocketClient, and whether or
+#: not the daemon could be contacted (None if unknown).
+_clients = {}
+
+#: Private lock guarding _clients
+_clients_lock = threading.Lock()
+
+
+def get_client(uri, maxsize=10):
+    """
+    Return list of shared ``SocketClient`` and its availability for uri
+
+    :param uri: Path to docker daemon's unix socket
+    :param maxsize: Connection pool size if client must be created
+    :return: List of [SocketClient, True/False/None]
+    """
+    with _clients_lock:
+        if uri not in _clients:
+            _clients[uri] = [SocketClient(uri, maxsize), None]
+        return _clients[uri]
+
+
+def get_config_client(config):
+    """
+    Return ``get_client()`` list for ``docker_socket`` option of config
+
+    :param config: Subtest config. dictionary
+    :return: List of [SocketClient, True/False/None]
+    """
+    uri = config.get('docker_socket', '/var/run/docker.sock')
+    maxsize = config.get('docker_socket_connections', 10)
+    return get_client(uri, maxsize)
+
+
+def get_json(client, resource, timeout=None):
+    """
+    Return decoded JSON body of GET resource
+
+    :param client: A ``docker_daemon.SocketClient`` instance
+    :param resource: Path and query string of remote API resource
+    :param timeout: Socket timeout for request, None to block
+    :raises ValueError: On error response or undecodable body
+    :raises socket.error: When daemon could not be contacted
+    """
+    reply = Reply(client.request("GET", resource, timeout=timeout))
+    if not reply.ok:
+        raise ValueError(reply.error)
+    return reply.json
+
+
+def parse_args(args, flags, options):
+    """
+    Split docker-style subcommand args into dict of options and positionals
+
+    Like docker, option parsing stops at the first positional argument.
+
+    :param args: List of argument strings (after subcommand)
+    :param flags: Mapping of boolean flag spellings to canonical name
+    :param options: Mapping of valued option spellings to canonical name
+    :raises ValueError: On unknown options or missing option values
+    :return: Tuple of option dictionary, list of positional strings
+    """
+    opts = {}
+    args = list(args)
+    while args and args[0].startswith('-') and args[0] != '-':
+        arg = args.pop(0)
+        if arg == '--':
+            break
+        name, sep, value = arg.partition('=')
+        if name in flags:
+            if sep:  # docker accepts --flag=true|false
+                opts[flags[name]] = value.lower() not in ('false', '0')
+            else:
+                opts[flags[name]] = True
+        elif name in options:
+            if not sep:
+                if not args:
+                    raise ValueError("Option %s requires a value" % name)
+                value = args.pop(0)
+            opts[options[name]] = value
+        elif not arg.startswith('--') and not sep and len(arg) > 2:
+            # Combined short flags, i.e. '-aq'
+            shorts = ['-%s' % char for char in arg[1:]]
+            if not all([short in flags for short in shorts]):
+                raise ValueError("Unsupported option %s" % arg)
+            for short in shorts:
+                opts[flags[short]] = True
+        else:
+            raise ValueError("Unsupported option %s" % arg)
+    return opts, args
+
+
+def query(resource, **params):
+    """
+    Return resource with non-None params url-encoded as query string
+    """
+    params = dict([(key, val) for key, val in params.items()
+                   if val is not None])
+    if not params:
+        return resource
+    return "%s?%s" % (resource, urllib.urlencode(sorted(params.items())))
+
+
+def tabulate(rows, minwidth=20, padding=3):
+    """
+    Format rows of cells the way docker CLI's tabwriter does
+
+    :param rows: List of lists containing cell strings
+    :param minwidth: Minimum width of all but the last column
+    :param padding: Number of spaces added after longest cell in a column
+    :return: Multi-line string
+    """
+    widths = {}
+    for row in rows:
+        for index, cell in enumerate(row[:-1]):
+            widths[index] = max(widths.get(index, minwidth),
+                                len(cell) + padding)
+    lines = []
+    for row in rows:
+        cells = [cell.ljust(widths[index])
+                 for index, cell in enumerate(row[:-1])]
+        cells += row[-1:]
+        lines.append("".join(cells))
+    return "\n".join(lines)
+
+
+class Reply(object):
+
+    """
+    Outcome of one API call with status, decoded body, and error text
+
+    :param response: ``httplib.HTTPResponse`` instance, will be read.
+    """
+
+    #: HTTP status code integer
+    status = None
+
+    #: Raw response body string
+    body = None
+
+    def __init__(self, response):
+        self.status = response.status
+        self.body = response.read()
+
+    @property
+    def ok(self):
+        """
+        True if the daemon reported success
+        """
+        return self.status < 400
+
+    @property
+    def json(self):
+        """
+        Response body decoded from JSON
+        """
+        return json.loads(self.body)
+
+    @property
+    def error(self):
+        """
+        CLI-style error message for a failed request
+        """
+        return "Error response from daemon: %s" % self.body.strip()
+
+
+class APICommand(object):
+
+    """
+    Docker subcommand translated into one or more remote-API requests
+
+    :param client: A ``docker_daemon.SocketClient`` instance
+    :param opts: Dictionary of parsed subcommand options
+    :param args: List of subcommand positional arguments
+    :param timeout: Socket timeout to use for requests
+    """
+
+    #: Name of docker subcommand implemented
+    name = None
+
+    #: Mapping of boolean flag spellings to canonical name
+    flags = {}
+
+    #: Mapping of valued option spellings to canonical name
+    options = {}
+
+    #: Message appended on stderr when any target failed
+    failure_msg = None
+
+    def __init__(self, client, opts, args, timeout=None):
+        self.client = client
+        self.opts = opts
+        self.args = args
+        self.timeout = timeout
+        self.stdout = []
+        self.stderr = []
+
+    @classmethod
+    def supports(cls, opts, args):
+        """
+        Return True if this implementation handles opts and args exactly
+        """
+        del opts  # Keep pylint quiet
+        return len(args) > 0
+
+    def call(self, method, resource):
+        """
+        Issue request, return a ``Reply`` instance
+        """
+        return Reply(self.client.request(method, resource,
+                                         timeout=self.timeout))
+
+    def target(self, target):
+        """
+        Act on one positional argument, append output lines
+
+        :return: True on success, False on failure
+        """
+        raise NotImplementedError
+
+    def run(self):
+        """
+        Act on all positional arguments, return exit status integer
+        """
+        failed = False
+        for target in self.args:
+            if not self.target(target):
+                failed = True
+        if failed and self.failure_msg is not None:
+            self.stderr.append(self.failure_msg)
+        return int(failed)
+
+
+class Kill(APICommand):
+
+    """``docker kill [-s SIGNAL] CONTAINER [CONTAINER...]``"""
+
+    name = 'kill'
+    options = {'-s': 'signal', '--signal': 'signal'}
+    failure_msg = "Error: failed to kill one or more containers"
+
+    def target(self, target):
+        reply = self.call("POST", query("/containers/%s/kill" % target,
+                                        signal=self.opts.get('signal')))
+        if reply.ok:
+            self.stdout.append(target)
+        else:
+            self.stderr.append(reply.error)
+        return reply.ok
+
+
+class Rm(APICommand):
+
+    """``docker rm [-f] [-l] [-v] CONTAINER [CONTAINER...]``"""
+
+    name = 'rm'
+    flags = {'-f': 'force', '--force': 'force',
+             '-l': 'link', '--link': 'link',
+             '-v': 'volumes', '--volumes': 'volumes'}
+    failure_msg = "Error: failed to remove one or more containers"
+
+    def target(self, target):
+        params = {}
+        for opt, param in (('force', 'force'), ('link', 'link'),
+                           ('volumes', 'v')):
+            if self.opts.get(opt):
+                params[param] = 1
+        reply = self.call("DELETE", query("/containers/%s" % target,
+                                          **params))
+        if reply.ok:
+            self.stdout.append(target)
+        else:
+            self.stderr.append(reply.error)
+        return reply.ok
+
+
+class Rmi(APICommand):
+
+    """``docker rmi [-f] [--no-prune] IMAGE [IMAGE...]``"""
+
+    name = 'rmi'
+    flags = {'-f': 'force', '--force': 'force', '--no-prune': 'noprune'}
+    failure_msg = "Error: failed to remove one or more images"
+
+    def target(self, target):
+        params = {}
+        for opt in ('force', 'noprune'):
+            if self.opts.get(opt):
+                params[opt] = 1
+        reply = self.call("DELETE", query("/images/%s" % target, **params))
+        if not reply.ok:
+            self.stderr.append(reply.error)
+            return False
+        for item in reply.json:
+            for key, value in item.items():
+                self.stdout.append("%s: %s" % (key, value))
+        return True
+
+
+class Wait(APICommand):
+
+    """``docker wait CONTAINER [CONTAINER...]``"""
+
+    name = 'wait'
+    failure_msg = "Error: failed to wait one or more containers"
+
+    def target(self, target):
+        reply = self.call("POST", "/containers/%s/wait" % target)
+        if reply.ok:
+            self.stdout.append(str(reply.json['StatusCode']))
+        else:
+            self.stderr.append(reply.error)
+        return reply.ok
+
+
+class Inspect(APICommand):
+
+    """``docker inspect CONTAINER|IMAGE [CONTAINER|IMAGE...]``"""
+
+    name = 'inspect'
+
+    def run(self):
+        found = []
+        status = 0
+        for target in self.args:
+            for kind in ('containers', 'images'):
+                reply = self.call("GET", "/%s/%s/json" % (kind, target))
+                if reply.ok:
+                    found.append(reply.json)
+                    break
+            else:
+                self.stderr.append("Error: No such image or container: %s"
+                                   % target)
+                status = 1
+        self.stdout.append(json.dumps(found, indent=4))
+        return status
+
+
+class Ps(APICommand):
+
+    """``docker ps -q [-a] [--no-trunc]``"""
+
+    name = 'ps'
+    flags = {'-a': 'all', '--all': 'all', '-q': 'quiet', '--quiet': 'quiet',
+             '--no-trunc': 'notrunc'}
+
+    @classmethod
+    def supports(cls, opts, args):
+        # Only id-listing is rendered exactly, tables use CLI
+        return opts.get('quiet', False) and len(args) == 0
+
+    def run(self):
+        reply = self.call("GET", query("/containers/json",
+                                       all=int(self.opts.get('all', 0))))
+        if not reply.ok:
+            self.stderr.append(reply.error)
+            return 1
+        for item in reply.json:
+            if self.opts.get('notrunc'):
+                self.stdout.append(item['Id'])
+            else:
+                self.stdout.append(item['Id'][:12])
+        return 0
+
+
+class Images(Ps):
+
+    """``docker images -q [-a] [--no-trunc]``"""
+
+    name = 'images'
+
+    def run(self):
+        reply = self.call("GET", query("/images/json",
+                                       all=int(self.opts.get('all', 0))))
+        if not reply.ok:
+            self.stderr.append(reply.error)
+            return 1
+        for item in reply.json:
+            # CLI outputs one line per repository:tag
+            for _ in item.get('RepoTags') or ['<none>:<none>']:
+                if self.opts.get('notrunc'):
+                    self.stdout.append(item['Id'])
+                else:
+                    self.stdout.append(item['Id'][:12])
+        return 0
+
+
+class Top(APICommand):
+
+    """``docker top CONTAINER [ps OPTIONS]``"""
+
+    name = 'top'
+
+    def run(self):
+        ps_args = " ".join(self.args[1:]) or None
+        reply = self.call("GET", query("/containers/%s/top" % self.args[0],
+                                       ps_args=ps_args))
+        if not reply.ok:
+            self.stderr.append(reply.error)
+            return 1
+        procs = reply.json
+        self.stdout.append(tabulate([procs['Titles']] +
+                                    procs['Processes']))
+        return 0
+
+
+#: Mapping of subcommand name to its APICommand subclass
+COMMANDS = dict([(cls.name, cls)
+                 for cls in (Kill, Rm, Rmi, Wait, Inspect, Ps, Images, Top)])
+
+
+def translate(subcmd, subargs):
+    """
+    Return APICommand subclass, options, and arguments or None if unsupported
+
+    :param subcmd: String of subcommand, possibly with options
+    :param subargs: List of additional subcommand argument strings
+    :return: None or tuple(APICommand subclass, opts dict, args list)
+    """
+    cmdline = " ".join([subcmd] + list(subargs))
+    if SHELL_CHARS.search(cmdline):
+        return None
+    try:
+        words = shlex.split(cmdline)
+    except ValueError:  # unbalanced quoting
+        return None
+    if not words or words[0] not in COMMANDS:
+        return None
+    cls = COMMANDS[words[0]]
+    try:
+        opts, args = parse_args(words[1:], cls.flags, cls.options)
+    except ValueError:
+        return None
+    if not cls.supports(opts, args):
+        return None
+    return cls, opts, args
+
+
+def execute(dockercmd):
+    """
+    Execute a ``dockercmd.DockerCmdBase`` instance through the remote API
+
+    :param dockercmd: A ``dockercmd.DockerCmdBase`` or subclass instance
+    :return: ``CmdResult`` instance or None if CLI must be used instead
+    """
+    if HOST_OPTIONS.search(dockercmd.docker_options):
+        return None
+    translated = translate(dockercmd.subcmd, dockercmd.subargs)
+    if translated is None:
+        return None
+    cls, opts, args = translated
+    entry = get_config_client(dockercmd.subtest.config)
+    client, available = entry
+    if available is False:
+        return None
+    start = time.time()
+    if available is None:
+        # Command may act on some targets before failing, so only fall
+        # back to CLI when daemon can't be reached by a harmless request.
+        try:
+            client.request("GET", "/_ping", timeout=dockercmd.timeout)
+        except (socket.error, httplib.HTTPException), detail:
+            # Daemon never reached, don't try again
+            dockercmd.subtest.logdebug("Remote API at %s unavailable: "
+                                       "%s, using CLI",
+                                       dockercmd.subtest.config.get(
+                                           'docker_socket'), detail)
+            entry[1] = False
+            return None
+        entry[1] = True
+    command = cls(client, opts, args, dockercmd.timeout)
+    try:
+        exit_status = command.run()
+    except (socket.error, httplib.HTTPException, ValueError), detail:
+        command.stderr.append("Error: %s" % detail)
+        exit_status = 1
+    stdout = "\n".join(command.stdout)
+    if stdout:
+        stdout += "\n"
+    stderr = "\n".join(command.stderr)
+    if stderr:
+        stderr += "\n"
+    return utils.CmdResult(command=dockercmd.command, stdout=stdout,
+                           stderr=stderr, exit_status=exit_status,
+                           duration=time.time() - start)
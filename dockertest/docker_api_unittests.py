@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+
+# Pylint runs from a different directory, it's fine to import this way
+# pylint: disable=W0403
+
+import json
+import sys
+import types
+import unittest
+
+
+# DO NOT allow this function to get loose in the wild!
+def mock(mod_path):
+    """
+    Recursively inject tree of mocked modules from entire mod_path
+    """
+    name_list = mod_path.split('.')
+    child_name = name_list.pop()
+    child_mod = sys.modules.get(mod_path, types.ModuleType(child_name))
+    if len(name_list) == 0:  # child_name is left-most basic module
+        if child_name not in sys.modules:
+            sys.modules[child_name] = child_mod
+        return sys.modules[child_name]
+    else:
+        # New or existing child becomes parent
+        recurse_path = ".".join(name_list)
+        parent_mod = mock(recurse_path)
+        if not hasattr(sys.modules[recurse_path], child_name):
+            setattr(parent_mod, child_name, child_mod)
+            # full-name also points at child module
+            sys.modules[mod_path] = child_mod
+        return sys.modules[mod_path]
+
+
+class FakeCmdResult(object):
+
+    def __init__(self, **dargs):
+        for key, val in dargs.items():
+            setattr(self, key, val)
+
+setattr(mock('autotest.client.utils'), 'CmdResult', FakeCmdResult)
+setattr(mock('autotest.client.shared.error'), 'CmdError', Exception)
+setattr(mock('autotest.client.shared.error'), 'TestFail', Exception)
+setattr(mock('autotest.client.shared.error'), 'TestError', Exception)
+setattr(mock('autotest.client.shared.error'), 'TestNAError', Exception)
+setattr(mock('autotest.client.shared.error'), 'AutotestError', Exception)
+mock('autotest.client.shared.service')
+
+
+class FakeResponse(object):
+
+    def __init__(self, status, body):
+        self.status = status
+        self.body = body
+
+    def read(self):
+        return self.body
+
+
+class FakeClient(object):
+
+    def __init__(self, replies):
+        self.replies = replies
+        self.requests = []
+
+    def request(self, method, resource, body=None, headers=None,
+                timeout=None):
+        self.requests.append((method, resource))
+        status, body = self.replies.get((method, resource), (404, 'nope'))
+        return FakeResponse(status, body)
+
+
+class FakeSubtest(object):
+
+    config = {'docker_socket': '/fake.sock'}
+
+    @staticmethod
+    def logdebug(*args):
+        pass
+
+
+class FakeDockerCmd(object):
+
+    subtest = FakeSubtest()
+    docker_options = '-D'
+    command = '/usr/bin/docker -D fake'
+    timeout = 1.0
+
+    def __init__(self, subcmd, subargs=None):
+        self.subcmd = subcmd
+        if subargs is None:
+            subargs = []
+        self.subargs = subargs
+
+
+class DockerAPITestBase(unittest.TestCase):
+
+    def setUp(self):
+        import docker_api
+        self.docker_api = docker_api
+
+    def tearDown(self):
+        self.docker_api._clients.clear()
+
+    def fake_client(self, replies):
+        client = FakeClient(replies)
+        entry = self.docker_api.get_client('/fake.sock')
+        entry[0] = client
+        return client
+
+
+class ParseTest(DockerAPITestBase):
+
+    def test_parse_args(self):
+        parse_args = self.docker_api.parse_args
+        flags = {'-a': 'all', '-q': 'quiet', '--force': 'force'}
+        options = {'-s': 'signal', '--signal': 'signal'}
+        self.assertEqual(parse_args(['-aq', 'foo', '-s'], flags, options),
+                         ({'all': True, 'quiet': True}, ['foo', '-s']))
+        self.assertEqual(parse_args(['--force=false', '-s', '9', 'x'],
+                                    flags, options),
+                         ({'force': False, 'signal': '9'}, ['x']))
+        self.assertEqual(parse_args(['--signal=USR1', 'x'], flags, options),
+                         ({'signal': 'USR1'}, ['x']))
+        self.assertRaises(ValueError, parse_args, ['-z', 'x'], flags, options)
+        self.assertRaises(ValueError, parse_args, ['-s'], flags, options)
+
+    def test_translate(self):
+        translate = self.docker_api.translate
+        self.assertEqual(translate('kill', ['-s USR1', 'foo'])[1:],
+                         ({'signal': 'USR1'}, ['foo']))
+        self.assertEqual(translate('ps -a -q', [])[0], self.docker_api.Ps)
+        # Unsupported subcommand, table output, options, and shell syntax
+        self.assertEqual(translate('run', ['foo']), None)
+        self.assertEqual(translate('ps -a', []), None)
+        self.assertEqual(translate('inspect', ['--format={{.Id}}', 'x']),
+                         None)
+        self.assertEqual(translate('rm', ['$(echo foo)']), None)
+        self.assertEqual(translate('kill', []), None)
+
+    def test_tabulate(self):
+        self.assertEqual(self.docker_api.tabulate([['UID', 'PID', 'CMD'],
+                                                   ['root', '1', 'sh']]),
+                         ('UID                 PID                 CMD\n'
+                          'root                1                   sh'))
+
+
+class ExecuteTest(DockerAPITestBase):
+
+    def test_kill(self):
+        client = self.fake_client({('POST', '/containers/foo/kill?signal=9'):
+                                   (204, '')})
+        result = self.docker_api.execute(FakeDockerCmd('kill',
+                                                       ['-s 9', 'foo',
+                                                        'bar']))
+        self.assertEqual(client.requests[0], ('GET', '/_ping'))
+        self.assertEqual(client.requests[2],
+                         ('POST', '/containers/bar/kill?signal=9'))
+        self.assertEqual(result.exit_status, 1)
+        self.assertEqual(result.stdout, 'foo\n')
+        self.assertEqual(result.stderr,
+                         "Error response from daemon: nope\n"
+                         "Error: failed to kill one or more containers\n")
+
+    def test_rm_rmi(self):
+        self.fake_client({('DELETE', '/containers/foo?force=1&v=1'):
+                          (204, ''),
+                          ('DELETE', '/images/bar'):
+                          (200, '[{"Untagged": "bar:latest"},'
+                                ' {"Deleted": "1234"}]')})
+        result = self.docker_api.execute(FakeDockerCmd('rm',
+                                                       ['--force',
+                                                        '--volumes', 'foo']))
+        self.assertEqual((result.exit_status, result.stdout), (0, 'foo\n'))
+        result = self.docker_api.execute(FakeDockerCmd('rmi bar'))
+        self.assertEqual(result.stdout, 'Untagged: bar:latest\n'
+                                        'Deleted: 1234\n')
+
+    def test_inspect_ps(self):
+        long_id = '1234567890ab' * 5 + 'cdef'
+        self.fake_client({('GET', '/images/foo/json'): (200, '{"Id": "a"}'),
+                          ('GET', '/containers/json?all=1'):
+                          (200, '[{"Id": "%s"}]' % long_id)})
+        result = self.docker_api.execute(FakeDockerCmd('inspect', ['foo']))
+        self.assertEqual(json.loads(result.stdout), [{'Id': 'a'}])
+        result = self.docker_api.execute(FakeDockerCmd('ps', ['-qa']))
+        self.assertEqual(result.stdout, long_id[:12] + '\n')
+        result = self.docker_api.execute(FakeDockerCmd('ps', ['-qa',
+                                                              '--no-trunc']))
+        self.assertEqual(result.stdout, long_id + '\n')
+
+    def test_fallback(self):
+        self.fake_client({})
+        cmd = FakeDockerCmd('kill', ['foo'])
+        cmd.docker_options = '-H tcp://127.0.0.1:2375'
+        self.assertEqual(self.docker_api.execute(cmd), None)
+        self.assertEqual(self.docker_api.execute(FakeDockerCmd('pull foo')),
+                         None)
+
+    def test_unavailable(self):
+        import socket
+
+        class BrokenClient(FakeClient):
+
+            def request(self, method, resource, body=None, headers=None,
+                        timeout=None):
+                if len(self.requests) >= self.working:
+                    raise socket.error(104, 'Connection reset by peer')
+                return super(BrokenClient, self).request(method, resource)
+        # Daemon unreachable, CLI must be used
+        client = BrokenClient({})
+        client.working = 0
+        self.docker_api.get_client('/fake.sock')[0] = client
+        self.assertEqual(self.docker_api.execute(FakeDockerCmd('rm foo bar')),
+                         None)
+        self.assertEqual(self.docker_api.get_client('/fake.sock')[1], False)
+        # Failure after first target was removed must not fall back
+        self.docker_api._clients.clear()
+        client = BrokenClient({('DELETE', '/containers/foo'): (204, '')})
+        client.working = 2
+        self.docker_api.get_client('/fake.sock')[0] = client
+        result = self.docker_api.execute(FakeDockerCmd('rm foo bar'))
+        self.assertEqual((result.exit_status, result.stdout), (1, 'foo\n'))
+        self.assertTrue('reset' in result.stderr)
+        # Undecodable JSON
+        self.docker_api._clients.clear()
+        self.fake_client({('GET', '/containers/json?all=0'): (200, '[{')})
+        result = self.docker_api.execute(FakeDockerCmd('ps -q'))
+        self.assertEqual(result.exit_status, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,10 +5,16 @@ Docker Daemon interface helpers and utilities
 # Pylint runs from a different directory, it's fine to import this way
 # pylint: disable=W0403
 
+import errno
 import httplib
+import select
 import socket
 import json
-from output import wait_for_output
+import struct
+import threading
+import urllib
+from contextlib import contextmanager
+from output import OutputWatcher, wait_for_output
 from autotest.client.shared import service
 from autotest.client import utils
 
@@ -58,10 +64,232 @@ class ClientBase(object):
         return self.value_to_json(self.get(resource))
 
 
+class BufferedResponse(object):
+
+    """
+    Fully-read ``httplib.HTTPResponse`` detached from its connection
+
+    :param response: ``httplib.HTTPResponse`` instance to read body from
+    """
+
+    def __init__(self, response):
+        self.status = response.status
+        self.reason = response.reason
+        self.version = response.version
+        self.msg = response.msg
+        self.body = response.read()
+        self._offset = 0
+
+    def getheader(self, name, default=None):
+        """
+        Return value of header name or default if not present
+        """
+        return self.msg.getheader(name, default)
+
+    def getheaders(self):
+        """
+        Return list of (header, value) tuples
+        """
+        return self.msg.items()
+
+    def read(self, amt=None):
+        """
+        Return (up to amt bytes of) remaining body data
+        """
+        if amt is None:
+            end = len(self.body)
+        else:
+            end = min(self._offset + amt, len(self.body))
+        data = self.body[self._offset:end]
+        self._offset = end
+        return data
+
+
+class ConnectionPool(object):
+
+    """
+    Thread-safe pool of keep-alive connections created on demand
+
+    :param factory: Callable returning a new (unconnected) connection
+    :param maxsize: Maximum number of connections checked out at once
+    """
+
+    def __init__(self, factory, maxsize=10):
+        self.factory = factory
+        self.maxsize = maxsize
+        self._idle = []  # LIFO, most recently used is least likely stale
+        self._idle_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(maxsize)
+
+    @staticmethod
+    def healthy(connection):
+        """
+        Return False if idle connection was closed/reset by the peer
+
+        :param connection: Idle ``httplib.HTTPConnection`` instance
+        """
+        sock = connection.sock
+        if sock is None:
+            return True  # Connects on next request
+        try:
+            # Idle socket becomes readable only on EOF or unsolicited data
+            readable = select.select([sock], [], [], 0)[0]
+        except (select.error, socket.error, ValueError):
+            return False
+        return not readable
+
+    def acquire(self):
+        """
+        Return a healthy connection, blocking while maxsize are checked out
+        """
+        self._slots.acquire()
+        while True:
+            with self._idle_lock:
+                if not self._idle:
+                    break
+                connection = self._idle.pop()
+            if self.healthy(connection):
+                return connection
+            connection.close()
+        try:
+            return self.factory()
+        except:
+            self._slots.release()
+            raise
+
+    def release(self, connection, reuse=True):
+        """
+        Check connection back into pool, closing it unless reuse is True
+
+        :param connection: Connection previously returned by acquire()
+        :param reuse: False if connection is in an unknown state
+        """
+        if reuse:
+            with self._idle_lock:
+                self._idle.append(connection)
+        else:
+            connection.close()
+        self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """
+        Context manager for a connection, closed if block raises exception
+        """
+        connection = self.acquire()
+        try:
+            yield connection
+        except:
+            self.release(connection, reuse=False)
+            raise
+        self.release(connection)
+
+    def close(self):
+        """
+        Close all idle connections
+        """
+        with self._idle_lock:
+            idle = self._idle
+            self._idle = []
+        for connection in idle:
+            connection.close()
+
+
+def read_chunked(fp):
+    """
+    Generate body data from chunked transfer-encoded file-like fp as it
+    arrives, one chunk at a time.
+
+    :param fp: File-like object positioned at start of chunked body
+    :raises httplib.IncompleteRead: If stream ends before final chunk
+    """
+    while True:
+        line = fp.readline()
+        if not line:
+            raise httplib.IncompleteRead('')
+        size = int(line.split(';', 1)[0], 16)
+        if size == 0:
+            # Discard trailers through terminating blank line
+            while fp.readline() not in ('\r\n', '\n', ''):
+                pass
+            return
+        data = fp.read(size)
+        if len(data) < size:
+            raise httplib.IncompleteRead(data, size - len(data))
+        fp.read(2)  # CRLF
+        yield data
+
+
+def iter_frames(chunks):
+    """
+    Generate (stream, data) from multiplexed stdout/stderr body chunks
+
+    Each frame has an 8-byte header of stream type (0: stdin, 1: stdout,
+    2: stderr), three padding bytes, and big-endian payload size.
+
+    :param chunks: Iterable of body data strings, in any size
+    """
+    buf = ''
+    for chunk in chunks:
+        buf += chunk
+        while len(buf) >= 8:
+            stream, size = struct.unpack('>BxxxL', buf[:8])
+            if len(buf) < size + 8:
+                break
+            yield stream, buf[8:size + 8]
+            buf = buf[size + 8:]
+    if buf:
+        raise httplib.IncompleteRead(buf)
+
+
+def iter_lines(chunks):
+    """
+    Generate newline-terminated lines (w/o newline) from body chunks
+
+    :param chunks: Iterable of body data strings, in any size
+    """
+    buf = ''
+    for chunk in chunks:
+        buf += chunk
+        lines = buf.split('\n')
+        buf = lines.pop()
+        for line in lines:
+            yield line
+    if buf:
+        yield buf
+
+
+def iter_json(chunks):
+    """
+    Generate decoded objects from concatenated JSON values in body chunks
+
+    :param chunks: Iterable of body data strings, in any size
+    :raises ValueError: If stream ends on partial JSON value
+    """
+    decoder = json.JSONDecoder()
+    buf = ''
+    for chunk in chunks:
+        buf = (buf + chunk).lstrip()
+        while buf:
+            try:
+                obj, end = decoder.raw_decode(buf)
+            except ValueError:
+                break  # Incomplete, wait for more data
+            yield obj
+            buf = buf[end:].lstrip()
+    if buf:
+        # Raise parse error for trailing partial value
+        json.loads(buf)
+
+
 class SocketClient(ClientBase):
 
     """
-    Connection to docker daemon through a unix socket
+    Connection to docker daemon through a unix socket, safe to share across
+    threads.
+
+    :param uri: Path to the existing unix socket
+    :param maxsize: Maximum number of concurrent keep-alive connections
     """
 
     class UHTTPConnection(httplib.HTTPConnection):
@@ -73,24 +301,198 @@ class SocketClient(ClientBase):
         :param path: Path to the existing unix socket
         """
 
-        def __init__(self, path="/var/run/docker.sock"):
+        def __init__(self, path="/var/run/docker.sock", timeout=None):
             httplib.HTTPConnection.__init__(self, 'localhost')
             self.path = path
+            self.timeout = timeout
 
         def connect(self):
             sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
             sock.connect(self.path)
             self.sock = sock
 
     interface = UHTTPConnection
 
-    def __init__(self, uri="/var/run/docker.sock"):
+    #: Errors signaling daemon closed an idle keep-alive connection
+    _stale_errnos = (errno.EPIPE, errno.ECONNRESET)
+
+    #: Methods safe to re-send after daemon may have received them
+    idempotent_methods = ('GET', 'HEAD', 'OPTIONS')
+
+    def __init__(self, uri="/var/run/docker.sock", maxsize=10):
         super(SocketClient, self).__init__(uri)
-        self._connection = self.interface(uri)
+        self.pool = ConnectionPool(lambda: self.interface(uri), maxsize)
+
+    @staticmethod
+    def _set_timeout(connection, timeout):
+        connection.timeout = timeout
+        if connection.sock is not None:
+            connection.sock.settimeout(timeout)
+
+    def request(self, method, resource, body=None, headers=None,
+                timeout=None):
+        """
+        Send HTTP method request for resource, return the response
+
+        :param method: HTTP method name string (``GET``, ``POST``, etc.)
+        :param resource: Path and query string of remote API resource
+        :param body: Optional string of request body data
+        :param headers: Optional dictionary of additional request headers
+        :param timeout: Socket timeout for this request, None to block
+        :return: ``BufferedResponse`` instance, connection already
+                 returned to pool.
+        """
+        if headers is None:
+            headers = {}
+        if body is not None and 'Content-Type' not in headers:
+            headers['Content-Type'] = 'application/json'
+        # Retry once if daemon closed keep-alive connection while idle,
+        # unless it may have acted on a non-idempotent request already.
+        for retry in (True, False):
+            connection = self.pool.acquire()
+            reused = connection.sock is not None
+            sent = False
+            try:
+                self._set_timeout(connection, timeout)
+                connection.request(method, resource, body, headers)
+                sent = True
+                response = BufferedResponse(connection.getresponse())
+            except (httplib.BadStatusLine, socket.error), detail:
+                self.pool.release(connection, reuse=False)
+                if isinstance(detail, socket.error):
+                    stale = detail.errno in self._stale_errnos
+                else:
+                    stale = True
+                if not (retry and reused and stale):
+                    raise
+                if sent and method.upper() not in self.idempotent_methods:
+                    raise
+                continue
+            except:
+                self.pool.release(connection, reuse=False)
+                raise
+            self.pool.release(connection)
+            return response
+
+    def stream(self, method, resource, body=None, headers=None,
+               timeout=None, bufsize=4096):
+        """
+        Generate response body data as it arrives, for endless resources
+
+        The connection is held until generator is exhausted or closed.
+
+        :param method: HTTP method name string (``GET``, ``POST``, etc.)
+        :param resource: Path and query string of remote API resource
+        :param body: Optional string of request body data
+        :param headers: Optional dictionary of additional request headers
+        :param timeout: Seconds to wait for more data before raising
+                        ``socket.timeout``, None to block.
+        :param bufsize: Maximum data size to read from non-chunked body
+        :raises ValueError: When response status is not 2xx
+        """
+        if headers is None:
+            headers = {}
+        if body is not None and 'Content-Type' not in headers:
+            headers['Content-Type'] = 'application/json'
+        connection = self.pool.acquire()
+        reuse = False
+        try:
+            self._set_timeout(connection, timeout)
+            connection.request(method, resource, body, headers)
+            response = connection.getresponse()
+            if response.status / 100 != 2:
+                raise ValueError("Bad response status %s (%s)\nRaw data: %s"
+                                 % (response.status, response.reason,
+                                    response.read()))
+            if response.chunked:
+                for data in read_chunked(response.fp):
+                    yield data
+            else:
+                # Headers were read unbuffered, rest is on the socket.  Read
+                # through response's file, which keeps socket open even if
+                # connection closed its own (close-delimited body).
+                # response.read() would block until bufsize arrived.
+                sock = response.fp._sock  # pylint: disable=W0212
+                remaining = response.length
+                while remaining is None or remaining > 0:
+                    if remaining is None:
+                        data = sock.recv(bufsize)
+                    else:
+                        data = sock.recv(min(bufsize, remaining))
+                        remaining -= len(data)
+                    if not data:
+                        break
+                    yield data
+            response.close()
+            reuse = not response.will_close
+        finally:
+            self.pool.release(connection, reuse)
+
+    def stream_json(self, resource, timeout=None):
+        """
+        Generate JSON objects from GET resource as they arrive
+
+        :param resource: Path and query string of remote API resource
+        :param timeout: Seconds to wait for each object, None to block
+        """
+        return iter_json(self.stream("GET", resource, timeout=timeout))
+
+    def stream_frames(self, resource, tty=False, timeout=None):
+        """
+        Generate (stream, data) tuples from multiplexed GET resource
+
+        :param resource: Path and query string of remote API resource
+        :param tty: True if container has a tty, output is not multiplexed
+        :param timeout: Seconds to wait for each frame, None to block
+        """
+        chunks = self.stream("GET", resource, timeout=timeout)
+        if tty:
+            return ((1, data) for data in chunks)
+        return iter_frames(chunks)
+
+    def events(self, timeout=None, **params):
+        """
+        Generate event dictionaries from ``/events`` as they happen
+
+        :param timeout: Seconds to wait for each event, None to block
+        :param params: Query parameters (``since``, ``until``, etc.)
+        """
+        resource = "/events"
+        if params:
+            resource += "?" + urllib.urlencode(params)
+        return self.stream_json(resource, timeout)
+
+    def logs(self, container, tty=False, timeout=None, **params):
+        """
+        Generate (stream, data) tuples of container's logs as they arrive
+
+        :param container: Container name or ID
+        :param tty: True if container has a tty, output is not multiplexed
+        :param timeout: Seconds to wait for more output, None to block
+        :param params: Query parameters, default ``follow``, ``stdout``
+                       and ``stderr`` to 1.
+        """
+        query = {'follow': 1, 'stdout': 1, 'stderr': 1}
+        query.update(params)
+        resource = ("/containers/%s/logs?%s"
+                    % (container, urllib.urlencode(query)))
+        return self.stream_frames(resource, tty, timeout)
 
     def get(self, resource):
-        self._connection.request("GET", resource)
-        return self._connection.getresponse()  # httplib.HTTPResponse
+        return self.request("GET", resource)  # BufferedResponse
+
+    def post(self, resource, body=None):
+        """
+        Send POST request for resource, return the ``BufferedResponse``
+        """
+        return self.request("POST", resource, body)
+
+    def delete(self, resource):
+        """
+        Send DELETE request for resource, return the ``BufferedResponse``
+        """
+        return self.request("DELETE", resource)
 
     @staticmethod
     def value_to_json(value):
@@ -125,7 +527,11 @@ def start(docker_path, docker_args):
     cmd = [docker_path]
     cmd += docker_args
 
-    daemon_process = utils.AsyncJob(" ".join(cmd), close_fds=True)
+    watcher = OutputWatcher()
+    daemon_process = utils.AsyncJob(" ".join(cmd), close_fds=True,
+                                    stderr_tee=watcher)
+    # Allows output_match() to block instead of polling
+    daemon_process.stderr_watcher = watcher
     return daemon_process
 
 
@@ -141,7 +547,9 @@ def output_match(daemon_process,
     """
     return wait_for_output(daemon_process.get_stderr,
                            regex,
-                           timeout=timeout)
+                           timeout=timeout,
+                           watcher=getattr(daemon_process, 'stderr_watcher',
+                                           None))
 
 
 def restart_service(daemon_process=None):
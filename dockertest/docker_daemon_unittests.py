@@ -66,5 +66,239 @@ class DDTest(DDTestBase):
         self.assertEqual(i.get_json('bar'), [{u'foo': u'bar'}])
         self.assertEqual(i.interface, None)
 
+
+class FakeSock(object):
+
+    def settimeout(self, timeout):
+        pass
+
+
+class FakeConnection(object):
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.sock = None
+        self.timeout = None
+        self.closed = False
+        self.requests = []
+
+    def request(self, method, resource, body, headers):
+        self.requests.append((method, resource, body, headers))
+        if self.responses and isinstance(self.responses[0], IOError):
+            raise self.responses.pop(0)
+
+    def getresponse(self):
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    def close(self):
+        self.closed = True
+
+
+class FakeResponse(object):
+
+    status = 200
+    reason = 'OK'
+    version = 11
+    msg = None
+
+    def __init__(self, body):
+        self.body = body
+
+    def read(self):
+        return self.body
+
+
+class PoolTest(DDTestBase):
+
+    def test_reuse(self):
+        made = []
+
+        def factory():
+            made.append(FakeConnection([]))
+            return made[-1]
+        pool = self.dd.ConnectionPool(factory, maxsize=2)
+        first = pool.acquire()
+        second = pool.acquire()
+        pool.release(first)
+        pool.release(second, reuse=False)
+        self.assertTrue(second.closed)
+        self.assertEqual(pool.acquire(), first)
+        with pool.connection() as third:
+            self.assertNotEqual(third, first)
+        self.assertEqual(len(made), 3)
+        pool.close()
+        self.assertTrue(third.closed)
+
+    def test_healthy(self):
+        import socket
+        pool = self.dd.ConnectionPool(None)
+        connection = FakeConnection([])
+        self.assertTrue(pool.healthy(connection))
+        connection.sock, peer = socket.socketpair()
+        self.assertTrue(pool.healthy(connection))
+        peer.close()
+        self.assertFalse(pool.healthy(connection))
+        connection.sock.close()
+
+    def test_concurrent(self):
+        import threading
+        import time
+        pool = self.dd.ConnectionPool(lambda: FakeConnection([]), maxsize=3)
+        busy = []
+        peak = []
+
+        def worker():
+            with pool.connection():
+                busy.append(None)
+                peak.append(len(busy))
+                time.sleep(0.01)
+                busy.pop()
+        threads = [threading.Thread(target=worker) for _ in xrange(12)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertTrue(max(peak) <= 3)
+        self.assertTrue(len(pool._idle) <= 3)
+
+
+class SocketClientTest(DDTestBase):
+
+    def test_request_retry(self):
+        import httplib
+        client = self.dd.SocketClient('/fake.sock')
+        stale = FakeConnection([httplib.BadStatusLine('')])
+        stale.sock = FakeSock()
+        fresh = FakeConnection([FakeResponse('{"foo": "bar"}')])
+        connections = [stale, fresh]
+        client.pool.factory = lambda: connections.pop(0)
+        self.assertEqual(client.get_json('/info'), {'foo': 'bar'})
+        self.assertTrue(stale.closed)
+        self.assertFalse(fresh.closed)
+        fresh.responses.append(FakeResponse('{}'))
+        response = client.post('/containers/foo/kill', '{}')
+        self.assertEqual(response.read(3), '{}')
+        self.assertEqual(fresh.requests[-1][3],
+                         {'Content-Type': 'application/json'})
+
+    def test_request_no_retry(self):
+        import errno
+        import httplib
+        import socket
+        client = self.dd.SocketClient('/fake.sock')
+        connections = []
+        client.pool.factory = lambda: connections.pop(0)
+        # Daemon may have killed container before resetting connection
+        stale = FakeConnection([httplib.BadStatusLine('')])
+        stale.sock = FakeSock()
+        connections[:] = [stale, FakeConnection([FakeResponse('{}')])]
+        self.assertRaises(httplib.BadStatusLine, client.post,
+                          '/containers/foo/kill', '{}')
+        self.assertEqual(len(connections), 1)
+        # Fresh connections aren't stale
+        connections[:] = [FakeConnection([httplib.BadStatusLine('')]),
+                          FakeConnection([FakeResponse('{}')])]
+        self.assertRaises(httplib.BadStatusLine, client.get_json, '/info')
+        # Nothing sent yet, any method is safe to retry
+        stale = FakeConnection([socket.error(errno.EPIPE, 'Broken pipe')])
+        stale.sock = FakeSock()
+        fresh = FakeConnection([FakeResponse('{}')])
+        connections[:] = [stale, fresh]
+        self.assertEqual(client.delete('/containers/foo').read(), '{}')
+        self.assertEqual(len(fresh.requests), 1)
+
+
+class StreamTest(DDTestBase):
+
+    def test_read_chunked(self):
+        from StringIO import StringIO
+        fp = StringIO('4\r\nfoo\n\r\n6;ext=1\r\nbarbaz\r\n0\r\n'
+                      'X-Trailer: 1\r\n\r\n')
+        self.assertEqual(list(self.dd.read_chunked(fp)), ['foo\n', 'barbaz'])
+        fp = StringIO('4\r\nfoo')
+        self.assertRaises(Exception, list, self.dd.read_chunked(fp))
+
+    def test_iter_frames(self):
+        data = ('\x01\x00\x00\x00\x00\x00\x00\x04foo\n'
+                '\x02\x00\x00\x00\x00\x00\x00\x03bar')
+        # Frame boundaries must not depend on chunk boundaries
+        chunks = [data[i:i + 3] for i in xrange(0, len(data), 3)]
+        self.assertEqual(list(self.dd.iter_frames(chunks)),
+                         [(1, 'foo\n'), (2, 'bar')])
+        self.assertRaises(Exception, list, self.dd.iter_frames([data[:-1]]))
+
+    def test_iter_lines(self):
+        self.assertEqual(list(self.dd.iter_lines(['fo', 'o\nbar\n\nb', 'az'])),
+                         ['foo', 'bar', '', 'baz'])
+
+    def test_iter_json(self):
+        chunks = ['{"status": "cre', 'ate"}\n{"status"', ': "die"}{"id"',
+                  ': 1}\n']
+        self.assertEqual(list(self.dd.iter_json(chunks)),
+                         [{'status': 'create'}, {'status': 'die'},
+                          {'id': 1}])
+        self.assertRaises(ValueError, list, self.dd.iter_json(['{"a": 1}{']))
+
+    def stream(self, head, chunks, read=None):
+        """
+        Return read(client) (or list of stream data) from fake daemon
+        """
+        import os
+        import shutil
+        import socket
+        import tempfile
+        import threading
+        tmpdir = tempfile.mkdtemp()
+        path = os.path.join(tmpdir, 'docker.sock')
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(path)
+        server.listen(1)
+
+        def serve():
+            conn = server.accept()[0]
+            conn.recv(4096)
+            conn.sendall(head)
+            for chunk in chunks:
+                conn.sendall(chunk)
+            conn.close()
+        thread = threading.Thread(target=serve)
+        thread.start()
+        try:
+            client = self.dd.SocketClient(path)
+            if read is None:
+                return list(client.stream('GET', '/events', timeout=5))
+            return read(client)
+        finally:
+            thread.join()
+            server.close()
+            shutil.rmtree(tmpdir)
+
+    def test_stream(self):
+        chunks = ['{"status": "start"}', '\n{"status": "die"}\n']
+        def read(client):  # pylint: disable=C0111
+            events = client.events(timeout=5, since=0)
+            self.assertEqual(events.next(), {'status': 'start'})
+            return list(events)
+        self.assertEqual(self.stream('HTTP/1.1 200 OK\r\n'
+                                     'Transfer-Encoding: chunked\r\n\r\n',
+                                     ['%x\r\n%s\r\n' % (len(chunk), chunk)
+                                      for chunk in chunks] + ['0\r\n\r\n'],
+                                     read),
+                         [{'status': 'die'}])
+
+    def test_stream_length(self):
+        data = self.stream('HTTP/1.1 200 OK\r\nContent-Length: 6\r\n\r\n',
+                           ['foo', 'barbaz'])
+        self.assertEqual(''.join(data), 'foobar')
+
+    def test_stream_close_delimited(self):
+        # No length nor chunking, body ends when daemon closes connection
+        data = self.stream('HTTP/1.1 200 OK\r\n\r\n', ['foo', 'bar'])
+        self.assertEqual(''.join(data), 'foobar')
+
+
 if __name__ == '__main__':
     unittest.main()
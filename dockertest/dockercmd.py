@@ -6,9 +6,20 @@ Frequently used docker CLI operations/data
 # Pylint runs from a different directory, it's fine to import this way
 # pylint: disable=W0403
 
+import os
+import pipes
+import sys
+import tempfile
+import threading
 import time
 from autotest.client import utils
+from output import RingCapture, SpooledOutput
+from process_group import ProcessGroup
 from subtest import SubBase
+import docker_api
+import inventory
+import metrics
+import names
 from xceptions import (DockerNotImplementedError,
                        DockerExecError, DockerRuntimeError, DockerTestError)
 
@@ -92,7 +103,10 @@ class DockerCmdBase(object):
             # Don't assume executed command is current command
             dct['cmd'] = self.cmdresult.command
             dct['exit'] = self.exit_status  # pulls from self.cmdresult
-            dct['out'] = self.stdout
+            if isinstance(self.stdout, SpooledOutput):
+                dct['out'] = repr(self.stdout)  # Don't load it all
+            else:
+                dct['out'] = self.stdout
             dct['err'] = self.stderr
             dct['dur'] = self.duration
         else:
@@ -158,6 +172,15 @@ class DockerCmdBase(object):
         # Defined in [DEFAULTS] guaranteed to exist
         return self.subtest.config['docker_options']
 
+    @property
+    def docker_interface(self):
+        """
+        String of interface used to execute subcommand, 'cli' or 'api'
+        """
+
+        # Not guaranteed to exist in older/custom [DEFAULTS]
+        return self.subtest.config.get('docker_interface', 'cli')
+
     @property
     def docker_command(self):
         """
@@ -272,9 +295,65 @@ class DockerCmd(DockerCmdBase):
     Execute docker subcommand with arguments and a timeout.
     """
 
+    #: Spool stdout into a file in the subtest's ``tmpdir`` and represent it
+    #: as an ``output.SpooledOutput`` when larger than this many bytes.
+    #: None always keeps stdout in memory.  Only worth setting for
+    #: subcommands with large output (e.g. ``save``, ``export``, ``logs``).
+    spool_threshold = None
+
+    #: Subcommands creating a container, see ``retry_name_conflict``
+    create_subcmds = ('run', 'create')
+
+    #: When True, a ``create_subcmds`` command whose ``--name`` (a single
+    #: ``subargs`` item) was issued by ``names.registry``, and is already in
+    #: use, is retried with the item changed to a new name.
+    retry_name_conflict = False
+
     def execute(self, stdin=None):
         """
         Run docker command, ignore any non-zero exit code
+
+        See ``retry_name_conflict`` for retrying under another name.
+        """
+        index = None
+        words = self.subcmd.split()
+        if (self.retry_name_conflict and words and
+                words[0] in self.create_subcmds and
+                (stdin is None or isinstance(stdin, basestring))):
+            index = names.issued_name_index(self.subargs)
+        if index is None:
+            return self._execute(stdin)
+        tried = []
+
+        def make_name():  # pylint: disable=C0111
+            if tried:
+                name = names.registry.reissue(tried[-1])
+                self.subtest.logwarning("Container name %s in use, "
+                                        "renamed to %s", tried[-1], name)
+                self.subargs[index] = names.rename_option(
+                    self.subargs[index], name)
+            else:
+                name = names.NAME_OPTION_RE.match(
+                    self.subargs[index]).group(1)
+            tried.append(name)
+            return name
+        return names.retry_on_conflict(lambda name: self._execute(stdin),
+                                       make_name)[1]
+
+    @property
+    def container_name(self):
+        """
+        Value of single ``--name`` item in ``subargs`` (after any retry)
+        """
+        for arg in self.subargs:
+            match = names.NAME_OPTION_RE.match(arg)
+            if match is not None:
+                return match.group(1)
+        return None
+
+    def _execute(self, stdin=None):
+        """
+        Run docker command once, return copy of its cmdresult
         """
 
         if not self.quiet:
@@ -287,15 +366,50 @@ class DockerCmd(DockerCmdBase):
             else:                               # Nothing
                 str_stdin = ""
             self.subtest.logdebug("Execute %s%s", self.command, str_stdin)
-        self.cmdresult = utils.run(self.command, timeout=self.timeout,
-                                   stdin=stdin, verbose=False,
-                                   ignore_status=True)
+        cmdresult = None
+        if self.spool_threshold is not None:
+            # API backend would buffer output in memory
+            cmdresult = self._run_spooled(stdin)
+        elif stdin is None and self.docker_interface == 'api':
+            # None when subcommand/options not supported by API backend
+            cmdresult = docker_api.execute(self)
+        if cmdresult is None:
+            cmdresult = utils.run(self.command, timeout=self.timeout,
+                                  stdin=stdin, verbose=False,
+                                  ignore_status=True)
+        self.cmdresult = cmdresult
+        inventory.command_executed(self.subcmd)
+        metrics.record_result(self.subcmd, cmdresult)
         self.executed += 1
         if self.verbose:
             self.subtest.logdebug(str(self))
         # Return value, not reference
         return self.cmdresult
 
+    def _run_spooled(self, stdin):
+        """
+        Run command with stdout redirected to a file, return CmdResult
+        """
+        fd, path = tempfile.mkstemp(prefix='%s_' % self.subcmd.split()[0],
+                                    suffix='.stdout',
+                                    dir=self.subtest.tmpdir)
+        os.close(fd)
+        # Braces so redirect applies to any pipeline in subargs
+        cmdresult = utils.run("{ %s\n} > %s" % (self.command,
+                                                 pipes.quote(path)),
+                              timeout=self.timeout, stdin=stdin,
+                              verbose=False, ignore_status=True)
+        if os.path.getsize(path) > self.spool_threshold:
+            stdout = SpooledOutput(path)
+        else:
+            with open(path, 'rb') as spool:
+                stdout = spool.read()
+            os.unlink(path)
+        return utils.CmdResult(command=self.command, stdout=stdout,
+                               stderr=cmdresult.stderr,
+                               exit_status=cmdresult.exit_status,
+                               duration=cmdresult.duration)
+
     def execute_calls(self):
         """
         Return the number of times ``execute()`` has been called
@@ -365,6 +479,28 @@ class AsyncDockerCmd(DockerCmdBase):
     #: Private, class assumes exclusive access and no locking is performed
     _async_job = None
 
+    #: Private, (stdout, stderr) ``OutputCursor`` of ``read_new_*()``
+    _cursors = None
+
+    #: Private, True once finished job's duration was added to metrics
+    _recorded = False
+
+    #: Keep only the last ``capture_limit`` bytes (or lines) of stdout and
+    #: stderr in memory, streaming complete output to files in the
+    #: subtest's ``tmpdir`` instead.  None keeps all output in memory.
+    capture_limit = None
+
+    #: True if ``capture_limit`` counts lines instead of bytes
+    capture_lines = False
+
+    #: Tuple of stdout & stderr ``output.RingCapture`` instances, or None
+    #: when ``capture_limit`` was None at ``execute()``.
+    captures = None
+
+    #: ``process_group.ProcessGroup`` instance draining output of this and
+    #: other commands from a single thread, or None for dedicated threads.
+    group = None
+
     def execute(self, stdin=None):
         """
         Start execution of asynchronous docker command
@@ -386,10 +522,68 @@ class AsyncDockerCmd(DockerCmdBase):
                 str_stdin = ""
             self.subtest.logdebug("Async-execute: %s%s", str(self), str_stdin)
         self.executed += 1
-        self._async_job = utils.AsyncJob(self.command, verbose=False,
-                                         stdin=stdin, close_fds=True)
+        self._cursors = (OutputCursor(self), OutputCursor(self, True))
+        self._recorded = False
+        tees = {}
+        if self.capture_limit is None:
+            self.captures = None
+        else:
+            self.captures = self._new_captures()
+            tees['stdout_tee'], tees['stderr_tee'] = self.captures
+        if self.group is None:
+            self._async_job = utils.AsyncJob(self.command, verbose=False,
+                                             stdin=stdin, close_fds=True,
+                                             **tees)
+        else:
+            self._async_job = self.group.spawn(self.command, stdin=stdin,
+                                               **tees)
+            if self.captures is not None:
+                # Close capture files as soon as the group reaps process
+                self._async_job.finish_callbacks.append(self._close_captures)
+        if self.captures is not None:
+            for capture, name in zip(self.captures, ('stdout', 'stderr')):
+                lock = getattr(self._async_job, '%s_lock' % name, None)
+                buf = getattr(self._async_job, '%s_file' % name, None)
+                if lock is not None and buf is not None:
+                    with lock:
+                        capture.attach(buf)
         return self.cmdresult
 
+    def _new_captures(self):
+        """
+        Return tuple of new stdout & stderr ``RingCapture`` instances
+        """
+        subcmd = self.subcmd.split()[0]
+        captures = []
+        for name in ('stdout', 'stderr'):
+            fd, path = tempfile.mkstemp(prefix='%s_' % subcmd,
+                                        suffix='.%s' % name,
+                                        dir=self.subtest.tmpdir)
+            os.close(fd)
+            captures.append(RingCapture(path, self.capture_limit,
+                                        self.capture_lines))
+        if not self.quiet:
+            self.subtest.logdebug("Capturing last %d %s of output in memory, "
+                                  "all of it into %s and %s",
+                                  self.capture_limit,
+                                  self.capture_lines and 'lines' or 'bytes',
+                                  captures[0].path, captures[1].path)
+        return tuple(captures)
+
+    def _close_captures(self):
+        """
+        Close capture files, after the process's output was drained
+        """
+        if self.captures is None:
+            return
+        for capture, name in zip(self.captures, ('stdout', 'stderr')):
+            lock = getattr(self._async_job, '%s_lock' % name, None)
+            if lock is None:
+                capture.close()
+            else:
+                with lock:
+                    capture.close()
+
     def wait(self, timeout=None):
         """
         Return CmdResult after waiting for process to end or timeout
@@ -407,7 +601,41 @@ class AsyncDockerCmd(DockerCmdBase):
             self.subtest.logdebug("Waiting %s for async-command to finish",
                                   timeout)
         self._async_job.wait_for(timeout)
-        return self.cmdresult
+        cmdresult = self.cmdresult
+        if cmdresult.exit_status is not None:
+            self._reaped(cmdresult)
+        return cmdresult
+
+    def _drained(self):
+        """
+        Return True if all output of ended process was read
+        """
+        job = self._async_job
+        finished = getattr(job, 'finished', None)  # ``GroupJob``
+        if finished is not None:
+            return finished.is_set()
+        for name in ('stdout_thread', 'stderr_thread'):
+            thread = getattr(job, name, None)
+            if thread is not None and thread.is_alive():
+                return False
+        return True
+
+    def _reaped(self, cmdresult=None):
+        """
+        Record metrics and close captures of ended process, once
+        """
+        if self._recorded:
+            return
+        job = self._async_job
+        if not job.result.duration:
+            # Not wait()ed for, so ended at the latest when found ended
+            job.result.duration = time.time() - job.start_time
+        if cmdresult is None:
+            cmdresult = self.cmdresult
+        inventory.command_executed(self.subcmd)
+        metrics.record_result(self.subcmd, cmdresult)
+        self._close_captures()
+        self._recorded = True
 
     def update_result(self):
         """
@@ -429,7 +657,12 @@ class AsyncDockerCmd(DockerCmdBase):
         if self._async_job is None:
             raise DockerTestError("Attempted to wait for done before execute()"
                                   " called.")
-        return self._async_job.sp.poll() is not None
+        if self._async_job.sp.poll() is None:
+            return False
+        # Killed or abandoned commands may never be wait()ed for
+        if not self._recorded and self._drained():
+            self._reaped()
+        return True
 
     @property
     def process_id(self):
@@ -444,6 +677,98 @@ class AsyncDockerCmd(DockerCmdBase):
                                   " called.")
         return self._async_job.sp.pid
 
+    def _read_from(self, offset, stderr=False, size=None):
+        """
+        Return tuple of job's stdout/stderr data from byte offset and its
+        end offset, without copying all of it.  Data trimmed by a capture
+        is skipped.  At most size bytes are returned, unless None.
+        """
+        job = self._async_job
+        if stderr:
+            buf = getattr(job, 'stderr_file', None)
+            lock = getattr(job, 'stderr_lock', None)
+        else:
+            buf = getattr(job, 'stdout_file', None)
+            lock = getattr(job, 'stdout_lock', None)
+        if buf is None or lock is None:
+            # Unknown AsyncJob implementation, take the slow path
+            if stderr:
+                data = job.get_stderr()[offset:]
+            else:
+                data = job.get_stdout()[offset:]
+            if size is not None:
+                data = data[:size]
+            return data, offset + len(data)
+        # Drainer thread writes at current position, it must be restored
+        with lock:
+            discarded = 0
+            if self.captures is not None:
+                discarded = self.captures[stderr].discarded
+            position = buf.tell()
+            start = max(0, offset - discarded)
+            buf.seek(start)
+            if size is None:
+                data = buf.read()
+            else:
+                data = buf.read(size)
+            buf.seek(position)
+        return data, discarded + start + len(data)
+
+    def cursor(self, stderr=False):
+        """
+        Return new ``OutputCursor`` at start of stdout (or stderr)
+
+        Each reader of output should use its own cursor, so they don't
+        consume each other's data.
+
+        :param stderr: Read from stderr instead of stdout when True
+        """
+        return OutputCursor(self, stderr)
+
+    def read_new_bytes(self, stderr=False):
+        """
+        Return stdout (or stderr) data arriving since the previous call
+
+        Shorthand for the command's own stdout (or stderr) ``OutputCursor``,
+        shared by all callers; separate readers should use ``cursor()``.
+
+        :param stderr: Read from stderr instead of stdout when True
+        :raises DockerTestError: on incorrect usage
+        :return: String of new data, possibly empty
+        """
+        if self._cursors is None:
+            raise DockerTestError("Attempted to read output before execute()"
+                                  " called.")
+        return self._cursors[stderr].read_bytes()
+
+    def read_new_lines(self, stderr=False):
+        """
+        Return list of stdout (or stderr) lines completed since previous call
+
+        Shorthand for the command's own stdout (or stderr) ``OutputCursor``,
+        shared by all callers; separate readers should use ``cursor()``.
+
+        :param stderr: Read from stderr instead of stdout when True
+        :raises DockerTestError: on incorrect usage
+        :return: List of line strings without line endings, possibly empty
+        """
+        if self._cursors is None:
+            raise DockerTestError("Attempted to read output before execute()"
+                                  " called.")
+        return self._cursors[stderr].read_lines()
+
+    def iter_lines(self, stderr=False, timestep=0.2):
+        """
+        Generate all stdout (or stderr) lines as they complete, until
+        process ends, through a new ``OutputCursor``.  Suitable for
+        ``output.TextTableReader``.
+
+        :param stderr: Read from stderr instead of stdout when True
+        :param timestep: Seconds to sleep while waiting for more output
+        :raises DockerTestError: on incorrect usage
+        """
+        return self.cursor(stderr).iter_lines(timestep)
+
     # Override base-class property methods to give up-to-second details
 
     @property
@@ -492,3 +817,221 @@ class AsyncDockerCmd(DockerCmdBase):
             # Current elapsed time
             duration = time.time() - self._async_job.start_time
         return duration
+
+
+class OutputCursor(object):
+
+    """
+    Independent read position in stdout or stderr of an ``AsyncDockerCmd``
+
+    Data is read straight from the command's output buffer, from where the
+    previous read stopped.  Starts over when the command is executed again.
+
+    :param dockercmd: ``AsyncDockerCmd`` instance
+    :param stderr: Read from stderr instead of stdout when True
+    """
+
+    def __init__(self, dockercmd, stderr=False):
+        #: ``AsyncDockerCmd`` instance output is read from
+        self.dockercmd = dockercmd
+        #: True when reading stderr instead of stdout
+        self.stderr = stderr
+        #: Byte offset of data not returned yet
+        self.offset = 0
+        self._partial = ''  # unterminated trailing line held back
+        self._job = None  # job offset belongs to
+
+    def read_bytes(self, size=None):
+        """
+        Return data arriving since the previous read, up to size bytes
+
+        :param size: Maximum number of bytes to return, None for all
+        :raises DockerTestError: on incorrect usage
+        :return: String of new data, possibly empty
+        """
+        # Cursor is part of command pylint: disable=W0212
+        job = self.dockercmd._async_job
+        if job is None:
+            raise DockerTestError("Attempted to read output before execute()"
+                                  " called.")
+        if job is not self._job:
+            self._job = job
+            self.offset = 0
+            self._partial = ''
+        data, self.offset = self.dockercmd._read_from(self.offset,
+                                                      self.stderr, size)
+        return data
+
+    def read_lines(self):
+        """
+        Return list of lines completed since the previous read
+
+        An unterminated last line is only returned once its newline arrives
+        or the process has ended.
+
+        :raises DockerTestError: on incorrect usage
+        :return: List of line strings without line endings, possibly empty
+        """
+        done = self.dockercmd.done  # Before reading, so none can be missed
+        data = self.read_bytes()
+        lines = (self._partial + data).splitlines(True)
+        # A trailing '\r' could be the first half of '\r\n'
+        if lines and not done and not lines[-1].endswith('\n'):
+            self._partial = lines.pop()
+        else:
+            self._partial = ''
+        return [line.rstrip('\r\n') for line in lines]
+
+    def iter_lines(self, timestep=0.2):
+        """
+        Generate lines as they complete, until process ends
+
+        :param timestep: Seconds to sleep while waiting for more output
+        :raises DockerTestError: on incorrect usage
+        """
+        while True:
+            done = self.dockercmd.done  # Before reading, so none is missed
+            for line in self.read_lines():
+                yield line
+            if done:
+                return
+            time.sleep(timestep)
+
+
+class DockerCmdBatch(object):
+
+    """
+    Execute many non-async DockerCmd instances concurrently on ``execute()``
+
+    :param cmds: Iterable of ``DockerCmd`` (or subclass) instances
+    :param max_workers: Maximum number of commands executing at once, None
+                        to use ``docker_batch_workers`` config. option.
+    :param fail_fast: When True, don't start remaining commands after the
+                      first exception, then re-raise it from ``execute()``.
+    :raises DockerTestError: on incorrect usage
+    """
+
+    #: List of command instances in submission order
+    cmds = None
+
+    #: List of ``CmdResult`` or None (raised/not started) per command
+    results = None
+
+    #: List of ``sys.exc_info()`` tuples or None per command
+    exc_infos = None
+
+    def __init__(self, cmds, max_workers=None, fail_fast=False):
+        self.cmds = list(cmds)
+        for cmd in self.cmds:
+            if not isinstance(cmd, DockerCmd):
+                raise DockerTestError("%s is not a DockerCmd instance"
+                                      % cmd.__class__.__name__)
+        if len(set(id(cmd) for cmd in self.cmds)) != len(self.cmds):
+            raise DockerTestError("Batch commands must be unique instances")
+        if max_workers is None:
+            if self.cmds:
+                config = self.cmds[0].subtest.config
+                max_workers = config.get('docker_batch_workers', 4)
+            else:
+                max_workers = 1
+        if int(max_workers) < 1:
+            raise DockerTestError("max_workers must be at least 1, not %s"
+                                  % max_workers)
+        self.max_workers = int(max_workers)
+        self.fail_fast = fail_fast
+        self._lock = threading.Lock()
+        self._next = 0
+        self._stop = False
+
+    def __len__(self):
+        return len(self.cmds)
+
+    def _worker(self):
+        """
+        Execute next unstarted command until none remain or stop requested
+        """
+        while True:
+            with self._lock:
+                if self._stop or self._next >= len(self.cmds):
+                    return
+                index = self._next
+                self._next += 1
+            try:
+                self.results[index] = self.cmds[index].execute()
+            except Exception:  # Re-raised by execute(), pylint: disable=W0703
+                self.exc_infos[index] = sys.exc_info()
+                if self.fail_fast:
+                    self._stop = True
+
+    def execute(self):
+        """
+        Execute all commands, returning after all started ones have finished
+
+        :raises Exception: First exception (in submission order) raised by
+                           a command, only when ``fail_fast`` is True.
+        :return: List of ``CmdResult`` or None, in submission order
+        """
+        self.results = [None] * len(self.cmds)
+        self.exc_infos = [None] * len(self.cmds)
+        self._next = 0
+        self._stop = False
+        workers = [threading.Thread(target=self._worker)
+                   for _ in xrange(min(self.max_workers, len(self.cmds)))]
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+        for worker in workers:
+            worker.join()
+        if self.fail_fast:
+            for exc_info in self.exc_infos:
+                if exc_info is not None:
+                    raise exc_info[0], exc_info[1], exc_info[2]
+        return self.results
+
+    @property
+    def exceptions(self):
+        """
+        List of exception instances or None, in submission order
+        """
+        if self.exc_infos is None:
+            return None
+        return [exc_info and exc_info[1] for exc_info in self.exc_infos]
+
+    @property
+    def failed(self):
+        """
+        List of commands which raised an exception, in submission order
+        """
+        return [cmd for cmd, exc in zip(self.cmds, self.exceptions or [])
+                if exc is not None]
+
+
+def run_many(subtest, subcmds, max_workers=None, timeout=None,
+             command=None):
+    """
+    Run many docker sub-command strings concurrently, from one process group
+
+    :param subtest: A subtest.SubBase or subclass instance
+    :param subcmds: Iterable of docker sub-command and argument strings
+    :param max_workers: Maximum number of commands running at once, None
+                        to use ``docker_batch_workers`` config. option.
+    :param timeout: Seconds after which each command is killed, None to
+                    wait forever.
+    :param command: Callable returning full command line for a sub-command
+                    string, None to prefix it with ``docker_path``.
+    :return: List of ``autotest.client.utils.CmdResult`` instances (with
+             non-zero ``exit_status`` on failure), in order of subcmds.
+    """
+    subcmds = list(subcmds)
+    if max_workers is None:
+        max_workers = int(subtest.config.get('docker_batch_workers', 4))
+    if command is None:
+        docker_path = subtest.config['docker_path']
+        command = lambda subcmd: "%s %s" % (docker_path, subcmd)
+    with ProcessGroup() as group:
+        cmdresults = group.run_all([command(subcmd) for subcmd in subcmds],
+                                   max_workers, timeout)
+    for subcmd, cmdresult in zip(subcmds, cmdresults):
+        inventory.command_executed(subcmd)
+        metrics.record_result(subcmd, cmdresult)
+    return cmdresults
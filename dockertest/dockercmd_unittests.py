@@ -9,6 +9,7 @@ import os
 import shutil
 import sys
 import tempfile
+import time
 import types
 import unittest
 
@@ -111,6 +112,7 @@ setattr(mock('autotest.client.shared.version'), 'get_version',
 mock('autotest.client.shared.base_job')
 mock('autotest.client.shared.job')
 mock('autotest.client.job')
+mock('autotest.client.shared.service')
 
 import version
 
@@ -264,6 +266,88 @@ class DockerCmdTestBasic(DockerCmdTestBase):
         self.assertAlmostEqual(cmdresult.duration, 123)
         # pylint: enable=E1101
 
+    def test_spool(self):
+        import re
+        utils = sys.modules['autotest.client.utils']
+
+        def spool_run(command, *args, **dargs):
+            path = re.search(r"\} > '?([^']+)'?$", command).group(1)
+            size = int(command.split()[-4])
+            open(path, 'wb').write('x' * size)
+            result = run(command, *args, **dargs)
+            result.stderr = ''
+            return result
+        self.fake_subtest.tmpdir = tempfile.mkdtemp(self.__class__.__name__)
+        utils.run = spool_run
+        try:
+            docker_cmd = self.dockercmd.DockerCmd(self.fake_subtest, 'save',
+                                                  ['10'])
+            docker_cmd.spool_threshold = 5
+            stdout = docker_cmd.execute().stdout
+            self.assertEqual(len(stdout), 10)
+            self.assertTrue(isinstance(stdout,
+                                       self.dockercmd.SpooledOutput))
+            # Checked without loading it all
+            self.assertTrue(sys.modules['output'].OutputGood(
+                docker_cmd.cmdresult))
+            self.assertEqual(stdout._mmap, None)
+            self.assertEqual(docker_cmd.cmdresult.command,
+                             docker_cmd.command)
+            self.assertTrue('SpooledOutput' in str(docker_cmd))
+            docker_cmd.subargs = ['5']
+            self.assertEqual(docker_cmd.execute().stdout, 'xxxxx')
+            self.assertEqual(len(os.listdir(self.fake_subtest.tmpdir)), 1)
+        finally:
+            utils.run = run
+            shutil.rmtree(self.fake_subtest.tmpdir)
+
+    def test_name_conflict(self):
+        import names
+        utils = sys.modules['autotest.client.utils']
+        commands = []
+
+        def conflict_run(command, *args, **dargs):
+            commands.append(command)
+            result = run(command, *args, **dargs)
+            if len(commands) == 1:
+                result.exit_status = 125
+                result.stderr = ("Error response from daemon: Conflict. The "
+                                 "name is already in use by container 123")
+            return result
+        name = names.registry.issue("test-")
+        utils.run = conflict_run
+        try:
+            subargs = ['--name=%s' % name, 'busybox', 'echo', name]
+            # Not retried by default
+            docker_cmd = self.dockercmd.DockerCmd(self.fake_subtest, 'run',
+                                                  subargs)
+            self.assertEqual(docker_cmd.execute().exit_status, 125)
+            self.assertEqual(len(commands), 1)
+            del commands[:]
+            docker_cmd = self.dockercmd.NoFailDockerCmd(self.fake_subtest,
+                                                        'run', subargs)
+            docker_cmd.retry_name_conflict = True
+            self.assertEqual(docker_cmd.execute().exit_status, 0)
+            new_name = names.registry.current(name)
+            self.assertNotEqual(new_name, name)
+            self.assertEqual(docker_cmd.container_name, new_name)
+            # Only the --name argument changes
+            self.assertEqual(docker_cmd.subargs, ['--name=%s' % new_name,
+                                                  'busybox', 'echo', name])
+            self.assertTrue(name in commands[0])
+            self.assertTrue(new_name in commands[1])
+            self.assertEqual(docker_cmd.execute_calls(), 2)
+            # Names not issued by registry are never changed
+            del commands[:]
+            docker_cmd = self.dockercmd.DockerCmd(self.fake_subtest, 'run',
+                                                  ['--name foo', 'busybox'])
+            docker_cmd.retry_name_conflict = True
+            self.assertEqual(docker_cmd.execute().exit_status, 125)
+            self.assertEqual(len(commands), 1)
+            self.assertEqual(docker_cmd.container_name, 'foo')
+        finally:
+            utils.run = run
+
     def test_no_fail_docker_cmd(self):
         docker_command = self.dockercmd.NoFailDockerCmd(self.fake_subtest,
                                                         'fake_subcommand')
@@ -310,6 +394,114 @@ class AsyncDockerCmd(DockerCmdTestBase):
         self.assertEqual(docker_cmd.stderr, "STDERR")
         self.assertEqual(docker_cmd.process_id, -1)
 
+    def test_read_new(self):
+        import threading
+        from StringIO import StringIO
+        docker_cmd = self.dockercmd.AsyncDockerCmd(self.fake_subtest,
+                                                   'fake_subcommand',
+                                                   timeout=123)
+        self.assertRaises(self.dockercmd.DockerTestError,
+                          docker_cmd.read_new_bytes)
+        docker_cmd.execute()
+        # Fallback for AsyncJob without buffer attributes
+        self.assertEqual(docker_cmd.read_new_bytes(), "STDOUT")
+        self.assertEqual(docker_cmd.read_new_bytes(), "")
+        self.assertEqual(docker_cmd.read_new_lines(stderr=True), ["STDERR"])
+        job = docker_cmd._async_job
+        job.stdout_file = StringIO()
+        job.stdout_lock = threading.Lock()
+        job.sp.poll = lambda: None
+        job.stdout_file.write("STDOUTfoo\r\nba")
+        self.assertEqual(docker_cmd.read_new_lines(), ["foo"])
+        job.stdout_file.write("r\r")
+        self.assertEqual(docker_cmd.read_new_lines(), [])
+        job.stdout_file.write("\nbaz")
+        self.assertEqual(docker_cmd.read_new_lines(), ["bar"])
+        # Writer position must not be disturbed by reads
+        job.stdout_file.write("!")
+        job.sp.poll = lambda: 0
+        self.assertEqual(docker_cmd.read_new_lines(), ["baz!"])
+        self.assertEqual(docker_cmd.read_new_lines(), [])
+        job.stdout_file.write("\nqux\nquux")
+        self.assertEqual(docker_cmd.read_new_lines(), ["", "qux", "quux"])
+        # Separate readers don't consume each other's output
+        self.assertEqual(list(docker_cmd.iter_lines(timestep=0)),
+                         ["STDOUTfoo", "bar", "baz!", "qux", "quux"])
+        first = docker_cmd.cursor()
+        second = docker_cmd.cursor()
+        self.assertEqual(first.read_bytes(6), "STDOUT")
+        self.assertEqual(first.read_bytes(3), "foo")
+        self.assertEqual(second.read_bytes(9), "STDOUTfoo")
+        self.assertEqual(first.read_lines(), ["", "bar", "baz!", "qux",
+                                              "quux"])
+        self.assertEqual(first.read_lines(), [])
+        self.assertEqual(len(second.read_lines()), 5)
+        # Restart on next execution
+        docker_cmd.execute()
+        self.assertEqual(first.read_bytes(), "STDOUT")
+
+    def test_capture(self):
+        import threading
+        from StringIO import StringIO
+        self.fake_subtest.tmpdir = tempfile.mkdtemp(self.__class__.__name__)
+        try:
+            docker_cmd = self.dockercmd.AsyncDockerCmd(self.fake_subtest,
+                                                       'fake_subcommand',
+                                                       timeout=123)
+            docker_cmd.capture_limit = 4
+            docker_cmd.execute()
+            stdout, stderr = docker_cmd.captures
+            self.assertEqual(os.path.dirname(stderr.path),
+                             self.fake_subtest.tmpdir)
+            job = docker_cmd._async_job
+            job.stdout_file = StringIO()
+            job.stdout_lock = threading.Lock()
+            stdout.attach(job.stdout_file)
+            for data in ('foo\n', 'bar\n', 'baz\n'):
+                job.stdout_file.write(data)
+                stdout.write(data)
+                if data == 'foo\n':
+                    self.assertEqual(docker_cmd.read_new_bytes(), 'foo\n')
+            # Cursor skips trimmed data
+            self.assertEqual(docker_cmd.read_new_bytes(), 'baz\n')
+            # Ended process's capture is closed, even without wait()
+            self.assertTrue(docker_cmd.done)
+            self.assertEqual(stdout._file, None)
+            self.assertEqual(open(stdout.path).read(), 'foo\nbar\nbaz\n')
+            self.assertEqual(stdout.nbytes, 12)
+        finally:
+            shutil.rmtree(self.fake_subtest.tmpdir)
+
+    def test_done_latency(self):
+        import metrics
+        metrics.registry.reset()
+        docker_cmd = self.dockercmd.AsyncDockerCmd(self.fake_subtest,
+                                                   'fake_subcommand',
+                                                   timeout=123)
+        docker_cmd.execute()
+        job = docker_cmd._async_job
+        job.duration = 0  # Not filled in until wait()
+        job.start_time = time.time() - 5
+        self.assertTrue(docker_cmd.done)
+        recorded = metrics.registry.snapshot()['fake_subcommand'].values()[0]
+        metrics.registry.reset()
+        self.assertTrue(recorded['max'] >= 5, recorded)
+
+    def test_group(self):
+        class FakeGroup(object):
+            commands = []
+
+            def spawn(self, command, *args, **dargs):
+                self.commands.append(command)
+                return run(command, *args, **dargs)
+        docker_cmd = self.dockercmd.AsyncDockerCmd(self.fake_subtest,
+                                                   'fake_subcommand',
+                                                   timeout=123)
+        docker_cmd.group = FakeGroup()
+        docker_cmd.execute()
+        self.assertEqual(FakeGroup.commands, [docker_cmd.command])
+        self.assertEqual(docker_cmd.wait().stdout, "STDOUT")
+
     def test_no_execute_calls(self):
         docker_cmd = self.dockercmd.AsyncDockerCmd(self.fake_subtest,
                                                    'fake_subcommand',
@@ -318,5 +510,65 @@ class AsyncDockerCmd(DockerCmdTestBase):
                           docker_cmd.execute_calls)
 
 
+class DockerCmdBatch(DockerCmdTestBase):
+    defaults = {'docker_path': '/foo/bar', 'docker_options': '--not_exist',
+                'docker_timeout': "42.0", 'docker_batch_workers': "3"}
+    customs = {}
+    config_section = "Foo/Bar/Baz"
+
+    def test_order(self):
+        import threading
+        import time
+        running = []
+        peak = []
+
+        def slow_run(command, *args, **dargs):
+            running.append(command)
+            peak.append(len(running))
+            time.sleep(0.01)
+            running.remove(command)
+            return run(command, *args, **dargs)
+        cmds = [self.dockercmd.NoFailDockerCmd(self.fake_subtest, 'fake',
+                                               [str(index)])
+                for index in xrange(10)]
+        cmds[4].subargs.append('unittest_fail')
+        utils = sys.modules['autotest.client.utils']
+        utils.run = slow_run
+        try:
+            batch = self.dockercmd.DockerCmdBatch(cmds)
+            self.assertEqual(batch.max_workers, 3)
+            results = batch.execute()
+        finally:
+            utils.run = run
+        self.assertTrue(max(peak) <= 3)
+        self.assertEqual(results[4], None)
+        self.assertEqual([result.command.split()[-1]
+                          for result in results if result is not None],
+                         [str(index) for index in xrange(10) if index != 4])
+        self.assertEqual([exc is not None for exc in batch.exceptions],
+                         [index == 4 for index in xrange(10)])
+        self.assertEqual(batch.failed, [cmds[4]])
+        self.assertEqual(len(threading.enumerate()), 1)
+
+    def test_fail_fast(self):
+        cmds = [self.dockercmd.NoFailDockerCmd(self.fake_subtest, 'fake',
+                                               [str(index)])
+                for index in xrange(10)]
+        cmds[0].subargs.append('unittest_fail')
+        batch = self.dockercmd.DockerCmdBatch(cmds, max_workers=1,
+                                              fail_fast=True)
+        self.assertRaises(self.xceptions.DockerExecError, batch.execute)
+        self.assertEqual(batch.results, [None] * 10)
+        self.assertEqual(sum(cmd.executed for cmd in cmds), 1)
+
+    def test_invalid(self):
+        cmd = self.dockercmd.DockerCmd(self.fake_subtest, 'fake')
+        self.assertRaises(self.dockercmd.DockerTestError,
+                          self.dockercmd.DockerCmdBatch, [cmd, cmd])
+        self.assertRaises(self.dockercmd.DockerTestError,
+                          self.dockercmd.DockerCmdBatch, [cmd], 0)
+        self.assertEqual(self.dockercmd.DockerCmdBatch([]).execute(), [])
+
+
 if __name__ == '__main__':
     unittest.main()
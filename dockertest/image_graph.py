@@ -0,0 +1,278 @@
+"""
+Parent/child graph of all image layers, built from a single listing
+
+Working out image relationships with ``docker history`` runs a command
+per image.  An ``ImageGraph`` is built once from every image's parent ID
+(see ``DockerImagesBase.get_image_graph()``), then answers ancestor
+queries in time proportional to image depth, descendant queries in time
+proportional to their number, and can be updated in place after
+``docker commit`` / ``docker rmi`` instead of being listed again.
+"""
+
+import bisect
+
+
+class ImageGraph(object):
+
+    """
+    Directed acyclic graph of image long IDs, each pointing at its parent
+
+    :param parents: Optional dictionary of image long ID to parent long
+                    ID, empty string or None for base images.
+    :param names: Optional dictionary of image long ID to iterable of
+                  its full names (``repo:tag``).
+    """
+
+    def __init__(self, parents=None, names=None):
+        self._parent = {}  # long_id -> parent long_id or ''
+        self._children = {}  # long_id -> set of child long_ids
+        self._names = {}  # long_id -> set of full names
+        self._by_name = {}  # full name -> long_id
+        #: Sorted long IDs, for resolving by prefix
+        self.long_ids = []
+        if parents is None:
+            parents = {}
+        if names is None:
+            names = {}
+        for long_id, parent_id in parents.iteritems():
+            self.add(long_id, parent_id, names.get(long_id, ()))
+
+    @classmethod
+    def from_json(cls, items):
+        """
+        Return new instance from ``/images/json?all=1`` response
+
+        :param items: List of dictionaries with ``Id``, ``ParentId`` and
+                      ``RepoTags`` keys.
+        """
+        graph = cls()
+        for item in items:
+            names = [repo_tag for repo_tag in item.get('RepoTags') or []
+                     if repo_tag != '<none>:<none>']
+            graph.add(item['Id'], item.get('ParentId'), names)
+        return graph
+
+    def __contains__(self, long_id):
+        return long_id in self._parent
+
+    def __len__(self):
+        return len(self._parent)
+
+    def __iter__(self):
+        return iter(self.long_ids)
+
+    def add(self, long_id, parent_id=None, names=()):
+        """
+        Add or update image, e.g. after ``docker commit``
+
+        :param long_id: Image long ID string
+        :param parent_id: Parent's long ID, empty string or None for none
+        :param names: Iterable of full names (``repo:tag``) of image
+        """
+        parent_id = parent_id or ''
+        old_parent = self._parent.get(long_id)
+        if old_parent is None:
+            bisect.insort(self.long_ids, long_id)
+            self._children.setdefault(long_id, set())
+        elif old_parent != parent_id:
+            self._children.get(old_parent, set()).discard(long_id)
+        self._parent[long_id] = parent_id
+        if parent_id:
+            self._children.setdefault(parent_id, set()).add(long_id)
+        for name in names:
+            self.tag(long_id, name)
+
+    def remove(self, long_id):
+        """
+        Forget image long_id and its names, children keep their parent ID
+
+        :param long_id: Image long ID string
+        :raises KeyError: If long_id is not in graph
+        """
+        parent_id = self._parent.pop(long_id)
+        del self.long_ids[bisect.bisect_left(self.long_ids, long_id)]
+        if parent_id:
+            self._children.get(parent_id, set()).discard(long_id)
+        if not self._children.get(long_id):
+            self._children.pop(long_id, None)
+        for name in self._names.pop(long_id, ()):
+            del self._by_name[name]
+
+    def tag(self, long_id, name):
+        """
+        Give image long_id full name, taking it from any other image
+
+        :param long_id: Image long ID string
+        :param name: Full name (``repo:tag``) string
+        """
+        self.untag(name)
+        self._names.setdefault(long_id, set()).add(name)
+        self._by_name[name] = long_id
+
+    def untag(self, name):
+        """
+        Remove full name from its image, return that image's long ID
+
+        :param name: Full name (``repo:tag``) string
+        :return: Long ID string or None if name isn't known
+        """
+        long_id = self._by_name.pop(name, None)
+        if long_id is not None:
+            self._names[long_id].discard(name)
+            if not self._names[long_id]:
+                del self._names[long_id]
+        return long_id
+
+    def rmi(self, image):
+        """
+        Apply effect of ``docker rmi image`` which succeeded
+
+        Untags a full name, then removes the image if it has no other
+        names and no children, along with its ancestors left unnamed and
+        childless by that.
+
+        :param image: Full name, long ID or unique ID prefix string
+        :return: List of removed long IDs, image first
+        """
+        long_id = self.untag(image)
+        if long_id is None:
+            long_id = self.resolve(image)
+            if long_id is None:
+                return []
+            for name in list(self._names.get(long_id, ())):
+                self.untag(name)
+        removed = []
+        while (long_id in self._parent and not self._names.get(long_id)
+               and not self._children.get(long_id)):
+            parent_id = self._parent[long_id]
+            self.remove(long_id)
+            removed.append(long_id)
+            long_id = parent_id
+        return removed
+
+    def resolve(self, image_id):
+        """
+        Return long ID starting with image_id, None if none or ambiguous
+
+        :param image_id: Long ID or any unique prefix of one
+        """
+        if image_id in self._parent:
+            return image_id
+        start = bisect.bisect_left(self.long_ids, image_id)
+        found = self.long_ids[start:start + 2]
+        if not found or not found[0].startswith(image_id):
+            return None
+        if len(found) > 1 and found[1].startswith(image_id):
+            return None
+        return found[0]
+
+    def with_name(self, name):
+        """
+        Return long ID of image with full name, None if none
+
+        :param name: Full name (``repo:tag``) string
+        """
+        return self._by_name.get(name)
+
+    def names(self, long_id):
+        """
+        Return sorted list of image long_id's full names
+
+        :param long_id: Image long ID string
+        """
+        return sorted(self._names.get(long_id, ()))
+
+    def parent(self, long_id):
+        """
+        Return parent's long ID of image long_id, None for none
+
+        :param long_id: Image long ID string
+        :raises KeyError: If long_id is not in graph
+        """
+        return self._parent[long_id] or None
+
+    def children(self, long_id):
+        """
+        Return sorted list of long IDs of image long_id's children
+
+        :param long_id: Image long ID string
+        """
+        return sorted(self._children.get(long_id, ()))
+
+    def ancestors(self, long_id):
+        """
+        Return list of long IDs of image long_id's parent, grandparent, etc.
+
+        Stops at first ancestor which is not in graph.
+
+        :param long_id: Image long ID string
+        """
+        result = []
+        parent_id = self._parent.get(long_id)
+        while parent_id in self._parent and parent_id not in result:
+            result.append(parent_id)
+            parent_id = self._parent[parent_id]
+        return result
+
+    def depth(self, long_id):
+        """
+        Return number of ancestors of image long_id in graph
+        """
+        return len(self.ancestors(long_id))
+
+    def descendants(self, long_id):
+        """
+        Return list of long IDs of image long_id's children, grandchildren,
+        etc. with every image before its children.
+
+        :param long_id: Image long ID string
+        """
+        result = []
+        seen = set([long_id])
+        pending = [long_id]
+        while pending:
+            children = []
+            for pending_id in pending:
+                for child_id in sorted(self._children.get(pending_id, ())):
+                    if child_id not in seen:
+                        seen.add(child_id)
+                        children.append(child_id)
+            result += children
+            pending = children
+        return result
+
+    def roots(self):
+        """
+        Return sorted list of long IDs of images without parent in graph
+        """
+        return [long_id for long_id in self.long_ids
+                if self._parent[long_id] not in self._parent]
+
+    def leaves(self):
+        """
+        Return sorted list of long IDs of images without children
+        """
+        return [long_id for long_id in self.long_ids
+                if not self._children.get(long_id)]
+
+    def dangling(self):
+        """
+        Return sorted list of long IDs of unnamed images without children
+        """
+        return [long_id for long_id in self.leaves()
+                if not self._names.get(long_id)]
+
+    def removal_order(self, images):
+        """
+        Return images sorted so every one comes before all its ancestors
+
+        :param images: Iterable of long IDs, unique ID prefixes or full
+                       names; unknown ones are put last.
+        """
+        def depth(image):
+            """ Depth of image, -1 when it isn't known """
+            long_id = self.with_name(image) or self.resolve(image)
+            if long_id is None:
+                return -1
+            return self.depth(long_id)
+        return sorted(images, key=depth, reverse=True)
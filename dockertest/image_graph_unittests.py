@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+
+# Pylint runs from a different directory, it's fine to import this way
+# pylint: disable=W0403
+
+import unittest
+
+
+class ImageGraphTest(unittest.TestCase):
+
+    #   base -> a1 -> a2 (named a:2)
+    #        \-> b1 (named b:1) -> b2
+    #   other (named other:latest)
+    parents = {'base': '', 'a1': 'base', 'a2': 'a1', 'b1': 'base',
+               'b2': 'b1', 'other': None}
+    names = {'base': ['base:latest'], 'a2': ['a:2'], 'b1': ['b:1'],
+             'other': ['other:latest']}
+
+    def setUp(self):
+        import image_graph
+        self.image_graph = image_graph
+        self.graph = image_graph.ImageGraph(self.parents, self.names)
+
+    def test_queries(self):
+        graph = self.graph
+        self.assertEqual(len(graph), 6)
+        self.assertTrue('a1' in graph)
+        self.assertEqual(graph.parent('a2'), 'a1')
+        self.assertEqual(graph.parent('base'), None)
+        self.assertEqual(graph.children('base'), ['a1', 'b1'])
+        self.assertEqual(graph.ancestors('a2'), ['a1', 'base'])
+        self.assertEqual(graph.ancestors('base'), [])
+        self.assertEqual(graph.descendants('base'), ['a1', 'b1', 'a2', 'b2'])
+        self.assertEqual(graph.roots(), ['base', 'other'])
+        self.assertEqual(graph.leaves(), ['a2', 'b2', 'other'])
+        self.assertEqual(graph.dangling(), ['b2'])
+        self.assertEqual(graph.with_name('b:1'), 'b1')
+        self.assertEqual(graph.names('base'), ['base:latest'])
+
+    def test_resolve(self):
+        self.assertEqual(self.graph.resolve('oth'), 'other')
+        self.assertEqual(self.graph.resolve('b'), None)  # ambiguous
+        self.assertEqual(self.graph.resolve('b2'), 'b2')
+        self.assertEqual(self.graph.resolve('nope'), None)
+
+    def test_removal_order(self):
+        order = self.graph.removal_order(['base', 'unknown', 'a:2', 'b1'])
+        self.assertEqual(order, ['a:2', 'b1', 'base', 'unknown'])
+
+    def test_commit(self):
+        self.graph.add('a3', 'a2', ['a:3'])
+        self.assertEqual(self.graph.ancestors('a3'), ['a2', 'a1', 'base'])
+        self.graph.add('a3', 'b2', ['a:2'])  # tag moved, re-parented
+        self.assertEqual(self.graph.children('a2'), [])
+        self.assertEqual(self.graph.with_name('a:2'), 'a3')
+        self.assertEqual(self.graph.names('a3'), ['a:2', 'a:3'])
+        self.assertEqual(self.graph.dangling(), ['a2'])
+
+    def test_rmi(self):
+        graph = self.graph
+        # Image with children only loses its name
+        self.assertEqual(graph.rmi('b:1'), [])
+        self.assertEqual(graph.names('b1'), [])
+        # Unnamed childless ancestors are removed with it
+        self.assertEqual(graph.rmi('a:2'), ['a2', 'a1'])
+        self.assertFalse('a1' in graph)
+        self.assertEqual(graph.children('base'), ['b1'])
+        self.assertEqual(graph.rmi('b2'), ['b2', 'b1'])
+        self.assertEqual(graph.rmi('base'), ['base'])
+        self.assertEqual(graph.rmi('base'), [])
+        self.assertEqual(list(graph), ['other'])
+        self.assertEqual(graph.with_name('base:latest'), None)
+
+    def test_from_json(self):
+        graph = self.image_graph.ImageGraph.from_json([
+            {'Id': 'child', 'ParentId': 'parent',
+             'RepoTags': ['<none>:<none>']},
+            {'Id': 'parent', 'ParentId': '', 'RepoTags': ['foo:bar']}])
+        self.assertEqual(graph.ancestors('child'), ['parent'])
+        self.assertEqual(graph.names('child'), [])
+        self.assertEqual(graph.with_name('foo:bar'), 'parent')
+
+
+if __name__ == '__main__':
+    unittest.main()
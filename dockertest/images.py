@@ -25,9 +25,19 @@ Note: As in other places, the terms 'repo' and 'image' are used
 # Pylint runs from another directory, ignore relative import warnings
 # pylint: disable=W0403
 
+import httplib
+import json
 import re
+import socket
 from config import none_if_empty
 from autotest.client import utils
+import docker_api
+import dockercmd
+import inventory
+import metrics
+import names
+from image_graph import ImageGraph
+from lookup import LookupIndex, lru_memo
 from output import OutputGood
 from output import TextTable
 from subtest import SubBase
@@ -43,8 +53,13 @@ class DockerImage(object):  # pylint: disable=R0902
     """
 
     #: There will likely be many instances, limit memory consumption.
-    __slots__ = ["repo_addr", "user", "repo", "tag", "full_name", "long_id",
-                 "short_id", "created", "size"]
+    #: Name components are parsed from constructor arguments when first
+    #: read.
+    __slots__ = ["long_id", "created", "size", "_args", "_components"]
+
+    #: Attributes compared by ``__eq__()``
+    fields = ("repo_addr", "user", "repo", "tag", "full_name", "long_id",
+              "short_id", "created", "size")
 
     #: Regular expression for fully-qualified-image-name (FQIN)
     #: parsing, spec defined in docker-io documentation.  e.g.
@@ -68,24 +83,11 @@ class DockerImage(object):  # pylint: disable=R0902
         :param user: String representing username as consumed by usage context
         """
 
-        if repo_addr is None and user is None and tag is None:
-            repo, tag, repo_addr, user = self.split_to_component(repo)
-        elif repo_addr is None and user is None:
-            repo, _, repo_addr, user = self.split_to_component(repo)
-        elif repo_addr is None:
-            repo, _, repo_addr, _ = self.split_to_component(repo)
-
-        self.repo = repo
-        self.tag = tag
+        self._args = (repo, tag, repo_addr, user)
+        self._components = None
         self.long_id = long_id
         self.created = created
         self.size = size
-        self.repo_addr = repo_addr
-        self.user = user
-
-        self.short_id = long_id[:12]
-        self.full_name = self.full_name_from_component(repo, tag,
-                                                       repo_addr, user)
 
     def __eq__(self, other):
         """
@@ -94,13 +96,80 @@ class DockerImage(object):  # pylint: disable=R0902
         :param other: An instance of this class (or subclass) for comparison.
         """
 
-        self_val = [getattr(self, name) for name in self.__slots__]
-        other_val = [getattr(other, name) for name in self.__slots__]
+        self_val = [getattr(self, name) for name in self.fields]
+        other_val = [getattr(other, name) for name in self.fields]
         for _self, _other in zip(self_val, other_val):
             if _self != _other:
                 return False
         return True
 
+    # private methods don't need docstrings
+    def _parse(self):  # pylint: disable=C0111
+        # repo, tag, repo_addr, user, full_name
+        if self._components is None:
+            repo, tag, repo_addr, user = self._args
+            if repo_addr is None and user is None and tag is None:
+                repo, tag, repo_addr, user = self.split_to_component(repo)
+            elif repo_addr is None and user is None:
+                repo, _, repo_addr, user = self.split_to_component(repo)
+            elif repo_addr is None:
+                repo, _, repo_addr, _ = self.split_to_component(repo)
+            full_name = self.full_name_from_component(repo, tag,
+                                                      repo_addr, user)
+            self._components = (repo, tag, repo_addr, user, full_name)
+        return self._components
+
+    @property
+    def repo(self):
+        """
+        String repository name component
+        """
+        return self._parse()[0]
+
+    @property
+    def tag(self):
+        """
+        String tag name component or None
+        """
+        return self._parse()[1]
+
+    @property
+    def repo_addr(self):
+        """
+        String network address/port component or None
+        """
+        return self._parse()[2]
+
+    @property
+    def user(self):
+        """
+        String username component or None
+        """
+        return self._parse()[3]
+
+    @property
+    def full_name(self):
+        """
+        FQIN string, Fully Qualified Image Name
+        """
+        return self._parse()[4]
+
+    @property
+    def short_id(self):
+        """
+        First 12 characters of ``long_id``
+        """
+        return self.long_id[:12]
+
+    def with_full_name(self, full_name):
+        """
+        Return copy of this instance with a different FQIN
+
+        :param full_name: FQIN, Fully Qualified Image Name
+        """
+        return self.__class__(full_name, None, self.long_id, self.created,
+                              self.size)
+
     def __str__(self):
         """
         Break down full_name components into a human-readable string
@@ -117,7 +186,9 @@ class DockerImage(object):  # pylint: disable=R0902
         """
         return "DockerImage(%s)" % str(self)
 
+    # Same FQINs are split over and over
     @staticmethod
+    @lru_memo()
     def split_to_component(full_name):
         """
         Split full_name FQIN string into separate component strings
@@ -143,7 +214,9 @@ class DockerImage(object):  # pylint: disable=R0902
             raise DockerFullNameFormatError(full_name)
         return repo, tag, repo_addr, user
 
+    # Same FQINs are built over and over
     @staticmethod
+    @lru_memo()
     def full_name_from_component(repo, tag=None, repo_addr=None, user=None):
         """
         Fully form a name (FQIN) based on individual components.
@@ -330,23 +403,17 @@ class DockerImagesBase(object):
         :param prefix: Name prefix
         :param suffix: Name suffix
         :param length: Length of random string (greater than 1)
-        :return: Image name guaranteed to not be in-use.
+        :return: Image name never issued before in this process, and
+                 very unlikely in-use
         """
 
         assert length > 1
         if prefix:
-            _name = "%s_%s_%%s" % (self.subtest.__class__.__name__, prefix)
+            head = "%s_%s_" % (self.subtest.__class__.__name__, prefix)
         else:
-            _name = "%s_%%s" % self.subtest.__class__.__name__
-        all_images = self.list_imgs_full_name()
-        if suffix:
-            _name += suffix
-        for _ in xrange(1000):
-            name = _name % utils.generate_random_string(length)
-            if self.gen_lower_only:
-                name = name.lower()
-            if name not in all_images:
-                return name
+            head = "%s_" % self.subtest.__class__.__name__
+        return names.registry.issue(head, suffix, length,
+                                    lower=self.gen_lower_only)
 
     # Not defined static on purpose
     def get_dockerimages_list(self):    # pylint: disable=R0201
@@ -476,8 +543,38 @@ class DockerImagesBase(object):
                  on FQIN components.
         """
 
-        dis = self.get_dockerimages_list()
-        return [di for di in dis if di.cmp_id(image_id)]
+        return self.index_imgs().with_id(image_id)
+
+    def list_imgs_with_image_ids(self, image_ids):
+        """
+        Return dictionary of each image ID to list of its matches.
+
+        :param image_ids: Iterable of long or short (12-character) image IDs
+        :return: Dictionary of image ID to **possibly overlapping**
+                 [DockerImage-like, DockerImage-like, ...]
+        """
+
+        return self.index_imgs().with_ids(image_ids)
+
+    def index_imgs(self):
+        """
+        Return full name and ID indexes of ``get_dockerimages_list()``
+
+        :return: ``lookup.LookupIndex`` instance
+        """
+
+        return LookupIndex(self.get_dockerimages_list(), 'full_name')
+
+    # Not defined static on purpose
+    def get_image_graph(self):  # pylint: disable=R0201
+        """
+        Return parent/child graph of all images, including intermediate ones
+
+        :raise RuntimeError: if not defined by subclass
+        :return: ``image_graph.ImageGraph`` instance
+        """
+
+        raise RuntimeError()
 
     # Disabled by default extension point, can't be static.
     def remove_image_by_id(self, image_id):  # pylint: disable=R0201
@@ -507,6 +604,25 @@ class DockerImagesBase(object):
         del full_name  # keep pylint happy
         raise RuntimeError()
 
+    def remove_many(self, images):
+        """
+        Remove those of many images which exist, children before parents,
+        listing them only once.
+
+        :param images: Iterable of full names, long or short image IDs
+        :raise: Same as remove_image_by_full_name()
+        :return: Dictionary of each image to None if it didn't exist, or
+                 same value as remove_image_by_full_name()
+        """
+        images = list(images)
+        result = dict.fromkeys(images)
+        graph = self.get_image_graph()
+        for image in graph.removal_order(images):
+            if graph.with_name(image) or graph.resolve(image):
+                result[image] = self.remove_image_by_full_name(image)
+                graph.rmi(image)
+        return result
+
     def remove_image_by_image_obj(self, image_obj):
         """
         Alias for remove_image_by_full_name(image_obj.full_name)
@@ -532,6 +648,13 @@ class DockerImagesCLI(DockerImagesBase):
     #: Arguments to use when listing images
     images_args = "--no-trunc"
 
+    #: Maximum image IDs passed to a single ``docker inspect``
+    inspect_batch = 100
+
+    #: Maximum ``docker rmi`` commands ``remove_many()`` runs at once,
+    #: None to use ``docker_batch_workers`` config. option.
+    remove_concurrency = None
+
     def __init__(self, subtest, timeout=None, verbose=False):
         super(DockerImagesCLI, self).__init__(subtest,
                                               timeout,
@@ -552,6 +675,15 @@ class DockerImagesCLI(DockerImagesBase):
         texttable = TextTable(stdout_strip)
         return [self._di_from_row(row) for row in texttable]
 
+    def docker_command(self, cmd):
+        """
+        Return full command line executing the docker command cmd.
+
+        :param cmd: Command which should be called using docker
+        """
+
+        return "%s %s" % (self.subtest.config['docker_path'], cmd)
+
     def docker_cmd(self, cmd, timeout=None):
         """
         Called on to execute the docker command cmd with timeout.
@@ -561,18 +693,24 @@ class DockerImagesCLI(DockerImagesBase):
         :return: ``autotest.client.utils.CmdResult`` instance
         """
 
-        docker_image_cmd = ("%s %s" % (self.subtest.config['docker_path'],
-                                       cmd))
+        docker_image_cmd = self.docker_command(cmd)
         if timeout is None:
             timeout = self.timeout
         from autotest.client.shared.error import CmdError
         try:
-            return utils.run(docker_image_cmd,
-                             verbose=self.verbose,
-                             timeout=timeout)
+            cmdresult = utils.run(docker_image_cmd,
+                                  verbose=self.verbose,
+                                  timeout=timeout)
         except CmdError, detail:
+            inventory.command_executed(cmd)
+            # Failed commands take time too
+            metrics.record_result(cmd, getattr(detail, 'result_obj',
+                                               None))
             raise DockerCommandError(detail.command, detail.result_obj,
                                      additional_text=detail.additional_text)
+        inventory.command_executed(cmd)
+        metrics.record_result(cmd, cmdresult)
+        return cmdresult
 
     def docker_cmd_check(self, cmd, timeout=None):
         """
@@ -583,11 +721,122 @@ class DockerImagesCLI(DockerImagesBase):
         OutputGood(result)
         return result
 
+    # private methods don't need docstrings
+    def _docker_cmd_overridden(self):  # pylint: disable=C0111
+        docker_cmd = getattr(self.__class__.docker_cmd, 'im_func', None)
+        return docker_cmd is not DockerImagesCLI.docker_cmd.im_func
+
+    # private methods don't need docstrings
+    def _shared_inventory(self):  # pylint: disable=C0111
+        # Overridden docker_cmd() or docker_command() may talk to a
+        # different daemon
+        docker_command = getattr(self.__class__.docker_command, 'im_func',
+                                 None)
+        if (self._docker_cmd_overridden() or
+                docker_command is not DockerImagesCLI.docker_command.im_func):
+            return None
+        return inventory.get_inventory(self.subtest.config)
+
+    # private methods don't need docstrings
+    def _run_many(self, cmds):  # pylint: disable=C0111
+        if not self._docker_cmd_overridden():
+            return dockercmd.run_many(self.subtest, cmds,
+                                      self.remove_concurrency, self.timeout,
+                                      self.docker_command)
+        # Overridden docker_cmd() may run commands some other way
+        from autotest.client.shared.error import CmdError
+        cmdresults = []
+        for cmd in cmds:
+            try:
+                cmdresults.append(self.docker_cmd(cmd, self.timeout))
+            except CmdError, detail:
+                cmdresults.append(detail.result_obj)
+        return cmdresults
+
     def get_dockerimages_list(self):
+        shared = self._shared_inventory()
+        if shared is None:
+            return self._list_images()
+        return shared.list_images((self.__class__, self.images_args),
+                                  self._list_images)
+
+    def index_imgs(self):
+        shared = self._shared_inventory()
+        if shared is None:
+            return LookupIndex(self._list_images(), 'full_name')
+        return shared.index_images((self.__class__, self.images_args),
+                                   self._list_images)
+
+    # private methods don't need docstrings
+    def _list_images(self):  # pylint: disable=C0111
         cmdresult = self.docker_cmd("images %s" % self.images_args,
                                     self.timeout)
         return self._parse_colums(cmdresult.stdout.strip())
 
+    def get_image_graph(self):
+        """
+        Return graph of ``docker images -a`` listing, with parents read
+        by one ``docker inspect`` per ``inspect_batch`` of them.
+
+        :return: ``image_graph.ImageGraph`` instance
+        """
+        cmdresult = self.docker_cmd("images -a --no-trunc", self.timeout)
+        names = {}
+        for image in self._parse_colums(cmdresult.stdout.strip()):
+            image_names = names.setdefault(image.long_id, [])
+            if image.repo != '<none>' and image.tag != '<none>':
+                image_names.append(image.full_name)
+        long_ids = sorted(names)
+        parents = {}
+        for start in xrange(0, len(long_ids), self.inspect_batch):
+            batch = long_ids[start:start + self.inspect_batch]
+            cmd = ("inspect --format '{{.Id}} {{.Parent}}' %s"
+                   % ' '.join(batch))
+            stdout = self.docker_cmd(cmd, self.timeout).stdout
+            for line in stdout.splitlines():
+                ids = line.split()
+                if ids:
+                    parents[ids[0]] = (ids[1:] or [''])[0]
+        return ImageGraph(parents, names)
+
+    def remove_many(self, images):
+        """
+        Remove those of many images which exist, running up to
+        ``remove_concurrency`` ``docker rmi`` at once for images of equal
+        depth, deepest first, so children go before their parents.
+
+        :param images: Iterable of full names, long or short image IDs
+        :raise DockerOutputError: When ``verify_output`` is True and output
+                                  of any ``docker rmi`` is bad, after all ran.
+        :return: Dictionary of each image to None if it didn't exist (or
+                 was removed along with a child), or its
+                 ``autotest.client.utils.CmdResult`` instance (with
+                 non-zero ``exit_status`` if removal failed).
+        """
+        images = list(images)
+        result = dict.fromkeys(images)
+        graph = self.get_image_graph()
+        by_depth = {}
+        for image in images:
+            long_id = graph.with_name(image) or graph.resolve(image)
+            if long_id is not None:
+                by_depth.setdefault(graph.depth(long_id), []).append(image)
+        for depth in sorted(by_depth, reverse=True):
+            # Removing children may have removed unnamed parents
+            wave = [image for image in by_depth[depth]
+                    if graph.with_name(image) or graph.resolve(image)]
+            cmdresults = self._run_many(["rmi %s" % image
+                                         for image in wave])
+            for image, cmdresult in zip(wave, cmdresults):
+                result[image] = cmdresult
+                if cmdresult.exit_status == 0:
+                    graph.rmi(image)
+        if self.verify_output:
+            for cmdresult in result.itervalues():
+                if cmdresult is not None:
+                    OutputGood(cmdresult)
+        return result
+
     def remove_image_by_id(self, image_id):
         """
         Use docker CLI to removes image matching long or short image_ID.
@@ -615,6 +864,91 @@ class DockerImagesCLI(DockerImagesBase):
         return dkrcmd("rmi %s" % full_name, self.timeout)
 
 
+class DockerImagesAPI(DockerImagesCLI):
+
+    """
+    DockerImage-like instance collection listed through the remote API at
+    ``docker_socket``, other operations run docker CLI.  Instance
+    ``created`` attributes are unix time integers and ``size`` is virtual
+    size in bytes.  Listing falls back to docker CLI if daemon can't be
+    reached and no ``filters`` are set.
+    """
+
+    #: Dictionary of server-side filter name to list of values applied to
+    #: every listing (e.g. ``{'dangling': ['true']}``), None for all.
+    filters = None
+
+    # private methods don't need docstrings
+    def _shared_inventory(self):  # pylint: disable=C0111
+        # Filtered listings aren't the shared ones
+        if self.filters:
+            return None
+        return super(DockerImagesAPI, self)._shared_inventory()
+
+    def get_image_json(self, all_images=None):
+        """
+        Return list of image dictionaries from ``/images/json``
+
+        :param all_images: Include intermediate images, None when ``-a``
+                           is in ``images_args``.
+        :raises ValueError: On daemon error response
+        :raises socket.error: When daemon could not be contacted
+        """
+        if all_images is None:
+            all_images = '-a' in self.images_args.split()
+        params = {'all': int(bool(all_images))}
+        if self.filters:
+            params['filters'] = json.dumps(self.filters)
+        client = docker_api.get_config_client(self.subtest.config)[0]
+        return docker_api.get_json(client,
+                                   docker_api.query('/images/json', **params),
+                                   self.timeout)
+
+    @staticmethod
+    def _dis_from_json(item):
+        # One instance per repository:tag, like docker images rows
+        dis = []
+        for repo_tag in item.get('RepoTags') or ['<none>:<none>']:
+            repo, sep, tag = repo_tag.rpartition(':')
+            if not sep or '/' in tag:
+                repo, tag = repo_tag, '<none>'
+            dis.append(DockerImage(repo, tag, item['Id'],
+                                   item.get('Created'),
+                                   item.get('VirtualSize')))
+        return dis
+
+    # private methods don't need docstrings
+    def _list_images(self):  # pylint: disable=C0111
+        try:
+            items = self.get_image_json()
+        except (socket.error, httplib.HTTPException, ValueError), detail:
+            if self.filters:
+                raise
+            self.subtest.logdebug("Listing images through remote API "
+                                  "failed: %s, using CLI", detail)
+            return super(DockerImagesAPI, self)._list_images()
+        dis = []
+        for item in items:
+            dis += self._dis_from_json(item)
+        return dis
+
+    def get_image_graph(self):
+        """
+        Return graph of ``/images/json?all=1`` listing, falls back to
+        docker CLI if daemon can't be reached and no ``filters`` are set.
+
+        :return: ``image_graph.ImageGraph`` instance
+        """
+        try:
+            return ImageGraph.from_json(self.get_image_json(True))
+        except (socket.error, httplib.HTTPException, ValueError), detail:
+            if self.filters:
+                raise
+            self.subtest.logdebug("Listing images through remote API "
+                                  "failed: %s, using CLI", detail)
+            return super(DockerImagesAPI, self).get_image_graph()
+
+
 class DockerImages(object):
 
     """
@@ -623,7 +957,8 @@ class DockerImages(object):
 
     #: Mapping of interface short-name string to DockerImagesBase subclass.
     #: (shortens line-length when instantiating)
-    interfaces = {"cli": DockerImagesCLI}
+    interfaces = {"cli": DockerImagesCLI,
+                  "api": DockerImagesAPI}
 
     def __init__(self, subtest, interface_name="cli",
                  timeout=None, verbose=False):
@@ -69,6 +69,7 @@ mock('autotest.client.shared.base_job')
 mock('autotest.client.shared.job')
 mock('autotest.client.shared.utils')
 mock('autotest.client.job')
+mock('autotest.client.shared.service')
 
 import version
 
@@ -328,6 +329,115 @@ class DockerImageTestBasic(ImageTestBase):
         self.assertEqual(images.docker_cmd("command_pass").command,
                          '/foo/bar command_pass')
 
+    def test_lazy_components(self):
+        image = self.images.DockerImage('localhost:5000/user/repo', 'tag',
+                                        'a' * 64, 'created', 'size')
+        self.assertEqual(image._components, None)
+        self.assertEqual(image.full_name, 'localhost:5000/user/repo:tag')
+        self.assertEqual((image.repo_addr, image.user, image.repo,
+                          image.tag), ('localhost:5000', 'user', 'repo',
+                                       'tag'))
+        self.assertEqual(image.short_id, 'a' * 12)
+        same = self.images.DockerImage('localhost:5000/user/repo', 'tag',
+                                       'a' * 64, 'created', 'size')
+        self.assertEqual(image, same)
+        untagged = self.images.DockerImage('<none>', '<none>', 'b' * 64,
+                                           'created', 'size')
+        self.assertEqual(untagged.full_name, '<none>:<none>')
+        self.assertNotEqual(image, untagged)
+
+
+class FakeResponse(object):
+
+    def __init__(self, body):
+        self.status = 200
+        self.body = body
+
+    def read(self):
+        return self.body
+
+
+class FakeClient(object):
+
+    def __init__(self, body):
+        self.body = body
+        self.resources = []
+
+    def request(self, method, resource, body=None, headers=None,
+                timeout=None):
+        self.resources.append(resource)
+        return FakeResponse(self.body)
+
+
+class DockerImagesAPITest(ImageTestBase):
+
+    defaults = {'docker_path': '/foo/bar', 'docker_options': '--not_exist',
+                'docker_timeout': 60.0}
+    customs = {}
+    config_section = "Foo/Bar/Baz"
+
+    images_json = """[{
+        "Id": "58394af373423902a1b97f209a31e3777932d9321ef10e64feaaa7b4df609cf9",
+        "RepoTags": ["192.168.122.245:5000/fedora:latest", "fedora:latest"],
+        "Created": 1395841362,
+        "VirtualSize": 385500000},
+        {"Id": "0d20aec6529d5d396b195182c0eaa82bfe014c3e82ab390203ed56a774d2c404",
+        "ParentId": "58394af373423902a1b97f209a31e3777932d9321ef10e64feaaa7b4df609cf9",
+        "RepoTags": null,
+        "Created": 1395841363,
+        "VirtualSize": 387000000}]"""
+
+    def setUp(self):
+        super(DockerImagesAPITest, self).setUp()
+        import docker_api
+        self.docker_api = docker_api
+        self.client = FakeClient(self.images_json)
+        docker_api.get_client('/var/run/docker.sock')[0] = self.client
+
+    def tearDown(self):
+        self.docker_api._clients.clear()
+        super(DockerImagesAPITest, self).tearDown()
+
+    def test_list_api(self):
+        d = self.images.DockerImages(self.fake_subtest, 'api')
+        self.assertEqual(d.list_imgs_full_name(),
+                         ['192.168.122.245:5000/fedora:latest',
+                          'fedora:latest', '<none>:<none>'])
+        img = d.list_imgs_with_full_name('fedora:latest')[0]
+        self.assertEqual((img.repo_addr, img.repo, img.tag),
+                         ('192.168.122.245:5000', 'fedora', 'latest'))
+        self.assertEqual(img.size, 385500000)
+        d.images_args += ' -a'
+        d.filters = {'dangling': ['true']}
+        self.assertEqual(len(d.list_imgs_with_image_id('0d20aec6529d')), 1)
+        self.assertEqual(self.client.resources[0], '/images/json?all=0')
+        self.assertTrue(self.client.resources[-1].startswith(
+            '/images/json?all=1&filters='))
+
+    def test_graph_api(self):
+        d = self.images.DockerImages(self.fake_subtest, 'api')
+        graph = d.get_image_graph()
+        self.assertEqual(self.client.resources[-1], '/images/json?all=1')
+        child = graph.resolve('0d20aec6529d')
+        self.assertEqual(graph.ancestors(child),
+                         [graph.with_name('fedora:latest')])
+        self.assertEqual(graph.dangling(), [child])
+
+    def test_remove_many(self):
+        d = self.images.DockerImages(self.fake_subtest, 'api')
+        osfd, filename = tempfile.mkstemp()
+        os.close(osfd)
+        try:
+            self.fake_subtest.config['docker_path'] = 'echo >>%s' % filename
+            result = d.remove_many(['fedora:latest', '0d20aec6529d', 'gone'])
+            self.assertEqual(result['gone'], None)
+            self.assertEqual(result['fedora:latest'].exit_status, 0)
+            # Child first
+            self.assertEqual(open(filename).read(),
+                             "rmi 0d20aec6529d\nrmi fedora:latest\n")
+        finally:
+            os.unlink(filename)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,522 @@
+"""
+Container and image listings shared until ``docker events`` shows a change
+
+Listing containers or images means running ``docker ps -a --no-trunc`` or
+``docker images`` and parsing the whole table, which lookups by name or ID
+in ``containers`` and ``images`` modules repeat every time.  When enabled
+by the ``docker_inventory`` option, an ``Inventory`` keeps those listings,
+with a background thread subscribed to the daemon's event stream
+(at ``docker_socket``) applying changes:
+
+*  ``destroy`` (container) and ``delete`` (image) events drop the entry
+*  container state events (``create``, ``start``, ``die``, etc.) mark the
+   container's rows, which are re-read together on next use
+*  ``tag`` and ``untag`` events add or drop the named image row
+*  events which can't change listings (``attach``, ``exec_start``, network
+   or volume events, etc.) are ignored
+*  any other event marks affected listing stale, to be re-read on next use
+
+Listings are also re-read after ``docker_inventory_max_age`` seconds,
+or when the event stream is not available.  Since events of a command's
+changes may arrive after the caller's next lookup, the next lookup after
+mutating commands executed through this API (see ``command_executed()``)
+first applies all events up to that moment.
+"""
+
+# Pylint runs from a different directory, it's fine to import this way
+# pylint: disable=W0403
+
+import httplib
+import socket
+import threading
+import time
+import docker_api
+from lookup import LookupIndex
+
+
+#: Event status strings which only change container listings
+CONTAINER_EVENTS = frozenset(('attach', 'create', 'destroy', 'die',
+                              'export', 'kill', 'oom', 'pause', 'rename',
+                              'resize', 'restart', 'start', 'stop', 'top',
+                              'unpause'))
+
+#: Event status strings which only change the container's own rows
+CONTAINER_ROW_EVENTS = frozenset(('create', 'die', 'health_status', 'kill',
+                                  'oom', 'pause', 'rename', 'restart',
+                                  'start', 'stop', 'unpause'))
+
+#: Event status strings which never change container or image listings
+UNCHANGED_EVENTS = frozenset(('attach', 'detach', 'exec_create',
+                              'exec_detach', 'exec_die', 'exec_start',
+                              'export', 'resize', 'top'))
+
+#: Event ``Type`` values of container or image events, others are ignored
+LISTED_EVENT_TYPES = frozenset(('container', 'image'))
+
+#: Subcommands which never change container or image listings
+READ_ONLY_SUBCOMMANDS = frozenset(('events', 'history', 'images', 'info',
+                                   'inspect', 'logs', 'port', 'ps',
+                                   'search', 'top', 'version'))
+
+#: Private cache of socket path to shared Inventory
+_inventories = {}
+
+#: Private lock guarding _inventories
+_inventories_lock = threading.Lock()
+
+#: Private count of commands which may have changed containers or images
+_generation = 0
+
+
+class InventoryCache(object):
+
+    """
+    Thread-safe listings of items with ``long_id``, by listing arguments
+
+    Listings given a ``row_loader`` re-read only rows of marked items (see
+    ``mark()``), it's called with a set of long-ids and returns a list of
+    those items' current rows, or None when the whole listing must be
+    re-read.  Tagging (see ``tag()``) requires items with a
+    ``with_full_name()`` method.
+
+    :param max_age: Maximum seconds a listing is used before re-reading it
+    :param name_attr: Name of attribute holding each item's name
+    """
+
+    #: Name of each item's name, when it has none
+    untagged_name = '<none>:<none>'
+
+    def __init__(self, max_age, name_attr):
+        self.max_age = max_age
+        self.name_attr = name_attr
+        self._lock = threading.Lock()
+        self._listings = {}  # key -> (load time, [item, ...])
+        self._indexes = {}  # key -> ([item, ...], LookupIndex)
+        self._row_loaders = {}  # key -> row_loader
+        self._marked = {}  # key -> set of long_ids with changed rows
+
+    def _items(self, key, loader, row_loader=None):
+        """
+        Return cached list for key, calling loader() if missing or stale
+        """
+        with self._lock:
+            if row_loader is not None:
+                self._row_loaders[key] = row_loader
+            cached = self._listings.get(key)
+            marked = self._marked.pop(key, None)
+        if (isinstance(cached, tuple) and
+                time.time() - cached[0] < self.max_age):
+            if not marked:
+                return cached[1]
+            items = self._reload_rows(key, cached, marked)
+            if items is not None:
+                return items
+        # Invalidation while loader runs replaces this marker
+        marker = object()
+        with self._lock:
+            self._listings[key] = marker
+        items = loader()
+        with self._lock:
+            if self._listings.get(key) is marker:
+                self._listings[key] = (time.time(), items)
+            else:
+                self._listings.pop(key, None)
+        return items
+
+    def _reload_rows(self, key, cached, marked):
+        """
+        Return cached listing with rows of marked long_ids re-read, or None
+        """
+        with self._lock:
+            row_loader = self._row_loaders.get(key)
+        rows = None
+        if row_loader is not None:
+            rows = row_loader(marked)
+        with self._lock:
+            if self._listings.get(key) is not cached:
+                return None  # Changed while rows were read
+            if rows is None:
+                self._listings[key] = None
+                return None
+            by_id = {}
+            for row in rows:
+                by_id.setdefault(row.long_id, []).append(row)
+            items = []
+            for item in cached[1]:
+                if item.long_id not in marked:
+                    items.append(item)
+                elif item.long_id in by_id:
+                    # Current rows take place of first old one
+                    items += by_id.pop(item.long_id)
+            # Listings show newest first
+            items[:0] = [row for row in rows if row.long_id in by_id]
+            self._listings[key] = (cached[0], items)
+            return items
+
+    def get(self, key, loader, row_loader=None):
+        """
+        Return copy of listing for key, calling loader() if missing or stale
+
+        :param key: Hashable representing arguments used by loader
+        :param loader: Callable returning list of items
+        :param row_loader: Optional callable returning rows of long-ids
+        """
+        return list(self._items(key, loader, row_loader))
+
+    def index(self, key, loader, row_loader=None):
+        """
+        Return ``LookupIndex`` of listing for key, built once per listing
+
+        :param key: Hashable representing arguments used by loader
+        :param loader: Callable returning list of items
+        :param row_loader: Optional callable returning rows of long-ids
+        """
+        items = self._items(key, loader, row_loader)
+        with self._lock:
+            cached = self._indexes.get(key)
+        if cached is not None and cached[0] is items:
+            return cached[1]
+        index = LookupIndex(items, self.name_attr)
+        with self._lock:
+            self._indexes[key] = (items, index)
+        return index
+
+    def invalidate(self):
+        """
+        Forget all listings
+        """
+        with self._lock:
+            for key in self._listings:
+                self._listings[key] = None
+            self._indexes.clear()
+            self._marked.clear()
+
+    def discard(self, long_id):
+        """
+        Remove items with long_id from all listings
+        """
+        with self._lock:
+            for key, cached in self._listings.items():
+                if isinstance(cached, tuple):
+                    items = [item for item in cached[1]
+                             if item.long_id != long_id]
+                    self._listings[key] = (cached[0], items)
+                elif cached is not None:
+                    # Loader running, its result may include long_id
+                    self._listings[key] = None
+
+    def mark(self, long_id):
+        """
+        Re-read rows of long_id on next use, whole listings without row_loader
+        """
+        with self._lock:
+            for key, cached in self._listings.items():
+                if isinstance(cached, tuple) and key in self._row_loaders:
+                    self._marked.setdefault(key, set()).add(long_id)
+                elif cached is not None:
+                    self._listings[key] = None
+
+    # private methods don't need docstrings
+    def _update(self, update):  # pylint: disable=C0111
+        # update(items) returns changed list, same list, or None if unknown
+        with self._lock:
+            for key, cached in self._listings.items():
+                if isinstance(cached, tuple):
+                    items = update(cached[1])
+                    if items is None:
+                        self._listings[key] = None
+                    elif items is not cached[1]:
+                        self._listings[key] = (cached[0], items)
+                elif cached is not None:
+                    # Loader running, its result may not include change
+                    self._listings[key] = None
+
+    def tag(self, long_id, name):
+        """
+        Add row named name for long_id to all listings, moving it from others
+        """
+        def update(items):  # pylint: disable=C0111
+            rows = [item for item in items if item.long_id == long_id]
+            if not rows:
+                return None  # e.g. intermediate image, now listed
+            names = [getattr(row, self.name_attr) for row in rows]
+            if name in names:
+                return items
+            changed = []
+            moved_from = set()
+            for item in items:
+                item_name = getattr(item, self.name_attr)
+                if item.long_id != long_id and item_name == name:
+                    moved_from.add(item.long_id)
+                    continue
+                if item is rows[0]:
+                    changed.append(item.with_full_name(name))
+                if item.long_id != long_id or item_name != self.untagged_name:
+                    changed.append(item)
+            for item in changed:
+                moved_from.discard(item.long_id)
+            if moved_from:
+                return None  # May now be listed as untagged
+            return changed
+        self._update(update)
+
+    def untag(self, long_id, name):
+        """
+        Remove row named name of long_id from all listings
+        """
+        def update(items):  # pylint: disable=C0111
+            changed = [item for item in items
+                       if item.long_id != long_id or
+                       getattr(item, self.name_attr) != name]
+            if len(changed) == len(items):
+                return items
+            if not [item for item in changed if item.long_id == long_id]:
+                return None  # May now be listed as untagged
+            return changed
+        self._update(update)
+
+
+class Inventory(object):
+
+    """
+    Container and image listings kept current by a daemon event subscriber
+
+    :param client: ``docker_daemon.SocketClient`` instance
+    :param max_age: Maximum seconds a listing is used before re-reading it
+    """
+
+    #: Seconds to wait before subscribing again after event stream failed
+    retry_interval = 1.0
+
+    def __init__(self, client, max_age):
+        self.client = client
+        self.containers = InventoryCache(max_age, 'container_name')
+        self.images = InventoryCache(max_age, 'full_name')
+        self._listening = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._retry_after = 0
+        # Unix time events are applied since, and whether commands ran since
+        self._synced_since = 0
+        self._unsynced = False
+
+    @property
+    def listening(self):
+        """
+        True while event stream is subscribed and applied
+        """
+        return self._listening.is_set()
+
+    def start(self):
+        """
+        Start event subscriber thread, if not already running
+
+        :return: True if events are being applied
+        """
+        with self._lock:
+            if self._thread is None and time.time() >= self._retry_after:
+                # Replay events from before subscription request is sent,
+                # so changes after any later listing can't be missed.
+                since = int(time.time()) - 1
+                # Changes may have been missed while not subscribed
+                self.refresh()
+                self._synced_since = since
+                self._unsynced = False
+                self._listening.set()
+                self._thread = threading.Thread(target=self._subscribe,
+                                                args=(since,),
+                                                name="Inventory")
+                self._thread.daemon = True
+                self._thread.start()
+        return self.listening
+
+    def _subscribe(self, since):
+        """
+        Apply events since unix time to listings, forever (daemon thread)
+        """
+        try:
+            for event in self.client.events(since=since):
+                self.apply(event)
+        except (socket.error, httplib.HTTPException, ValueError):
+            pass
+        finally:
+            with self._lock:
+                self._listening.clear()
+                self._thread = None
+                self._retry_after = time.time() + self.retry_interval
+            # Changes may have been missed
+            self.refresh()
+
+    def apply(self, event):
+        """
+        Update listings from a single event dictionary
+
+        :param event: Dictionary with ``status`` and ``id`` keys, optionally
+                      ``Type`` and ``Actor`` (API 1.22 and later).
+        """
+        if event.get('Type', 'container') not in LISTED_EVENT_TYPES:
+            return
+        # e.g. "exec_start: /bin/sh" or "health_status: healthy"
+        status = event.get('status', '').split(':', 1)[0]
+        long_id = event.get('id')
+        name = event.get('Actor', {}).get('Attributes', {}).get('name')
+        if status in UNCHANGED_EVENTS:
+            pass
+        elif status == 'destroy':
+            self.containers.discard(long_id)
+        elif status in CONTAINER_ROW_EVENTS:
+            self.containers.mark(long_id)
+        elif status == 'delete':
+            self.images.discard(long_id)
+            # Containers show image ID instead of removed name
+            self.containers.invalidate()
+        elif status == 'tag' and name and name != long_id:
+            self.images.tag(long_id, name)
+        elif status == 'untag' and name and name != long_id:
+            self.images.untag(long_id, name)
+            self.containers.invalidate()
+        elif status in CONTAINER_EVENTS:
+            self.containers.invalidate()
+        else:
+            # pull, commit, import, untag without name, etc.
+            self.images.invalidate()
+            self.containers.invalidate()
+
+    def command_executed(self):
+        """
+        Apply events up to next use, a command may have changed listings
+        """
+        with self._lock:
+            self._unsynced = True
+
+    def sync(self):
+        """
+        Apply all events since last sync, re-read listings if that failed
+        """
+        with self._lock:
+            if not self._unsynced:
+                return
+            self._unsynced = False
+            since = self._synced_since
+            self._synced_since = int(time.time()) - 1
+        try:
+            # Replaying events the subscriber already applied is harmless
+            for event in self.client.events(since=since,
+                                            until="%.9f" % time.time()):
+                self.apply(event)
+        except (socket.error, httplib.HTTPException, ValueError):
+            self.refresh()
+
+    def refresh(self):
+        """
+        Forget all listings, re-reading them on next use
+        """
+        self.containers.invalidate()
+        self.images.invalidate()
+
+    def list_containers(self, key, loader, row_loader=None):
+        """
+        Return container listing for key, from loader() if not cached
+
+        :param key: Hashable representing arguments used by loader
+        :param loader: Callable returning list of DockerContainer-like
+        :param row_loader: Optional callable returning list of
+                           DockerContainer-like with any of a set of long-ids
+        """
+        if not self.start():
+            return loader()
+        self.sync()
+        return self.containers.get(key, loader, row_loader)
+
+    def list_images(self, key, loader):
+        """
+        Return image listing for key, from loader() if not cached
+
+        :param key: Hashable representing arguments used by loader
+        :param loader: Callable returning list of DockerImage-like
+        """
+        if not self.start():
+            return loader()
+        self.sync()
+        return self.images.get(key, loader)
+
+    def index_containers(self, key, loader, row_loader=None):
+        """
+        Return ``LookupIndex`` of container listing for key
+
+        :param key: Hashable representing arguments used by loader
+        :param loader: Callable returning list of DockerContainer-like
+        :param row_loader: Optional callable returning list of
+                           DockerContainer-like with any of a set of long-ids
+        """
+        if not self.start():
+            return LookupIndex(loader(), 'container_name')
+        self.sync()
+        return self.containers.index(key, loader, row_loader)
+
+    def index_images(self, key, loader):
+        """
+        Return ``LookupIndex`` of image listing for key
+
+        :param key: Hashable representing arguments used by loader
+        :param loader: Callable returning list of DockerImage-like
+        """
+        if not self.start():
+            return LookupIndex(loader(), 'full_name')
+        self.sync()
+        return self.images.index(key, loader)
+
+
+def get_inventory(config):
+    """
+    Return shared ``Inventory`` for config's ``docker_socket``, or None
+
+    :param config: Subtest config. dictionary
+    :return: None if ``docker_inventory`` option is not enabled
+    """
+    if not config.get('docker_inventory', False):
+        return None
+    uri = config.get('docker_socket', '/var/run/docker.sock')
+    with _inventories_lock:
+        if uri not in _inventories:
+            client = docker_api.get_config_client(config)[0]
+            max_age = config.get('docker_inventory_max_age', 5.0)
+            _inventories[uri] = Inventory(client, float(max_age))
+        return _inventories[uri]
+
+
+def is_read_only(subcmd):
+    """
+    Return True if subcmd never changes containers or images
+
+    :param subcmd: Docker subcommand/arguments string (e.g. ``'ps -a'``)
+    """
+    words = [word for word in subcmd.split() if not word.startswith('-')]
+    return bool(words) and words[0] in READ_ONLY_SUBCOMMANDS
+
+
+def generation():
+    """
+    Return number of executed commands which may have changed containers or
+    images, anything cached while it was different may be stale.
+    """
+    return _generation
+
+
+def command_executed(subcmd):
+    """
+    Apply events to shared listings before next use, unless subcmd can't
+    have changed them.
+
+    Events of the command's changes may arrive after caller's next lookup.
+
+    :param subcmd: Docker subcommand/arguments string (e.g. ``'rm foo'``)
+    """
+    global _generation  # pylint: disable=W0603
+    if is_read_only(subcmd):
+        return
+    with _inventories_lock:
+        _generation += 1
+        inventories = _inventories.values()
+    for inventory in inventories:
+        inventory.command_executed()
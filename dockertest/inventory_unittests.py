@@ -0,0 +1,346 @@
+#!/usr/bin/env python
+
+# Pylint runs from a different directory, it's fine to import this way
+# pylint: disable=W0403
+
+import sys
+import threading
+import time
+import types
+import unittest
+
+
+# DO NOT allow this function to get loose in the wild!
+def mock(mod_path):
+    """
+    Recursively inject tree of mocked modules from entire mod_path
+    """
+    name_list = mod_path.split('.')
+    child_name = name_list.pop()
+    child_mod = sys.modules.get(mod_path, types.ModuleType(child_name))
+    if len(name_list) == 0:  # child_name is left-most basic module
+        if child_name not in sys.modules:
+            sys.modules[child_name] = child_mod
+        return sys.modules[child_name]
+    else:
+        # New or existing child becomes parent
+        recurse_path = ".".join(name_list)
+        parent_mod = mock(recurse_path)
+        if not hasattr(sys.modules[recurse_path], child_name):
+            setattr(parent_mod, child_name, child_mod)
+            # full-name also points at child module
+            sys.modules[mod_path] = child_mod
+        return sys.modules[mod_path]
+
+mock('autotest.client.utils')
+setattr(mock('autotest.client.shared.error'), 'CmdError', Exception)
+setattr(mock('autotest.client.shared.error'), 'TestFail', Exception)
+setattr(mock('autotest.client.shared.error'), 'TestError', Exception)
+setattr(mock('autotest.client.shared.error'), 'TestNAError', Exception)
+setattr(mock('autotest.client.shared.error'), 'AutotestError', Exception)
+mock('autotest.client.shared.service')
+
+
+class FakeItem(object):
+
+    def __init__(self, long_id, full_name=None):
+        self.long_id = long_id
+        self.full_name = full_name
+
+    def __repr__(self):
+        return 'FakeItem(%s)' % self.long_id
+
+    def with_full_name(self, full_name):
+        return FakeItem(self.long_id, full_name)
+
+
+class FakeLoader(object):
+
+    def __init__(self, *long_ids):
+        self.long_ids = list(long_ids)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return [FakeItem(long_id) for long_id in self.long_ids]
+
+
+class FakeRowLoader(object):
+
+    def __init__(self, *long_ids):
+        self.long_ids = list(long_ids)
+        self.calls = []
+
+    def __call__(self, long_ids):
+        self.calls.append(set(long_ids))
+        return [FakeItem(long_id) for long_id in self.long_ids
+                if long_id in long_ids]
+
+
+class FakeImageLoader(object):
+
+    def __init__(self, *names):
+        self.names = list(names)  # long_id:full_name
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return [FakeItem(*name.split(':', 1)) for name in self.names]
+
+
+class FakeClient(object):
+
+    def __init__(self):
+        self.events_queue = []
+        self.history = []
+        self.condition = threading.Condition()
+        self.params = None
+        self.synced = 0
+
+    def push(self, event):
+        with self.condition:
+            self.events_queue.append(event)
+            if event is not None:
+                self.history.append(event)
+            self.condition.notify_all()
+
+    def events(self, **params):
+        if 'until' in params:
+            # Bounded request, events so far
+            self.synced += 1
+            return self.replay()
+        return self.subscribe(**params)
+
+    def replay(self):
+        for event in list(self.history):
+            if event is None:
+                raise ValueError("Bad response status")
+            yield event
+
+    def subscribe(self, **params):
+        self.params = params
+        while True:
+            with self.condition:
+                while not self.events_queue:
+                    self.condition.wait(0.01)
+                event = self.events_queue.pop(0)
+            if event is None:
+                raise ValueError("Stream ended")
+            yield event
+
+
+class InventoryTestBase(unittest.TestCase):
+
+    def setUp(self):
+        import inventory
+        self.inventory = inventory
+        self.client = FakeClient()
+        self.inv = inventory.Inventory(self.client, 60)
+        self.inv.retry_interval = 0
+
+    def tearDown(self):
+        self.client.push(None)
+        self.wait_stopped()
+        self.inventory._inventories.clear()
+
+    def wait_stopped(self):
+        for _ in xrange(500):
+            if self.inv._thread is None:
+                break
+            time.sleep(0.001)
+
+
+class InventoryCacheTest(InventoryTestBase):
+
+    def test_cached(self):
+        cache = self.inventory.InventoryCache(60, 'name')
+        loader = FakeLoader('a', 'b')
+        first = cache.get('ps', loader)
+        first.pop()
+        self.assertEqual(len(cache.get('ps', loader)), 2)
+        self.assertEqual(loader.calls, 1)
+        cache.discard('a')
+        self.assertEqual([item.long_id for item in cache.get('ps', loader)],
+                         ['b'])
+        cache.invalidate()
+        self.assertEqual(len(cache.get('ps', loader)), 2)
+        self.assertEqual(loader.calls, 2)
+
+    def test_index(self):
+        cache = self.inventory.InventoryCache(60, 'long_id')
+        loader = FakeLoader('a', 'b')
+        index = cache.index('ps', loader)
+        self.assertTrue(cache.index('ps', loader) is index)
+        self.assertEqual(len(index.with_name('a')), 1)
+        cache.discard('a')
+        index = cache.index('ps', loader)
+        self.assertEqual(index.with_id('a'), [])
+        self.assertEqual(loader.calls, 1)
+
+    def test_max_age(self):
+        cache = self.inventory.InventoryCache(0, 'name')
+        loader = FakeLoader('a')
+        cache.get('ps', loader)
+        cache.get('ps', loader)
+        self.assertEqual(loader.calls, 2)
+
+    def test_invalidated_while_loading(self):
+        cache = self.inventory.InventoryCache(60, 'name')
+        loader = FakeLoader('a')
+
+        def invalidating_loader():
+            cache.invalidate()
+            return loader()
+
+        cache.get('ps', invalidating_loader)
+        cache.get('ps', loader)
+        self.assertEqual(loader.calls, 2)
+
+    def test_discarded_while_loading(self):
+        cache = self.inventory.InventoryCache(60, 'name')
+        loader = FakeLoader('a')
+
+        def discarding_loader():
+            items = loader()
+            cache.discard('a')  # destroy event arrives after listing
+            return items
+
+        self.assertEqual(len(cache.get('ps', discarding_loader)), 1)
+        cache.get('ps', loader)
+        self.assertEqual(loader.calls, 2)
+
+
+class InventoryTest(InventoryTestBase):
+
+    def test_apply(self):
+        containers = FakeLoader('c1', 'c2')
+        images = FakeLoader('i1', 'i2')
+        self.inv.list_containers('ps', containers)
+        self.inv.list_images('images', images)
+        self.assertTrue(self.inv.listening)
+        self.inv.apply({'status': 'destroy', 'id': 'c1'})
+        self.assertEqual([item.long_id for item
+                          in self.inv.list_containers('ps', containers)],
+                         ['c2'])
+        self.inv.apply({'status': 'delete', 'id': 'i1'})
+        self.assertEqual([item.long_id for item
+                          in self.inv.list_images('images', images)],
+                         ['i2'])
+        # Containers show image ID instead of removed name
+        self.assertEqual(len(self.inv.list_containers('ps', containers)), 2)
+        self.assertEqual((containers.calls, images.calls), (2, 1))
+        self.inv.apply({'status': 'start', 'id': 'c2'})
+        self.inv.list_images('images', images)
+        self.inv.list_containers('ps', containers)
+        self.assertEqual((containers.calls, images.calls), (3, 1))
+        self.inv.apply({'status': 'untag', 'id': 'i2'})
+        self.inv.list_images('images', images)
+        self.assertEqual(images.calls, 2)
+
+    def test_row_events(self):
+        loader = FakeLoader('c1', 'c2')
+        rows = FakeRowLoader('c3', 'c2')
+        self.inv.list_containers('ps', loader, rows)
+        self.inv.apply({'status': 'start', 'id': 'c2'})
+        self.inv.apply({'status': 'create', 'id': 'c3'})
+        self.inv.apply({'status': 'exec_start: /bin/sh', 'id': 'c1'})
+        self.inv.apply({'Type': 'network', 'status': 'connect', 'id': 'n1'})
+        listing = self.inv.list_containers('ps', loader, rows)
+        self.assertEqual([item.long_id for item in listing],
+                         ['c3', 'c1', 'c2'])
+        self.inv.list_containers('ps', loader, rows)
+        self.assertEqual((loader.calls, rows.calls), (1, [set(['c2', 'c3'])]))
+        # Rows not found are dropped
+        rows.long_ids = []
+        self.inv.apply({'status': 'die', 'id': 'c1'})
+        self.assertEqual([item.long_id for item
+                          in self.inv.list_containers('ps', loader, rows)],
+                         ['c3', 'c2'])
+        # Whole listing re-read when rows can't be
+        self.inv.apply({'status': 'die', 'id': 'c2'})
+        self.inv.list_containers('ps', loader, lambda long_ids: None)
+        self.assertEqual(loader.calls, 2)
+
+    def test_tag_events(self):
+        loader = FakeImageLoader('i1:a:1', 'i2:<none>:<none>')
+
+        def names():
+            return [(item.long_id, item.full_name) for item
+                    in self.inv.list_images('images', loader)]
+
+        names()
+        self.inv.apply({'status': 'tag', 'id': 'i2',
+                        'Actor': {'Attributes': {'name': 'b:1'}}})
+        self.assertEqual(names(), [('i1', 'a:1'), ('i2', 'b:1')])
+        self.inv.apply({'status': 'tag', 'id': 'i2',
+                        'Actor': {'Attributes': {'name': 'b:1'}}})
+        self.inv.apply({'status': 'tag', 'id': 'i1',
+                        'Actor': {'Attributes': {'name': 'b:2'}}})
+        self.inv.apply({'status': 'untag', 'id': 'i1',
+                        'Actor': {'Attributes': {'name': 'a:1'}}})
+        self.assertEqual(names(), [('i1', 'b:2'), ('i2', 'b:1')])
+        self.assertEqual(loader.calls, 1)
+        # Image without rows left may be listed untagged
+        self.inv.apply({'status': 'untag', 'id': 'i1',
+                        'Actor': {'Attributes': {'name': 'b:2'}}})
+        names()
+        self.assertEqual(loader.calls, 2)
+        # As may image name moved from
+        self.inv.apply({'status': 'tag', 'id': 'i2',
+                        'Actor': {'Attributes': {'name': 'a:1'}}})
+        names()
+        self.assertEqual(loader.calls, 3)
+        # Not listed before
+        self.inv.apply({'status': 'tag', 'id': 'i3',
+                        'Actor': {'Attributes': {'name': 'c:1'}}})
+        names()
+        self.assertEqual(loader.calls, 4)
+
+    def test_events(self):
+        loader = FakeLoader('c1')
+        self.inv.list_containers('ps', loader)
+        self.client.push({'status': 'die', 'id': 'c1'})
+        for _ in xrange(500):
+            if self.inv.list_containers('ps', loader) and loader.calls > 1:
+                break
+            time.sleep(0.001)
+        self.assertEqual(loader.calls, 2)
+        self.assertTrue('since' in self.client.params)
+
+    def test_stream_failure(self):
+        loader = FakeLoader('c1')
+        self.inv.list_containers('ps', loader)
+        self.client.push(None)
+        self.wait_stopped()
+        self.assertFalse(self.inv.listening)
+        self.inv.list_containers('ps', loader)
+        self.assertEqual(loader.calls, 2)
+
+    def test_command_executed(self):
+        config = {'docker_inventory': True, 'docker_socket': '/fake.sock'}
+        shared = self.inventory.get_inventory(config)
+        self.assertTrue(shared is self.inventory.get_inventory(config))
+        self.assertEqual(self.inventory.get_inventory({}), None)
+        shared.client = self.client
+        self.inv = shared
+        loader = FakeLoader('c1', 'c2')
+        shared.list_containers('ps', loader)
+        self.inventory.command_executed('-D inspect foo')
+        shared.list_containers('ps', loader)
+        self.assertEqual(self.client.synced, 0)
+        # Events up to next use are applied, even if not yet streamed
+        self.client.history.append({'status': 'destroy', 'id': 'c1'})
+        self.inventory.command_executed('rm c1')
+        self.assertEqual([item.long_id for item
+                          in shared.list_containers('ps', loader)], ['c2'])
+        shared.list_containers('ps', loader)
+        self.assertEqual((loader.calls, self.client.synced), (1, 1))
+        # Listings re-read when events can't be
+        self.client.history.append(None)
+        self.inventory.command_executed('rm c2')
+        shared.list_containers('ps', loader)
+        self.assertEqual(loader.calls, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
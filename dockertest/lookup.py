@@ -0,0 +1,160 @@
+"""
+Indexes for looking up many containers or images by name or ID
+
+Searching a listing with ``cmp_id()`` / ``cmp_name()`` of every item is
+linear in its length, and repeating that for each of many IDs multiplies
+it.  A ``LookupIndex`` is built once from a listing (see
+``DockerContainersBase.index_containers()`` and
+``DockerImagesBase.index_imgs()``) then answers lookups by name,
+long or short ID in constant time and by arbitrary ID prefix in
+logarithmic time.  ``LRUMemo`` remembers recent results of pure
+functions, such as FQIN parsing, which are repeated for the same
+arguments many times.
+"""
+
+import bisect
+
+
+class LRUMemo(object):
+
+    """
+    Callable remembering return values of func for recent arguments
+
+    Exceptions are not remembered.  Up to maxsize return values are kept,
+    in two generations: once the recent generation holds half of them,
+    the older one (less those used since) is forgotten.  This approximates
+    dropping least recently used values first, with plain dictionary
+    operations.  Concurrent callers may compute the same value twice.
+
+    :param func: Function without side-effects, taking hashable arguments
+    :param maxsize: Maximum number of return values remembered
+    """
+
+    def __init__(self, func, maxsize=4096):
+        self.func = func
+        self.maxsize = maxsize
+        self.__doc__ = func.__doc__
+        self._recent = {}
+        self._older = {}
+
+    def __call__(self, *args, **dargs):
+        if dargs:
+            key = (args, tuple(sorted(dargs.items())))
+        else:
+            key = args
+        try:
+            return self._recent[key]
+        except KeyError:
+            pass
+        except TypeError:  # unhashable argument
+            return self.func(*args, **dargs)
+        try:
+            value = self._older.pop(key)
+        except KeyError:
+            value = self.func(*args, **dargs)
+        recent = self._recent
+        recent[key] = value
+        if len(recent) * 2 >= self.maxsize:
+            self._older = recent
+            self._recent = {}
+        return value
+
+    def __len__(self):
+        return len(self._recent) + len(self._older)
+
+    def clear(self):
+        """
+        Forget all remembered return values
+        """
+        self._recent = {}
+        self._older = {}
+
+
+def lru_memo(maxsize=4096):
+    """
+    Return decorator making function a ``LRUMemo`` of maxsize
+    """
+    return lambda func: LRUMemo(func, maxsize)
+
+
+class LookupIndex(object):
+
+    """
+    Read-only name and ID indexes of a listing's DockerContainer-like or
+    DockerImage-like items, with the same equality rules as their
+    ``cmp_id()`` and ``cmp_name()`` / ``cmp_full_name()`` methods.
+
+    :param items: Iterable of items with a ``long_id`` attribute
+    :param name_attr: Name of attribute holding each item's name
+    """
+
+    def __init__(self, items, name_attr):
+        self.items = list(items)
+        self.name_attr = name_attr
+        self._by_id = {}
+        self._by_short_id = {}
+        self._by_name = {}
+        for item in self.items:
+            long_id = item.long_id
+            if long_id is not None:
+                self._by_id.setdefault(long_id, []).append(item)
+                self._by_short_id.setdefault(long_id[:12], []).append(item)
+            self._by_name.setdefault(getattr(item, name_attr),
+                                     []).append(item)
+        #: Sorted unique long IDs, for bisecting by prefix
+        self.long_ids = sorted(self._by_id)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def with_id(self, item_id):
+        """
+        Return list of items matching exactly 12-character or long item_id
+
+        :param item_id: Short (12-character) or long ID string
+        """
+        if len(item_id) == 12:
+            return list(self._by_short_id.get(item_id, []))
+        return list(self._by_id.get(item_id, []))
+
+    def with_ids(self, item_ids):
+        """
+        Return dictionary of each item_id to list of its matching items
+
+        :param item_ids: Iterable of short (12-character) or long ID strings
+        """
+        return dict((item_id, self.with_id(item_id))
+                    for item_id in item_ids)
+
+    def with_prefix(self, prefix):
+        """
+        Return list of items whose long ID starts with prefix
+
+        :param prefix: Beginning of long ID, of any length
+        """
+        start = bisect.bisect_left(self.long_ids, prefix)
+        result = []
+        for long_id in self.long_ids[start:]:
+            if not long_id.startswith(prefix):
+                break
+            result += self._by_id[long_id]
+        return result
+
+    def with_name(self, name):
+        """
+        Return list of items with name
+
+        :param name: Container name or image full name string
+        """
+        return list(self._by_name.get(str(name), []))
+
+    def with_names(self, names):
+        """
+        Return dictionary of each name to list of items having it
+
+        :param names: Iterable of container name or image full name strings
+        """
+        return dict((name, self.with_name(name)) for name in names)
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+
+# Pylint runs from a different directory, it's fine to import this way
+# pylint: disable=W0403
+
+import unittest
+
+
+class FakeItem(object):
+
+    def __init__(self, long_id, name):
+        self.long_id = long_id
+        self.name = name
+
+    def __repr__(self):
+        return 'FakeItem(%s, %s)' % (self.long_id, self.name)
+
+
+class LookupIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        from lookup import LookupIndex
+        self.first = FakeItem('1234567890ab' + 'c' * 52, 'foo')
+        self.second = FakeItem('1234567890ab' + 'd' * 52, 'bar')
+        self.tagged = FakeItem('1234567890ab' + 'd' * 52, 'baz')
+        self.other = FakeItem('abcdef012345' + 'e' * 52, 'foo')
+        self.nameless = FakeItem(None, None)
+        self.index = LookupIndex([self.first, self.second, self.tagged,
+                                  self.other, self.nameless], 'name')
+
+    def test_with_id(self):
+        self.assertEqual(self.index.with_id(self.first.long_id),
+                         [self.first])
+        self.assertEqual(self.index.with_id(self.second.long_id),
+                         [self.second, self.tagged])
+        # Short ID matches like cmp_id()
+        self.assertEqual(self.index.with_id('1234567890ab'),
+                         [self.first, self.second, self.tagged])
+        self.assertEqual(self.index.with_id('123456'), [])
+        self.assertEqual(self.index.with_id('nonexistent'), [])
+
+    def test_with_ids(self):
+        found = self.index.with_ids(['abcdef012345', 'ffffffffffff'])
+        self.assertEqual(found, {'abcdef012345': [self.other],
+                                 'ffffffffffff': []})
+
+    def test_with_prefix(self):
+        self.assertEqual(self.index.with_prefix('123'),
+                         [self.first, self.second, self.tagged])
+        self.assertEqual(self.index.with_prefix('1234567890abd'),
+                         [self.second, self.tagged])
+        self.assertEqual(self.index.with_prefix('abc'), [self.other])
+        self.assertEqual(self.index.with_prefix('f'), [])
+        self.assertEqual(len(self.index.with_prefix('')), 4)
+
+    def test_with_name(self):
+        self.assertEqual(self.index.with_name('foo'),
+                         [self.first, self.other])
+        self.assertEqual(self.index.with_names(['bar', 'nope']),
+                         {'bar': [self.second], 'nope': []})
+        # Results are copies
+        self.index.with_name('foo').pop()
+        self.assertEqual(len(self.index.with_name('foo')), 2)
+        self.assertEqual(len(self.index), 5)
+
+
+class LRUMemoTest(unittest.TestCase):
+
+    def setUp(self):
+        import lookup
+        self.lookup = lookup
+        self.calls = []
+
+    def split(self, value, sep=':'):
+        self.calls.append(value)
+        return tuple(value.split(sep))
+
+    def test_memo(self):
+        memo = self.lookup.LRUMemo(self.split, 8)
+        self.assertEqual(memo('a:b'), ('a', 'b'))
+        self.assertTrue(memo('a:b') is memo('a:b'))
+        self.assertEqual(memo('a/b', sep='/'), ('a', 'b'))
+        self.assertEqual(self.calls, ['a:b', 'a/b'])
+        # Unhashable arguments are never remembered
+        self.assertRaises(AttributeError, memo, ['a'])
+        memo.clear()
+        self.assertEqual(len(memo), 0)
+        memo('a:b')
+        self.assertEqual(len(self.calls), 4)
+
+    def test_bounded(self):
+        memo = self.lookup.LRUMemo(self.split, 8)
+        for number in xrange(100):
+            memo('x:%d' % number)
+            memo('keep:me')
+            self.assertTrue(len(memo) <= 8)
+        # Recently used value survived every generation
+        self.assertEqual(self.calls.count('keep:me'), 1)
+        memo('x:0')
+        self.assertEqual(self.calls.count('x:0'), 2)
+
+    def test_decorator(self):
+        @self.lookup.lru_memo(2)
+        def double(value):
+            """Docstring"""
+            self.calls.append(value)
+            return value * 2
+        self.assertEqual(double(2), 4)
+        self.assertEqual(double(2), 4)
+        self.assertEqual(self.calls, [2])
+        self.assertEqual(double.__doc__, 'Docstring')
+
+
+if __name__ == '__main__':
+    unittest.main()
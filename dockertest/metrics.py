@@ -0,0 +1,196 @@
+"""
+Process-wide latency statistics for executed docker commands
+
+Every command executed through ``dockercmd`` classes or the CLI
+``docker_cmd()`` methods of ``containers`` and ``images`` is recorded
+into the module-level ``registry``, keyed by docker subcommand and exit
+status.  ``Subtest.cleanup()`` saves and resets it.
+"""
+
+# Pylint runs from a different directory, it's fine to import this way
+# pylint: disable=W0403
+
+import json
+import math
+import re
+import threading
+
+
+#: Characters not allowed in autotest keyval keys
+KEYVAL_UNSAFE = re.compile(r'[^-\.\w]')
+
+
+class LatencyStats(object):
+
+    """
+    Accumulated durations for a single subcommand / exit status pair
+    """
+
+    #: Percentiles reported by ``as_dict()``
+    percentiles = (50, 95, 99)
+
+    def __init__(self):
+        self.durations = []
+        self.total = 0.0
+        self._sorted = True
+
+    def add(self, duration):
+        """
+        Record a single duration in seconds
+        """
+        if self.durations and duration < self.durations[-1]:
+            self._sorted = False
+        self.durations.append(duration)
+        self.total += duration
+
+    @property
+    def count(self):
+        """
+        Number of recorded durations
+        """
+        return len(self.durations)
+
+    @property
+    def minimum(self):
+        """
+        Shortest recorded duration, or None if no durations recorded
+        """
+        if not self.durations:
+            return None
+        return self.percentile(0)
+
+    @property
+    def maximum(self):
+        """
+        Longest recorded duration, or None if no durations recorded
+        """
+        if not self.durations:
+            return None
+        return self.percentile(100)
+
+    def percentile(self, pct):
+        """
+        Return nearest-rank pct percentile duration, or None if no durations
+
+        :param pct: Percentile number from 0 to 100
+        """
+        if not self.durations:
+            return None
+        if not self._sorted:
+            self.durations.sort()
+            self._sorted = True
+        rank = int(math.ceil(pct / 100.0 * len(self.durations))) - 1
+        return self.durations[max(0, min(rank, len(self.durations) - 1))]
+
+    def as_dict(self):
+        """
+        Return dictionary of summary statistics
+        """
+        dct = {'count': self.count,
+               'total': self.total,
+               'min': self.minimum,
+               'max': self.maximum}
+        for pct in self.percentiles:
+            dct['p%d' % pct] = self.percentile(pct)
+        return dct
+
+
+class MetricsRegistry(object):
+
+    """
+    Thread-safe collection of ``LatencyStats`` by subcommand and exit status
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, subcmd, exit_status, duration):
+        """
+        Add duration of one docker subcommand execution
+
+        :param subcmd: Docker subcommand name (e.g. ``'run'``)
+        :param exit_status: Exit status integer of the command
+        :param duration: Seconds the command took to execute
+        """
+        key = (subcmd, exit_status)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = LatencyStats()
+            stats.add(float(duration))
+
+    def snapshot(self):
+        """
+        Return nested dictionary of subcommand to exit status to stats dict
+        """
+        result = {}
+        with self._lock:
+            for (subcmd, exit_status), stats in self._stats.items():
+                result.setdefault(subcmd, {})[str(exit_status)] = (
+                    stats.as_dict())
+        return result
+
+    def keyvals(self, prefix='docker_cmd'):
+        """
+        Return flat dictionary of snapshot suitable for ``write_test_keyval``
+
+        :param prefix: String prepended to every key
+        """
+        keyvals = {}
+        for subcmd, by_exit in self.snapshot().items():
+            for exit_status, stats in by_exit.items():
+                for name, value in stats.items():
+                    key = '%s_%s_exit%s_%s' % (prefix, subcmd,
+                                               exit_status, name)
+                    keyvals[KEYVAL_UNSAFE.sub('_', key)] = value
+        return keyvals
+
+    def write_json(self, path):
+        """
+        Write snapshot as JSON into file at path
+        """
+        with open(path, 'wb') as json_file:
+            json.dump(self.snapshot(), json_file, indent=2, sort_keys=True)
+
+    def reset(self):
+        """
+        Forget all recorded durations
+        """
+        with self._lock:
+            self._stats = {}
+
+    def __len__(self):
+        with self._lock:
+            return len(self._stats)
+
+
+#: Process-wide registry all docker command executions report into
+registry = MetricsRegistry()
+
+
+def subcommand_name(subcmd):
+    """
+    Return first non-option word of docker subcommand/arguments string
+
+    :param subcmd: String like ``'ps -a'`` or ``'-D inspect "foo"'``
+    """
+    for word in subcmd.split():
+        if not word.startswith('-'):
+            return word
+    return 'unknown'
+
+
+def record_result(subcmd, cmdresult):
+    """
+    Record duration of cmdresult into ``registry`` if it has one
+
+    :param subcmd: Subcommand/arguments string, see ``subcommand_name()``
+    :param cmdresult: ``CmdResult`` instance of a finished command
+    """
+    duration = getattr(cmdresult, 'duration', None)
+    if duration is None:
+        return
+    registry.record(subcommand_name(subcmd),
+                    getattr(cmdresult, 'exit_status', None),
+                    duration)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+
+# Pylint runs from a different directory, it's fine to import this way
+# pylint: disable=W0403
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+
+class MetricsTestBase(unittest.TestCase):
+
+    def setUp(self):
+        import metrics
+        self.metrics = metrics
+        self.registry = metrics.MetricsRegistry()
+
+
+class LatencyStatsTest(MetricsTestBase):
+
+    def test_empty(self):
+        stats = self.metrics.LatencyStats()
+        self.assertEqual(stats.as_dict(), {'count': 0, 'total': 0.0,
+                                           'min': None, 'max': None,
+                                           'p50': None, 'p95': None,
+                                           'p99': None})
+
+    def test_percentiles(self):
+        stats = self.metrics.LatencyStats()
+        for duration in xrange(100, 0, -1):
+            stats.add(float(duration))
+        dct = stats.as_dict()
+        self.assertEqual(dct['count'], 100)
+        self.assertEqual(dct['total'], 5050.0)
+        self.assertEqual((dct['min'], dct['max']), (1.0, 100.0))
+        self.assertEqual((dct['p50'], dct['p95'], dct['p99']),
+                         (50.0, 95.0, 99.0))
+        stats.add(0.5)
+        self.assertEqual(stats.minimum, 0.5)
+
+
+class RegistryTest(MetricsTestBase):
+
+    def test_subcommand_name(self):
+        self.assertEqual(self.metrics.subcommand_name('ps -a'), 'ps')
+        self.assertEqual(self.metrics.subcommand_name('-D inspect "f"'),
+                         'inspect')
+        self.assertEqual(self.metrics.subcommand_name(''), 'unknown')
+
+    def test_record(self):
+        threads = [threading.Thread(target=self.registry.record,
+                                    args=('kill', 0, 0.1))
+                   for _ in xrange(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.registry.record('kill', 1, 2)
+        snapshot = self.registry.snapshot()
+        self.assertEqual(sorted(snapshot['kill'].keys()), ['0', '1'])
+        self.assertEqual(snapshot['kill']['0']['count'], 20)
+        self.assertEqual(snapshot['kill']['1']['max'], 2.0)
+        keyvals = self.registry.keyvals()
+        self.assertEqual(keyvals['docker_cmd_kill_exit1_count'], 1)
+        self.assertEqual(len(keyvals), 14)
+        self.registry.reset()
+        self.assertEqual(len(self.registry), 0)
+
+    def test_write_json(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, 'metrics.json')
+            self.registry.record('ps', None, 1.5)
+            self.registry.write_json(path)
+            self.assertEqual(json.load(open(path))['ps']['None']['total'],
+                             1.5)
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,164 @@
+"""
+Unique container and image names issued without listing the host
+
+Random names are made unique within this process by remembering every
+name issued, and across processes by a random namespace all of them
+share.  Names can still collide with leftovers on the host, very rarely.
+A ``dockercmd.DockerCmd`` with ``retry_name_conflict`` set retries
+``run`` or ``create`` of a container with an issued ``--name`` under
+another name (see ``retry_on_conflict()``) when docker reports it's
+already in use.  ``registry.current()`` tells which name was used in the
+end.
+"""
+
+import random
+import re
+import string
+import threading
+
+
+#: Characters used in random parts of names (lower-case for image names)
+NAME_CHARS = string.ascii_lowercase + string.digits
+
+#: Docker error messages about a container or image name already in use
+CONFLICT_RE = re.compile(r'conflict|already (in use|assigned|exists)',
+                         re.IGNORECASE)
+
+#: Single command-line argument of container name option and its value
+NAME_OPTION_RE = re.compile(r'^--name(?:=|\s+)(\S+)$')
+
+#: Private random source, seeded independently of ``random`` module users
+_random = random.SystemRandom()
+
+
+def random_string(length):
+    """
+    Return string of length random ``NAME_CHARS``
+    """
+    return ''.join(_random.choice(NAME_CHARS) for _ in xrange(length))
+
+
+class NameRegistry(object):
+
+    """
+    Thread-safe issuer of names never issued before by this instance
+
+    :param namespace_length: Number of random characters identifying
+                             this instance in every name it issues.
+    """
+
+    def __init__(self, namespace_length=4):
+        #: Random characters beginning random part of every issued name
+        self.namespace = random_string(namespace_length)
+        self._lock = threading.Lock()
+        self._issued = {}  # name -> issue() arguments
+        self._renamed = {}  # conflicting name -> name reissued for it
+
+    def issue(self, head="", tail="", length=4, lower=False):
+        """
+        Return new name of head, namespace, length random chars. and tail
+
+        :param head: String beginning the name
+        :param tail: String ending the name
+        :param length: Number of random characters after namespace
+        :param lower: When True, entire name is lower-cased
+        :raises ValueError: If no unused name could be found
+        """
+        for _ in xrange(1000):
+            name = "%s%s%s%s" % (head, self.namespace,
+                                 random_string(length), tail)
+            if lower:
+                name = name.lower()
+            with self._lock:
+                if name not in self._issued:
+                    self._issued[name] = (head, tail, length, lower)
+                    return name
+        raise ValueError("No unused name left for '%s...%s' with %d random "
+                         "characters" % (head, tail, length))
+
+    def reissue(self, name):
+        """
+        Return new name issued the same way as name, replacing it
+
+        :param name: Name previously issued, found to be in use
+        :raises KeyError: If name was not issued by this instance
+        :raises ValueError: If no unused name could be found
+        """
+        with self._lock:
+            head, tail, length, lower = self._issued[name]
+        new_name = self.issue(head, tail, length, lower)
+        with self._lock:
+            self._renamed[name] = new_name
+        return new_name
+
+    def current(self, name):
+        """
+        Return name last reissued in place of name, or name itself
+        """
+        with self._lock:
+            while name in self._renamed:
+                name = self._renamed[name]
+        return name
+
+    def __contains__(self, name):
+        with self._lock:
+            return name in self._issued
+
+    def __len__(self):
+        with self._lock:
+            return len(self._issued)
+
+
+#: Process-wide registry issuing container and image names
+registry = NameRegistry()
+
+
+def is_conflict(cmdresult):
+    """
+    Return True if failed cmdresult says a name is already in use
+
+    :param cmdresult: ``CmdResult``-like instance of finished command
+    """
+    if cmdresult.exit_status == 0:
+        return False
+    return bool(CONFLICT_RE.search(cmdresult.stderr or ''))
+
+
+def retry_on_conflict(execute, make_name, attempts=3):
+    """
+    Call execute(name) again with a new name while it reports a conflict
+
+    :param execute: Callable accepting a name, returning ``CmdResult``
+    :param make_name: Callable returning a new unique name
+    :param attempts: Maximum number of times execute is called
+    :return: Tuple of last name used and its ``CmdResult``
+    """
+    for _ in xrange(attempts - 1):
+        name = make_name()
+        cmdresult = execute(name)
+        if not is_conflict(cmdresult):
+            return name, cmdresult
+    name = make_name()
+    return name, execute(name)
+
+
+def issued_name_index(args):
+    """
+    Return index of single ``--name`` argument in args issued by ``registry``
+
+    :param args: Sequence of command-line argument strings
+    :return: Index integer or None
+    """
+    for index, arg in enumerate(args):
+        match = NAME_OPTION_RE.match(arg)
+        if match is not None and match.group(1) in registry:
+            return index
+    return None
+
+
+def rename_option(arg, name):
+    """
+    Return single ``--name`` argument arg, with its value replaced by name
+    """
+    match = NAME_OPTION_RE.match(arg)
+    return arg[:match.start(1)] + name + arg[match.end(1):]
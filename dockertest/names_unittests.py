@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+
+# Pylint runs from a different directory, it's fine to import this way
+# pylint: disable=W0403
+
+import unittest
+
+
+class FakeCmdResult(object):
+
+    def __init__(self, exit_status, stderr=''):
+        self.exit_status = exit_status
+        self.stderr = stderr
+
+
+class NameRegistryTest(unittest.TestCase):
+
+    def setUp(self):
+        import names
+        self.names = names
+        self.registry = names.NameRegistry()
+
+    def test_issue(self):
+        name = self.registry.issue("Foo-", "-bar", 4)
+        self.assertTrue(name.startswith("Foo-" + self.registry.namespace))
+        self.assertTrue(name.endswith("-bar"))
+        self.assertEqual(len(name), len("Foo--bar") + 8)
+        self.assertTrue(name in self.registry)
+        self.assertEqual(self.registry.issue("FOO_", length=2,
+                                             lower=True)[:4], "foo_")
+
+    def test_unique(self):
+        # Only 36 possible names, all must be issued exactly once
+        issued = set(self.registry.issue(length=1) for _ in xrange(36))
+        self.assertEqual(len(issued), 36)
+        self.assertEqual(len(self.registry), 36)
+        self.assertRaises(ValueError, self.registry.issue, length=1)
+
+    def test_reissue(self):
+        name = self.registry.issue("Foo-", "-bar", 3, lower=True)
+        new_name = self.registry.reissue(name)
+        self.assertNotEqual(new_name, name)
+        self.assertEqual(len(new_name), len(name))
+        self.assertTrue(new_name.startswith("foo-"))
+        newer_name = self.registry.reissue(new_name)
+        self.assertEqual(self.registry.current(name), newer_name)
+        self.assertEqual(self.registry.current("other"), "other")
+        self.assertRaises(KeyError, self.registry.reissue, "other")
+        self.names.registry.issue("x-")
+        issued = self.names.registry.issue("x-")
+        self.assertEqual(self.names.issued_name_index(
+            ['-d', 'echo --name %s' % issued, '--name %s' % issued,
+             '--name=foo']), 2)
+        self.assertEqual(self.names.issued_name_index(['--name=foo']), None)
+        self.assertEqual(self.names.rename_option('--name  foo', 'bar'),
+                         '--name  bar')
+        self.assertEqual(self.names.rename_option('--name=foo', 'bar'),
+                         '--name=bar')
+
+    def test_namespace(self):
+        other = self.names.NameRegistry()
+        self.assertEqual(len(other.namespace), 4)
+        self.assertEqual(len(self.names.NameRegistry(8).namespace), 8)
+
+    def test_retry_on_conflict(self):
+        conflict = FakeCmdResult(1, "Error response from daemon: Conflict, "
+                                    "The name foo is already assigned")
+        results = [conflict, conflict, FakeCmdResult(0)]
+        tried = []
+
+        def execute(name):
+            tried.append(name)
+            return results.pop(0)
+
+        make_name = lambda: self.registry.issue("foo-")
+        name, result = self.names.retry_on_conflict(execute, make_name)
+        self.assertEqual(result.exit_status, 0)
+        self.assertEqual(name, tried[-1])
+        self.assertEqual(len(set(tried)), 3)
+        # Other failures are not retried
+        results = [FakeCmdResult(1, "Error: No such image"),
+                   FakeCmdResult(0)]
+        name, result = self.names.retry_on_conflict(execute, make_name)
+        self.assertEqual(result.exit_status, 1)
+        self.assertFalse(self.names.is_conflict(FakeCmdResult(0, 'conflict')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,7 +5,16 @@ Handlers for command-line output processing, crash/panic detection, etc.
 # Pylint runs from a different directory, it's fine to import this way
 # pylint: disable=W0403
 
+import bisect
+import errno
+import fcntl
+import hashlib
+import mmap
+import operator
+import os
 import re
+import select
+import time
 from collections import Mapping, MutableSet, Sequence
 from autotest.client import utils
 
@@ -82,7 +91,8 @@ class ColumnRanges(Mapping):
     :raises ValueError: Column < than min_col_len or # columns != expected
     """
 
-    __slots__ = ('ranges', 'columns', 'count')
+    __slots__ = ('ranges', 'columns', 'count', 'slices', '_by_range',
+                 '_by_column', '_starts', '_slicer')
 
     #: Iterable of start/end character-offset tuples corresponding to columns
     ranges = None
@@ -93,6 +103,9 @@ class ColumnRanges(Mapping):
     #: Number of columns/ranges
     count = None
 
+    #: Tuple of ``slice`` instances corresponding to ranges
+    slices = None
+
     #: Regex specifying the column separator
     _re = re.compile(r"\s\s+")
 
@@ -104,6 +117,7 @@ class ColumnRanges(Mapping):
                              % (cols, expected))
         columns = []  # converted to set at end then discarded
         starts = []  # zip()'d at end then discarded
+        position = 0  # search after previous column, keeps starts sorted
         for col in cols:
             col_strip = col.strip()
             if len(col_strip) < min_col_len:
@@ -111,7 +125,9 @@ class ColumnRanges(Mapping):
                                  "required column name length %d"
                                  % (col_strip, min_col_len))
             columns.append(col_strip)
-            starts.append(header_strip.index(col_strip))  # lookup char offset
+            position = header_strip.index(col_strip, position)
+            starts.append(position)  # lookup char offset
+            position += len(col_strip)
         ends = starts[1:] + [None]  # ending offsets EXCLUSIVE for range()
         # Stored separetly b/c dict() storage would be un-ordered!
         self.columns = tuple(columns)
@@ -123,6 +139,16 @@ class ColumnRanges(Mapping):
                 self.count != len(set(self.columns))):
             raise ValueError("Duplicate column names '%s' or ranges '%s' "
                              "detected: " % (columns, ranges))
+        self.slices = tuple(slice(start, end) for start, end in self.ranges)
+        # Lookup tables, in place of searching ranges and columns
+        self._by_range = dict(zip(self.ranges, self.columns))
+        self._by_column = dict(zip(self.columns, self.ranges))
+        self._starts = starts
+        if self.count > 1:
+            # Slices whole line into tuple of values in one call
+            self._slicer = operator.itemgetter(*self.slices)
+        else:
+            self._slicer = lambda line: (line,)
 
     def __str__(self):
         lst = [("%s: %s-%s" % (col, start, end))
@@ -139,16 +165,22 @@ class ColumnRanges(Mapping):
         return self.count  # instance is immutable
 
     def __contains__(self, item):
-        return item in self.ranges or item in self.columns
+        try:
+            return item in self._by_range or item in self._by_column
+        except TypeError:  # unhashable
+            return False
 
     def __iter__(self):
         return self.ranges.__iter__()
 
     def __getitem__(self, key):
         try:
-            return self.columns[list(self.ranges).index(key)]
-        except ValueError:
-            return self.ranges[list(self.columns).index(key)]
+            return self._by_range[key]
+        except KeyError:
+            try:
+                return self._by_column[key]
+            except KeyError:
+                raise ValueError("%r is not a column range or name" % (key,))
 
     def offset(self, offset):
         """
@@ -160,13 +192,19 @@ class ColumnRanges(Mapping):
         """
         if offset is None or offset < 0:
             return self.columns[-1]
-        for index, (start, end) in enumerate(self.ranges):
-            if end is None:
-                return self.columns[-1]
-            if offset in xrange(start, end):
-                return self.columns[index]
-        if offset > 0:
-            return self.columns[-1]  # beyond end of any ranges
+        # Ranges are contiguous, last one is open-ended
+        index = bisect.bisect_right(self._starts, offset) - 1
+        if index < 0:
+            return self.columns[-1]
+        return self.columns[index]
+
+    def split(self, line):
+        """
+        Return tuple of line's substrings for each column, in column order
+
+        :param line: Stripped table row string
+        """
+        return self._slicer(line)
 
 
 class TextTable(MutableSet, Sequence):
@@ -191,19 +229,27 @@ class TextTable(MutableSet, Sequence):
     #: internal cache of parsed rows
     _rows = None
 
+    #: internal count of rows per fingerprint, for constant-time lookups
+    _fingerprints = None
+
+    #: internal cache of columnranges instance and its column names set
+    _column_set = None
+
+    #: internal per-column index of value to matching rows, built on demand
+    _indexes = None
+
     def __init__(self, table):
-        table_lines = table.strip().splitlines()
-        if len(table_lines) < 1:
-            raise TypeError("Table shorter than one line: %s" % table)
-        # First line is header
-        self.columnranges = ColumnRanges(table_lines[0])
-        self._rows = []
         header, tabledata = self.parseheader(table)
-        self.columnranges = ColumnRanges(header)
+        lines = [header]
         if tabledata is not None:
-            for line in self.parserows(tabledata):
-                line_strip = line.strip()
-                self.append(self.parse_line(line_strip))
+            lines.extend(self.parserows(tabledata))
+        reader = TextTableReader(lines, parse_line=self.parse_line)
+        self.columnranges = reader.columnranges
+        self._rows = []
+        self._fingerprints = {}
+        self._indexes = {}
+        for row in reader:
+            self.append(row)
 
     def __eq__(self, other):
         if not hasattr(other, '__iter__'):
@@ -220,13 +266,24 @@ class TextTable(MutableSet, Sequence):
         """
         Return true if any row or row[self.key_column] equals value
         """
+        if isinstance(value, dict):
+            if set(value.keys()) != self.column_set:
+                return False  # All rows conform
+            return self._contains_row(value)
         return self._rows.__contains__(value)
 
     def __setitem__(self, index, value):
         self.conform_or_raise(value)
+        self._forget(self._rows[index])
+        self._remember(value)
         return self._rows.__setitem__(index, value)
 
     def __delitem__(self, index):
+        if isinstance(index, slice):
+            for row in self._rows[index]:
+                self._forget(row)
+        else:
+            self._forget(self._rows[index])
         return self._rows.__delitem__(index)
 
     def __getitem__(self, index):
@@ -237,10 +294,12 @@ class TextTable(MutableSet, Sequence):
         Insert value contents at index
         """
         self.conform_or_raise(value)
+        self._remember(value)
         return self._rows.insert(index, value)
 
     def add(self, value):
         self.conform_or_raise(value)
+        self._remember(value)
         return self._rows.append(value)
 
     def discard(self, index):
@@ -254,8 +313,63 @@ class TextTable(MutableSet, Sequence):
         Inserts value item or iterable at end
         """
         self.conform_or_raise(value)
+        self._remember(value)
         return self._rows.append(value)
 
+    @property
+    def column_set(self):
+        """
+        Frozenset of column names, cached until columnranges is replaced
+        """
+        cached = self._column_set
+        if cached is None or cached[0] is not self.columnranges:
+            cached = (self.columnranges,
+                      frozenset(self.columnranges.columns))
+            self._column_set = cached
+        return cached[1]
+
+    def _fingerprint(self, value):
+        """
+        Return hashable tuple of conforming row value, None if unhashable
+        """
+        fingerprint = tuple(value[column]
+                            for column in self.columnranges.columns)
+        try:
+            hash(fingerprint)
+        except TypeError:
+            return None
+        return fingerprint
+
+    def _contains_row(self, value):
+        """
+        Return True if any row equals conforming value
+        """
+        fingerprint = self._fingerprint(value)
+        if fingerprint is None or None in self._fingerprints:
+            return self._rows.__contains__(value)  # unhashable
+        return fingerprint in self._fingerprints
+
+    def _remember(self, row):
+        """
+        Count fingerprint of row being added (rows must not change after)
+        """
+        self._indexes.clear()
+        fingerprint = self._fingerprint(row)
+        self._fingerprints[fingerprint] = (
+            self._fingerprints.get(fingerprint, 0) + 1)
+
+    def _forget(self, row):
+        """
+        Un-count fingerprint of row being removed
+        """
+        self._indexes.clear()
+        fingerprint = self._fingerprint(row)
+        count = self._fingerprints.get(fingerprint, 0) - 1
+        if count > 0:
+            self._fingerprints[fingerprint] = count
+        else:
+            self._fingerprints.pop(fingerprint, None)
+
     def conforms(self, value):
         """
         Return True if value is non-duplicate dict-like with all column keys
@@ -271,13 +385,13 @@ class TextTable(MutableSet, Sequence):
         if not isinstance(value, dict):
             raise ValueError("Value '%s' is not a dict-like" % value)
         keys = set(value.keys())
-        expected = set(self.columnranges.values())
+        expected = self.column_set
         if keys == expected:
-            if not self.allow_duplicate and self.__contains__(value):
+            if not self.allow_duplicate and self._contains_row(value):
                 raise ValueError("Value '%s' is duplicate" % value)
         else:
             raise ValueError("Value's keys %s != %s columns"
-                             % (keys, expected))
+                             % (keys, set(expected)))
 
     @staticmethod
     def value_filter(value):
@@ -316,21 +430,59 @@ class TextTable(MutableSet, Sequence):
         """
         Parse one line into a dict based on columnranges
         """
-        newdict = {}
-        strippedline = line.strip()
-        for (start, end), colname in self.columnranges.items():
-            newdict[colname] = self.value_filter(strippedline[start:end])
-        return newdict
+        columnranges = self.columnranges
+        value_filter = self.value_filter
+        return dict(zip(columnranges.columns,
+                        [value_filter(value)
+                         for value in columnranges.split(line.strip())]))
+
+    def _index(self, col_name):
+        """
+        Return (cached) dict of col_name values to rows, False if unhashable
+        """
+        index = self._indexes.get(col_name)
+        if index is None:
+            index = {}
+            try:
+                for row in self._rows:
+                    index.setdefault(row.get(col_name), []).append(row)
+            except TypeError:
+                index = False  # Some value is unhashable, must scan
+            self._indexes[col_name] = index
+        return index
+
+    def _matches(self, col_name, value):
+        """
+        Return new list of rows (not copies) with col_name equal to value
+        """
+        index = self._index(col_name)
+        if index is not False:
+            try:
+                return list(index.get(value, ()))
+            except TypeError:
+                pass  # unhashable value
+        return [row for row in self._rows if row.get(col_name) == value]
 
     def search(self, col_name, value):
         """
         Returns a list of dictionaries containing col_name key with value
         """
-        result = []
-        for row in self._rows:
-            if row.get(col_name) == value:
-                result.append(dict(row))
-        return result
+        return [dict(row) for row in self._matches(col_name, value)]
+
+    def search_many(self, col_name, values):
+        """
+        Return dict of each value to list of rows with col_name == value
+
+        Unlike ``search()``, rows are not copied, they must not be modified.
+        The column's index is built once, so lookups cost the same no
+        matter the size of the table.
+
+        :param col_name: Column name to match values against
+        :param values: Iterable of (hashable) values to look up
+        :returns: Dictionary of value to possibly empty list of rows
+        """
+        return dict((value, self._matches(col_name, value))
+                    for value in values)
 
     def find(self, col_name, value):
         """
@@ -343,11 +495,195 @@ class TextTable(MutableSet, Sequence):
         return found[0]
 
 
+class TextTableReader(object):
+
+    """
+    Single-pass iterable of row dictionaries, parsed as lines are read
+
+    Unlike ``TextTable``, never holds more than one row, so large listings
+    from a pipe, file, or ``AsyncDockerCmd.iter_lines()`` can be processed
+    as they arrive.  Rows are parsed just like ``TextTable`` rows, but
+    duplicates are not detected (that would mean keeping them all).
+
+    :param lines: Iterable of line strings, first non-blank one is header
+    :param min_col_len: Minimum number of characters for a column header
+    :param expected: Precise number of columns expected, or raise ValueError
+    :param parse_line: Callable parsing a stripped line into a row dict,
+                       None for this instance's ``parse_line()``.
+    :raises TypeError: if lines contains no header
+    :raises ValueError: on invalid header (see ``ColumnRanges``)
+    """
+
+    #: ``ColumnRanges`` instance parsed from header
+    columnranges = None
+
+    #: Converts each column's string into its row value
+    value_filter = staticmethod(TextTable.value_filter)
+
+    def __init__(self, lines, min_col_len=3, expected=None, parse_line=None):
+        if parse_line is not None:
+            self.parse_line = parse_line
+        self._lines = iter(lines)
+        for line in self._lines:
+            if line.strip():
+                self.columnranges = ColumnRanges(line, min_col_len, expected)
+                break
+        else:
+            raise TypeError("Table shorter than one line")
+
+    def __iter__(self):
+        # Like TextTable, blank lines between rows become all-None rows,
+        # blank lines before the first or after the last row are skipped.
+        blanks = 0
+        started = False
+        for line in self._lines:
+            line_strip = line.strip()
+            if not line_strip:
+                if started:
+                    blanks += 1
+                continue
+            started = True
+            for _ in xrange(blanks):
+                yield self.parse_line('')
+            blanks = 0
+            yield self.parse_line(line_strip)
+
+    def parse_line(self, line):
+        """
+        Parse one stripped line into a dict based on columnranges
+        """
+        columnranges = self.columnranges
+        value_filter = self.value_filter
+        return dict(zip(columnranges.columns,
+                        [value_filter(value)
+                         for value in columnranges.split(line)]))
+
+
+def output_pattern(attribute):
+    """
+    Decorate a ``*_check`` method, returning True only if a compiled regular
+    expression class attribute doesn't ``search()`` output.
+
+    ``OutputGoodBase`` searches output for patterns of all decorated
+    checks together, in a single pass (see ``OutputScanner``), instead of
+    calling each one, so checks must not do anything else.
+
+    :param attribute: Name of class attribute holding the compiled regular
+                      expression, which must not match across lines (e.g.
+                      use ``[^\\S\\r\\n]`` instead of ``\\s``) nor use
+                      anchors.
+    """
+    def decorator(func):  # pylint: disable=C0111
+        func.pattern_attribute = attribute
+        return func
+    return decorator
+
+
+class OutputScanner(object):
+
+    """
+    Find first line matching each of many patterns, in one pass per flags
+
+    Patterns with the same flags are combined into one alternation, so
+    output is searched once per distinct flags value instead of once per
+    pattern.  Patterns with groups are searched separately, since combining
+    would renumber or duplicate them, breaking back-references.  Patterns
+    must not match across lines, since output is scanned in chunks ending
+    on a line boundary.
+
+    :param patterns: Dictionary of name to compiled regular expression
+    """
+
+    def __init__(self, patterns):
+        #: Dictionary of name to compiled regular expression
+        self.patterns = dict(patterns)
+        # Combinations are compiled once, for each set of names not yet found
+        self._searchers = {}
+
+    def searchers(self, names):
+        """
+        Return list of (compiled regex, names it combines) covering names
+        """
+        key = frozenset(names)
+        searchers = self._searchers.get(key)
+        if searchers is None:
+            searchers = []
+            by_flags = {}
+            for name in sorted(key):
+                regex = self.patterns[name]
+                if regex.groups:
+                    searchers.append((regex, (name,)))
+                else:
+                    by_flags.setdefault(regex.flags, []).append(name)
+            for flags, combine in sorted(by_flags.items()):
+                if len(combine) == 1:
+                    regex = self.patterns[combine[0]]
+                else:
+                    regex = re.compile('|'.join('(?:%s)'
+                                                % self.patterns[name].pattern
+                                                for name in combine), flags)
+                searchers.append((regex, tuple(combine)))
+            self._searchers[key] = searchers
+        return searchers
+
+    def scan(self, chunks):
+        """
+        Return dictionary of name to (offset, line) of first matching line
+
+        :param chunks: Iterable of output strings, split anywhere
+        :return: Dictionary with names of matched patterns only, offset is
+                 of line's start within output.
+        """
+        found = {}
+        offset = 0  # of text within output
+        carry = ''  # unterminated last line of previous chunk
+        for chunk in chunks:
+            text = carry + chunk
+            end = text.rfind('\n') + 1
+            self._scan_text(text, end, offset, found)
+            if len(found) == len(self.patterns):
+                return found
+            carry = text[end:]
+            offset += end
+        self._scan_text(carry, len(carry), offset, found)
+        return found
+
+    def _scan_text(self, text, end, offset, found):
+        """
+        Record lines of text up to end matching patterns not found yet
+        """
+        remaining = [name for name in self.patterns if name not in found]
+        for regex, names in self.searchers(remaining):
+            pos = 0
+            while pos < end:
+                match = regex.search(text, pos, end)
+                if match is None:
+                    break
+                start = text.rfind('\n', 0, match.start()) + 1
+                stop = text.find('\n', match.start(), end)
+                if stop < 0:
+                    stop = end
+                # One match may hide others on the line, try each pattern
+                line = text[start:stop]
+                for name in names:
+                    if self.patterns[name].search(line):
+                        found[name] = (offset + start, line)
+                names = [name for name in names if name not in found]
+                if not names:
+                    break
+                regex = self.searchers(names)[0][0]
+                pos = stop + 1
+
+
 class OutputGoodBase(AllGoodBase):
 
     """
     Compare True if all methods ending in '_check' return True on stdout/stderr
 
+    Checks decorated by ``output_pattern()`` aren't called, each output is
+    scanned once for all their patterns together instead, without loading
+    it all if it's an ``SpooledOutput``.
+
     :param cmdresult: autotest.client.utils.CmdResult instance
     :param ignore_error: Raise exceptions.DockerOutputError if False
     :param skip: Iterable of checks to bypass, None to run all
@@ -356,18 +692,21 @@ class OutputGoodBase(AllGoodBase):
     #: Reference to original CmdResult instance
     cmdresult = None
 
-    #: Stripped standard-output string
-    stdout_strip = None
+    #: Mapping of failed pattern check name to (offset, line) of first match
+    #: within stdout or stderr.
+    matches = None
+
+    #: internal cache of stripped standard-output and standard-error
+    _strip = None
 
-    #: Stripped standard-error string
-    stderr_strip = None
+    #: internal cache of ``OutputScanner`` per set of (name, pattern) items
+    _scanners = {}
 
     def __init__(self, cmdresult, ignore_error=False, skip=None):
         # Base class __init__ is abstract
         # pylint: disable=W0231
         self.cmdresult = cmdresult
-        self.stdout_strip = cmdresult.stdout.strip()
-        self.stderr_strip = cmdresult.stderr.strip()
+        self._strip = {}
         # All methods called twice with mangled names, mangle skips also
         if skip is not None:
             if isinstance(skip, (str, unicode)):
@@ -379,6 +718,7 @@ class OutputGoodBase(AllGoodBase):
         else:
             newskip = skip
         self.__instattrs__(newskip)
+        self.matches = {}
         for checker in [name for name in dir(self) if name.endswith('_check')]:
             self.callables[checker + '_stdout'] = getattr(self, checker)
             self.callables[checker + '_stderr'] = getattr(self, checker)
@@ -391,11 +731,84 @@ class OutputGoodBase(AllGoodBase):
     def __str__(self):
         if not self.__nonzero__():
             msg = super(OutputGoodBase, self).__str__()
-            return "%s\nSTDOUT:\n%s\nSTDERR:\n%s" % (msg, self.stdout_strip,
-                                                     self.stderr_strip)
+            return "%s\nSTDOUT:\n%s\nSTDERR:\n%s" % (msg,
+                                                     self._display('stdout'),
+                                                     self._display('stderr'))
         else:
             return super(OutputGoodBase, self).__str__()
 
+    @property
+    def stdout_strip(self):
+        """
+        Stripped standard-output string, loaded on first use
+        """
+        return self._stripped('stdout')
+
+    @property
+    def stderr_strip(self):
+        """
+        Stripped standard-error string, loaded on first use
+        """
+        return self._stripped('stderr')
+
+    def _stripped(self, stream):
+        """
+        Return (cached) stripped cmdresult stream
+        """
+        if stream not in self._strip:
+            self._strip[stream] = getattr(self.cmdresult, stream).strip()
+        return self._strip[stream]
+
+    def _display(self, stream):
+        """
+        Return stripped stream, or representation if it's spooled
+        """
+        output = getattr(self.cmdresult, stream)
+        if hasattr(output, 'iter_chunks'):  # Spooled, don't load it all
+            return repr(output)
+        return self._stripped(stream)
+
+    def _scanner(self, patterns):
+        """
+        Return (cached) ``OutputScanner`` of patterns dictionary
+        """
+        key = frozenset(patterns.items())
+        scanner = self._scanners.get(key)
+        if scanner is None:
+            scanner = self._scanners[key] = OutputScanner(patterns)
+        return scanner
+
+    def call_callables(self):
+        """
+        Scan each output once for all pattern checks, call all other checks
+        """
+        results = {}
+        for stream in ('stdout', 'stderr'):
+            suffix = '_' + stream
+            patterns = {}
+            for name, call in self.callables.items():
+                attribute = getattr(call, 'pattern_attribute', None)
+                if (attribute is not None and name not in self.skip and
+                        name.endswith(suffix)):
+                    patterns[name] = getattr(self, attribute)
+            if not patterns:
+                continue
+            output = getattr(self.cmdresult, stream)
+            if hasattr(output, 'iter_chunks'):  # Spooled, don't load it all
+                chunks = output.iter_chunks()
+            else:
+                chunks = [output]
+            found = self._scanner(patterns).scan(chunks)
+            for name in patterns:
+                results[name] = name not in found
+            self.matches.update(found)
+        for name, call in self.callables.items():
+            if name in results or name in self.skip:
+                continue
+            if callable(call):
+                results[name] = call(**self.callable_args(name))
+        self.results.update(self.prepare_results(results))
+
     def callable_args(self, name):
         if name.endswith('_stdout'):
             return {'output': self.stdout_strip}
@@ -407,13 +820,22 @@ class OutputGoodBase(AllGoodBase):
     def prepare_results(self, results):
         duplicate = False
         for checker, passed in results.items():
-            if not passed and not duplicate:
-                exit_status = self.cmdresult.exit_status
-                stdout = self.cmdresult.stdout.strip()
-                stderr = self.cmdresult.stderr.strip()
-                detail = 'Command '
-                if exit_status != 0:
-                    detail += 'exit %d ' % exit_status
+            if passed:
+                continue
+            exit_status = self.cmdresult.exit_status
+            detail = 'Command '
+            if exit_status != 0:
+                detail += 'exit %d ' % exit_status
+            if checker in self.matches:
+                # Matched line is enough, don't load (spooled) output
+                offset, line = self.matches[checker]
+                detail += ('%s line "%s" at offset %d.'
+                           % (checker.rsplit('_', 1)[1], line.strip(),
+                              offset))
+                self.details[checker] = detail
+            elif not duplicate:
+                stdout = self.stdout_strip
+                stderr = self.stderr_strip
                 if len(stdout) > 0:
                     detail += 'stdout "%s" ' % stdout
                 if len(stderr) > 0:
@@ -429,63 +851,382 @@ class OutputGood(OutputGoodBase):
     Container of standard checks
     """
 
-    @staticmethod
-    def crash_check(output):
+    #: Go panic message, fails ``crash_check()``
+    crash_pattern = re.compile(r'panic:[^\r\n]+error')
+
+    #: Docker usage message, fails ``usage_check()``
+    usage_pattern = re.compile(r'usage:[^\S\r\n]+docker[^\S\r\n]+\S',
+                               re.IGNORECASE)
+
+    #: Error message, fails ``error_check()``
+    error_pattern = re.compile(r'error: [^\S\r\n]*\S', re.IGNORECASE)
+
+    @classmethod
+    @output_pattern('crash_pattern')
+    def crash_check(cls, output):
         """
         Return False if Go panic string found in output
 
         :param output: Stripped output string
         :return: True if Go panic pattern **not** found
         """
-        regex = re.compile(r'\s*panic:\s*.+error.*')
-        for line in output.splitlines():
-            if bool(regex.search(line.strip())):
-                return False  # panic message found
-        return True  # panic message not found
+        return cls.crash_pattern.search(output) is None
 
-    @staticmethod
-    def usage_check(output):
+    @classmethod
+    @output_pattern('usage_pattern')
+    def usage_check(cls, output):
         """
         Return False if 'Docker usage' pattern found in output
 
         :param output: Stripped output string
         :return: True if usage message pattern **not** found
         """
-        regex = re.compile(r'\s*usage:\s+docker\s+.*', re.IGNORECASE)
-        for line in output.splitlines():
-            if bool(regex.search(line.strip())):
-                return False  # usage message found
-        return True  # usage message not found
+        return cls.usage_pattern.search(output) is None
 
-    @staticmethod
-    def error_check(output):
+    @classmethod
+    @output_pattern('error_pattern')
+    def error_check(cls, output):
         """
         Return False if 'Error: ' pattern found in output
 
         :param output: Stripped output string
         :return: True if 'Error: ' does **not** sppear
         """
-        for line in output.splitlines():
-            if line.lower().strip().count('error: '):
-                return False
+        return cls.error_pattern.search(output) is None
+
+
+class SpooledOutput(object):
+
+    """
+    Read-only command output spooled into a file, loaded lazily through
+    ``mmap``.  Supports ``len()``, ``in``, slicing, line iteration and
+    ``str()`` like a string, other string methods load all of it.
+
+    :param path: Path to file containing the output
+    """
+
+    #: Bytes read at a time by ``iter_chunks()`` and ``hexdigest()``
+    chunk_size = 1024 * 1024
+
+    def __init__(self, path):
+        self.path = path
+        self._mmap = None
+
+    @property
+    def data(self):
+        """
+        Read-only ``mmap`` (or empty string) of file, mapped on first use
+        """
+        if self._mmap is None:
+            if os.path.getsize(self.path) == 0:
+                return ''  # Can't mmap empty file
+            with open(self.path, 'rb') as spool:
+                self._mmap = mmap.mmap(spool.fileno(), 0,
+                                       access=mmap.ACCESS_READ)
+        return self._mmap
+
+    def __len__(self):
+        return os.path.getsize(self.path)
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def __contains__(self, substring):
+        return self.data.find(substring) != -1
+
+    def __iter__(self):
+        """
+        Generate lines (with line endings) without loading whole file
+        """
+        with open(self.path, 'rb') as spool:
+            for line in spool:
+                yield line
+
+    def __str__(self):
+        return self.data[:]
+
+    def __repr__(self):
+        return ("<%s of %d bytes in %s>"
+                % (self.__class__.__name__, len(self), self.path))
+
+    def __eq__(self, other):
+        if isinstance(other, SpooledOutput):
+            other = str(other)
+        if not isinstance(other, basestring):
+            return NotImplemented
+        return len(self) == len(other) and str(self) == other
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    def __getattr__(self, name):
+        # Fall back to string methods (strip, splitlines, etc.)
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(str(self), name)
+
+    def iter_chunks(self, chunk_size=None):
+        """
+        Generate file contents in chunk_size (or ``chunk_size``) strings
+        """
+        if chunk_size is None:
+            chunk_size = self.chunk_size
+        with open(self.path, 'rb') as spool:
+            while True:
+                chunk = spool.read(chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+
+    def hexdigest(self, algorithm='md5'):
+        """
+        Return hex digest of contents, without loading all of it
+
+        :param algorithm: Name of any ``hashlib`` algorithm
+        """
+        digest = hashlib.new(algorithm)
+        for chunk in self.iter_chunks():
+            digest.update(chunk)
+        return digest.hexdigest()
+
+    def close(self):
+        """
+        Unmap file, it's re-mapped if accessed again
+        """
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+
+class OutputWatcher(object):
+
+    """
+    File-like object signaling each write through a pipe, for use as
+    ``AsyncJob`` ``stdout_tee`` or ``stderr_tee`` so waiters can block in
+    ``select()`` instead of polling.
+    """
+
+    def __init__(self):
+        self._rfd, self._wfd = os.pipe()
+        for fd in (self._rfd, self._wfd):
+            flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+            fcntl.fcntl(fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+
+    def write(self, data):
+        """
+        Signal waiters, data itself is not kept
+        """
+        if not data or self._wfd is None:
+            return
+        try:
+            os.write(self._wfd, '.')
+        except OSError, detail:
+            if detail.errno != errno.EAGAIN:  # Pipe full, already signaled
+                raise
+
+    def flush(self):
+        """
+        Do nothing, data is not kept
+        """
+        pass
+
+    def wait(self, timeout):
+        """
+        Block until a write happens or timeout, return True if written
+
+        :param timeout: Maximum seconds to block
+        """
+        if self._rfd is None:
+            return False
+        readable = select.select([self._rfd], [], [], max(timeout, 0))[0]
+        if not readable:
+            return False
+        try:
+            while os.read(self._rfd, 4096):
+                pass
+        except OSError, detail:
+            if detail.errno != errno.EAGAIN:
+                raise
         return True
 
+    def close(self):
+        """
+        Close signaling pipe, further writes are ignored
+        """
+        for fd in (self._rfd, self._wfd):
+            if fd is not None:
+                os.close(fd)
+        self._rfd = self._wfd = None
+
+    def __del__(self):
+        self.close()
+
+
+class RingCapture(object):
 
-def wait_for_output(output_fn, pattern, timeout=60, timestep=0.2):
+    """
+    File-like ``AsyncJob`` tee bounding the job's in-memory output buffer to
+    its last ``limit`` bytes (or lines), while streaming all output into
+    a file and counting it.
+
+    :param path: File to append complete output into, None to not keep it
+    :param limit: Number of bytes or lines to keep in memory
+    :param lines: True if limit counts lines instead of bytes
+    """
+
+    #: Total number of bytes written
+    nbytes = 0
+
+    #: Total number of newline characters written
+    nlines = 0
+
+    #: Number of bytes trimmed off the front of the attached buffer
+    discarded = 0
+
+    def __init__(self, path, limit, lines=False):
+        if limit < 1:
+            raise ValueError("Capture limit must be positive, not %s"
+                             % limit)
+        self.path = path
+        self.limit = limit
+        self.lines = lines
+        self._buffer = None
+        self._held = 0  # bytes or lines in buffer since last trim
+        if path is not None:
+            self._file = open(path, 'ab')
+        else:
+            self._file = None
+
+    def attach(self, buffer_obj):
+        """
+        Start trimming buffer_obj, caller must hold its lock.
+
+        :param buffer_obj: Seekable, truncatable in-memory file (StringIO)
+        """
+        self._buffer = buffer_obj
+        value = buffer_obj.getvalue()
+        if self.lines:
+            self._held = value.count('\n')
+        else:
+            self._held = len(value)
+        self.trim()
+
+    def write(self, data):
+        """
+        Record data, trimming buffer once it holds twice the limit.
+        Called by ``AsyncJob`` with buffer's lock held.
+        """
+        self.nbytes += len(data)
+        newlines = data.count('\n')
+        self.nlines += newlines
+        if self._file is not None:
+            self._file.write(data)
+            self._file.flush()
+        if self.lines:
+            self._held += newlines
+        else:
+            self._held += len(data)
+        if self._held >= 2 * self.limit:
+            self.trim()
+
+    def flush(self):
+        """
+        Flush output file (if any)
+        """
+        if self._file is not None:
+            self._file.flush()
+
+    def trim(self):
+        """
+        Discard all but last ``limit`` bytes/lines from attached buffer.
+        Caller must hold buffer's lock.
+        """
+        if self._buffer is None:
+            return
+        value = self._buffer.getvalue()
+        if self.lines:
+            keep = ''.join(value.splitlines(True)[-self.limit:])
+            self._held = min(value.count('\n'), self.limit)
+        else:
+            keep = value[-self.limit:]
+            self._held = len(keep)
+        cut = len(value) - len(keep)
+        if cut <= 0:
+            return
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        self._buffer.write(keep)
+        self.discarded += cut
+
+    def close(self):
+        """
+        Close output file, further writes are only counted and buffered.
+        Caller must hold buffer's lock.
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def wait_for_match(output_fn, pattern, timeout=60, timestep=0.2,
+                   watcher=None, overlap=4096):
+    r"""
+    Wait for regex pattern to match output_fn() value, return the match.
+
+    Output is assumed to only ever grow, so every check only searches data
+    arriving since the previous check, plus overlap characters before it
+    for matches spanning the boundary.
+
+    :param output_fn: function which returns data for matching.
+    :param pattern: Regular expression string or compiled object to search
+    :param timeout: Maximum seconds to wait
+    :param timestep: Seconds between checks, with a watcher only an upper
+                     bound used in case a write races with a check.
+    :param watcher: Optional ``OutputWatcher`` receiving output_fn's data
+    :param overlap: Maximum match length spanning two checks
+    :return: ``re`` match object (positions index output_fn() value) or
+             None if timeout expired.
+    """
+    if not callable(output_fn):
+        raise TypeError("Output function type %s value %s is not a callable"
+                        % (output_fn.__class__.__name__, str(output_fn)))
+    regex = re.compile(pattern)
+    state = {'searched': 0, 'match': None}
+
+    def _search():  # private, no docstring pylint: disable=C0111
+        output = output_fn()
+        if len(output) < state['searched']:
+            state['searched'] = 0  # output was reset, start over
+        pos = max(0, state['searched'] - overlap)
+        state['searched'] = len(output)
+        state['match'] = regex.search(output, pos)
+        return state['match'] is not None
+
+    if watcher is None:
+        utils.wait_for(_search, timeout, step=timestep)
+        return state['match']
+    endtime = time.time() + timeout
+    while not _search():
+        remaining = endtime - time.time()
+        if remaining <= 0:
+            return None
+        watcher.wait(min(remaining, timestep))
+    return state['match']
+
+
+def wait_for_output(output_fn, pattern, timeout=60, timestep=0.2,
+                    watcher=None):
     r"""
     Wait for matched_string in async_process.stdout max for time==timeout.
 
     :param process_output_fn: function which returns data for matching.
     :type process_output_fn: function
     :param pattern: string which should be found in stdout.
+    :param watcher: Optional ``OutputWatcher`` receiving output_fn's data
     :return: True if pattern matches process_output else False
     """
-    if not callable(output_fn):
-        raise TypeError("Output function type %s value %s is not a callable"
-                        % (output_fn.__class__.__name__, str(output_fn)))
-    regex = re.compile(pattern)
-    _fn = lambda: regex.findall(output_fn()) != []
-    res = utils.wait_for(_fn, timeout, step=timestep)
-    if res:
-        return True
-    return False
+    return wait_for_match(output_fn, pattern, timeout, timestep,
+                          watcher) is not None
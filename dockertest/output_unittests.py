@@ -120,6 +120,100 @@ class BaseInterfaceTest(unittest.TestCase):
         self.assertRaises(self.output.xceptions.DockerOutputError,
                           self.output.OutputGood, cmdresult)
 
+    def test_pattern_checks(self):
+        output = self.output
+
+        class Custom(output.OutputGood):
+
+            oops_pattern = output.re.compile(r'oops')
+
+            @classmethod
+            @output.output_pattern('oops_pattern')
+            def oops_check(cls, output):
+                return cls.oops_pattern.search(output) is None
+
+            def line_check(fake_self, output):
+                return len(output.splitlines()) < 3
+
+        cmdresult = FakeCmdResult('docker', 0, "ok\nfine\n", "so\noops\n")
+        good = Custom(cmdresult, ignore_error=True)
+        self.assertFalse(good)
+        self.assertEqual(good.matches, {'oops_check_stderr': (3, 'oops')})
+        self.assertTrue('line "oops" at offset 3'
+                        in good.details['oops_check_stderr'])
+        self.assertTrue(good.results['line_check_stdout'])
+        self.assertTrue(Custom(cmdresult, skip='oops_check'))
+        self.assertTrue(Custom.oops_check('fine'))
+        self.assertFalse(Custom.oops_check('oops'))
+        cmdresult.stdout = "1\n2\n3\nError: blah"
+        good = Custom(cmdresult, ignore_error=True)
+        self.assertFalse(good.results['line_check_stdout'])
+        self.assertEqual(good.matches['error_check_stdout'],
+                         (6, 'Error: blah'))
+        # Offsets are within unstripped output
+        cmdresult.stdout = "\n  Error: blah\n"
+        good = Custom(cmdresult, ignore_error=True)
+        self.assertEqual(good.matches['error_check_stdout'],
+                         (1, '  Error: blah'))
+        # Compiled once
+        self.assertTrue(Custom(cmdresult, ignore_error=True)._scanner(
+            {'error_check_stdout': Custom.error_pattern}) is
+            good._scanner({'error_check_stdout': Custom.error_pattern}))
+
+    def test_spooled(self):
+        import os
+        import tempfile
+        output = self.output
+
+        class Unloadable(output.SpooledOutput):
+
+            @property
+            def data(self):
+                raise AssertionError("Spooled output loaded")
+        osfd, filename = tempfile.mkstemp()
+        try:
+            os.write(osfd, "ok\n" * 100000 + "  Error: boom\nok\n")
+            os.close(osfd)
+            spooled = Unloadable(filename)
+            spooled.chunk_size = 1000
+            cmdresult = FakeCmdResult('docker', 1, spooled, '')
+            good = output.OutputGood(cmdresult, ignore_error=True)
+            self.assertFalse(good)
+            self.assertEqual(good.matches, {'error_check_stdout':
+                                            (300000, '  Error: boom')})
+            self.assertTrue('Error: boom' in str(good))
+            self.assertTrue(filename in str(good))
+            self.assertRaises(AssertionError, getattr, good, 'stdout_strip')
+            # Same offsets as unspooled
+            cmdresult.stdout = open(filename).read()
+            self.assertEqual(output.OutputGood(cmdresult,
+                                               ignore_error=True).matches,
+                             good.matches)
+        finally:
+            os.unlink(filename)
+
+    def test_scanner(self):
+        scanner = self.output.OutputScanner({
+            'one': self.output.re.compile('one'),
+            'two': self.output.re.compile('t[^\n]*o', self.output.re.I),
+            'three': self.output.re.compile('three')})
+        # Overlapping matches, split lines
+        found = scanner.scan(['zero\nTwone\nthr', 'ee\nthree'])
+        self.assertEqual(found, {'one': (5, 'Twone'), 'two': (5, 'Twone'),
+                                 'three': (11, 'three')})
+        self.assertEqual(scanner.scan(['on', 'e', 't', 'w']),
+                         {'one': (0, 'onetw')})
+        self.assertEqual(scanner.scan([]), {})
+        # Groups aren't combined, back-references still work
+        scanner = self.output.OutputScanner({
+            'double': self.output.re.compile(r'(\w)\1'),
+            'named': self.output.re.compile(r'(?P<a>x)y(?P=a)'),
+            'plain': self.output.re.compile(r'z')})
+        self.assertEqual(scanner.scan(['ab\nxyx\nzz\nz']),
+                         {'double': (7, 'zz'), 'named': (3, 'xyx'),
+                          'plain': (7, 'zz')})
+        self.assertEqual(len(scanner.searchers(scanner.patterns)), 3)
+
 
 class DockerVersionTest(unittest.TestCase):
 
@@ -174,6 +268,25 @@ class ColumnRangesTest(unittest.TestCase):
         self.assertEqual(tc.offset(99999), 'NAMES')
         self.assertEqual(tc.offset(-99999), 'NAMES')
         self.assertEqual(tc.offset(None), 'NAMES')
+        for start, end in tc:
+            self.assertEqual(tc.offset(start), tc[(start, end)])
+            if end is not None:
+                self.assertEqual(tc.offset(end - 1), tc[(start, end)])
+
+    def test_lookup(self):
+        tc = self.ColumnRanges(self.table)
+        self.assertEqual(tc['IMAGE'], (20, 40))
+        self.assertEqual(tc[(20, 40)], 'IMAGE')
+        self.assertEqual(tc['NAMES'], (120, None))
+        self.assertRaises(ValueError, tc.__getitem__, 'FOO')
+        self.assertFalse([] in tc)
+        # Column names contained in earlier ones
+        tc = self.ColumnRanges('REPO IMAGE  IMAGE  SIZE')
+        self.assertEqual(tc.ranges, ((0, 12), (12, 19), (19, None)))
+        self.assertEqual(tc.offset(15), 'IMAGE')
+        self.assertEqual(tc.split('abc  def    ghi    jk'),
+                         ('abc  def    ', 'ghi    ', 'jk'))
+        self.assertEqual(self.ColumnRanges('NAMES').split('abc'), ('abc',))
 
 
 class TextTableTest(unittest.TestCase):
@@ -258,6 +371,101 @@ line three
         self.assertEqual(x['SIZE'], '166 B')
         # The last item with newlines isn't parsed properly, hence no unittest
 
+    def test_duplicates(self):
+        tt = self.TT(self.table)
+        row = dict(self.expected[0])
+        self.assertTrue(row in tt)
+        self.assertFalse({'one': 'foo'} in tt)
+        self.assertRaises(ValueError, tt.append, row)
+        del tt[0]
+        self.assertFalse(row in tt)
+        tt.append(row)
+        self.assertRaises(ValueError, tt.insert, 0, dict(row))
+        tt[-1] = {'one': 'x', 'two': 'y', 'three': 'z'}
+        self.assertFalse(row in tt)
+        del tt[:]
+        self.assertFalse(self.expected[1] in tt)
+        # Unhashable values still compare
+        tt.append({'one': ['list'], 'two': None, 'three': None})
+        self.assertTrue({'one': ['list'], 'two': None, 'three': None} in tt)
+        self.assertFalse(self.expected[1] in tt)
+        self.assertEqual(tt.column_set, frozenset(['one', 'two', 'three']))
+
+    def test_reader(self):
+        from output import TextTableReader
+        self.assertRaises(TypeError, TextTableReader, ['', '  \n'])
+        self.assertRaises(TypeError, self.TT, '\n')
+        # Rows are parsed one at a time, as lines are pulled
+        lines = iter(['\n'] + self.table.splitlines(True))
+        reader = TextTableReader(lines)
+        self.assertEqual(reader.columnranges.columns,
+                         ('one', 'two', 'three'))
+        rows = iter(reader)
+        self.assertEqual(rows.next(), self.expected[0])
+        self.assertEqual(lines.next(), '1     2     3   4  \n')
+        self.assertEqual(list(rows), self.expected[2:])
+        # Duplicates are not detected
+        reader = TextTableReader(['one  two  three', 'a', '', '', 'a'])
+        self.assertEqual([row['one'] for row in reader],
+                         ['a', None, None, 'a'])
+
+    def test_hooks(self):
+        class UpperTable(self.TT):
+            value_filter = staticmethod(lambda value: value.strip().upper())
+
+            @staticmethod
+            def parserows(tabledata):
+                return [line for line in tabledata.splitlines()
+                        if not line.startswith('#')]
+        tt = UpperTable('one  two\n#comment\na    b')
+        self.assertEqual(list(tt), [{'one': 'A', 'two': 'B'}])
+
+    def test_search_many(self):
+        tt = self.TT(self.table)
+        found = tt.search_many('two', ['bar', 'b', 'nothing'])
+        self.assertEqual(found, {'bar': [self.expected[0]],
+                                 'b': [self.expected[3]],
+                                 'nothing': []})
+        self.assertTrue(found['b'][0] is tt[3])  # Not copied
+        self.assertFalse(tt.search('two', 'b')[0] is tt[3])
+        # Index follows changes
+        tt.append({'one': 'x', 'two': 'b', 'three': 'y'})
+        self.assertEqual(len(tt.search('two', 'b')), 2)
+        tt[0] = {'one': 'x', 'two': 'z', 'three': 'y'}
+        self.assertEqual(tt.search('two', 'bar'), [])
+        self.assertEqual(tt.find('two', 'z')['one'], 'x')
+        tt.insert(0, {'one': 'q', 'two': 'b', 'three': None})
+        self.assertEqual([row['one'] for row in tt.search('two', 'b')],
+                         ['q', 'a', 'x'])
+        del tt[0]
+        self.assertRaises(IndexError, tt.find, 'two', 'b')
+        # Unhashable values still match
+        tt.append({'one': ['list'], 'two': None, 'three': None})
+        self.assertEqual(len(tt.search('one', ['list'])), 1)
+        self.assertEqual(len(tt.search_many('one', ['a'])['a']), 1)
+
+    def test_scaling(self):
+        # Duplicate checks must not compare against every row (quadratic)
+        comparisons = []
+
+        class Value(str):
+            __hash__ = str.__hash__
+
+            def __eq__(self, other):
+                comparisons.append(1)
+                return str.__eq__(self, other)
+
+        class CountingTable(self.TT):
+            value_filter = staticmethod(lambda value: Value(value.strip()))
+        rows = ["%064x  busybox:latest  name%d" % (index, index)
+                for index in xrange(2000)]
+        tt = CountingTable("\n".join(["CONTAINER ID%s  IMAGE           NAMES"
+                                      % (' ' * 54)] + rows))
+        self.assertEqual(len(tt), 2000)
+        self.assertTrue(len(comparisons) < 2000,
+                        "%d comparisons building 2000 rows"
+                        % len(comparisons))
+
 
 class WaitForOutput(unittest.TestCase):
 
@@ -290,6 +498,20 @@ class WaitForOutput(unittest.TestCase):
         self.assertGreater(t + 7, e,
                            "Waiting for output takes longer time")
 
+    def test_wait_for_match(self):
+        chunks = iter(['foo', 'foo bar', 'foo bar\nready: 4',
+                       'foo bar\nready: 42\n'])
+        output = []
+
+        def out():
+            output.append(chunks.next())
+            return output[-1]
+        match = self.output.wait_for_match(out, r"ready: (\d+)\n", 8, 1,
+                                           overlap=8)
+        self.assertEqual(match.group(1), '42')
+        self.assertEqual(match.start(), 8)
+        self.assertEqual(len(output), 4)
+
     @staticmethod
     def outgenerator(raise_time, expected_out):
         t = time.time()
@@ -322,5 +544,135 @@ class WaitForOutput(unittest.TestCase):
         pass
 
 
+class OutputWatcherTest(unittest.TestCase):
+
+    def setUp(self):
+        import output
+        self.output = output
+
+    def test_wait(self):
+        watcher = self.output.OutputWatcher()
+        self.assertFalse(watcher.wait(0))
+        watcher.write('foo')
+        watcher.write('bar')
+        self.assertTrue(watcher.wait(0))
+        self.assertFalse(watcher.wait(0))
+        watcher.close()
+        watcher.write('ignored')
+        self.assertFalse(watcher.wait(0))
+
+    def test_wait_for_match(self):
+        import threading
+        watcher = self.output.OutputWatcher()
+        data = []
+
+        def writer():
+            for line in ('starting\n', 'listening\n'):
+                data.append(line)
+                watcher.write(line)
+        thread = threading.Timer(0.05, writer)
+        thread.start()
+        start = self.output.time.time()
+        match = self.output.wait_for_match(lambda: ''.join(data),
+                                           'listen', timeout=5,
+                                           timestep=10, watcher=watcher)
+        thread.join()
+        self.assertEqual(match.start(), len('starting\n'))
+        # Woken by writes, not the 10 second timestep
+        self.assertTrue(self.output.time.time() - start < 5)
+        self.assertFalse(self.output.wait_for_output(lambda: ''.join(data),
+                                                     'nope', timeout=0.05,
+                                                     watcher=watcher))
+
+
+class RingCaptureTest(unittest.TestCase):
+
+    def setUp(self):
+        import output
+        self.output = output
+
+    @staticmethod
+    def drain(buf, capture, data):
+        # Mimic AsyncJob drainer thread writing to [buffer, tee]
+        buf.write(data)
+        capture.write(data)
+
+    def test_bytes(self):
+        import os
+        import tempfile
+        from StringIO import StringIO
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            capture = self.output.RingCapture(path, 4)
+            buf = StringIO()
+            buf.write('ab')
+            capture.attach(buf)
+            self.drain(buf, capture, 'cdef\n')
+            self.assertEqual(buf.getvalue(), 'abcdef\n')
+            self.drain(buf, capture, 'gh')
+            self.assertEqual(buf.getvalue(), 'f\ngh')
+            self.assertEqual(capture.discarded, 5)
+            self.assertEqual((capture.nbytes, capture.nlines), (7, 1))
+            capture.close()
+            self.drain(buf, capture, 'ij')
+            self.assertEqual(open(path).read(), 'cdef\ngh')
+        finally:
+            os.unlink(path)
+
+    def test_lines(self):
+        from StringIO import StringIO
+        capture = self.output.RingCapture(None, 2, lines=True)
+        buf = StringIO()
+        capture.attach(buf)
+        for line in ('one\n', 'two\n', 'three\n', 'four\n', 'fi'):
+            self.drain(buf, capture, line)
+        self.assertEqual(buf.getvalue(), 'three\nfour\nfi')
+        self.assertEqual(capture.discarded, len('one\ntwo\n'))
+        self.assertEqual(capture.nlines, 4)
+        self.assertRaises(ValueError, self.output.RingCapture, None, 0)
+
+
+class SpooledOutputTest(unittest.TestCase):
+
+    def setUp(self):
+        import os
+        import tempfile
+        import output
+        self.output = output
+        fd, self.path = tempfile.mkstemp()
+        os.write(fd, 'foo\nbar\nbaz')
+        os.close(fd)
+
+    def tearDown(self):
+        import os
+        os.unlink(self.path)
+
+    def test_string_like(self):
+        spool = self.output.SpooledOutput(self.path)
+        self.assertEqual(len(spool), 11)
+        self.assertTrue('bar' in spool)
+        self.assertFalse('qux' in spool)
+        self.assertEqual(spool[4:7], 'bar')
+        self.assertEqual(str(spool), 'foo\nbar\nbaz')
+        self.assertEqual(spool, 'foo\nbar\nbaz')
+        self.assertNotEqual(spool, 'foo')
+        self.assertEqual(spool.splitlines(), ['foo', 'bar', 'baz'])
+        self.assertEqual(list(spool), ['foo\n', 'bar\n', 'baz'])
+        self.assertTrue('11 bytes' in repr(spool))
+        spool.close()
+        self.assertEqual(spool.strip(), 'foo\nbar\nbaz')
+
+    def test_chunks(self):
+        import hashlib
+        spool = self.output.SpooledOutput(self.path)
+        self.assertEqual(list(spool.iter_chunks(4)), ['foo\n', 'bar\n',
+                                                      'baz'])
+        self.assertEqual(spool.hexdigest('sha1'),
+                         hashlib.sha1('foo\nbar\nbaz').hexdigest())
+        open(self.path, 'w').close()
+        self.assertEqual(self.output.SpooledOutput(self.path)[:], '')
+
+
 if __name__ == '__main__':
     unittest.main()
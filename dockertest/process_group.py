@@ -0,0 +1,408 @@
+"""
+Run many background processes, draining all their output from one thread.
+
+Every ``autotest.client.utils.AsyncJob`` starts two threads to read its
+process's stdout and stderr.  A ``ProcessGroup`` instead polls the pipes
+of all its processes from a single thread, so thousands of concurrent
+commands don't need thousands of threads.  It's ``GroupJob`` instances
+provide the same interface as ``AsyncJob``, so they can be used by
+``dockercmd.AsyncDockerCmd`` (see its ``group`` attribute).
+"""
+
+# Pylint runs from a different directory, it's fine to import this way
+# pylint: disable=W0403
+
+import errno
+import os
+import select
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+from StringIO import StringIO
+from autotest.client import utils
+
+
+class GroupJob(object):  # Same attributes as AsyncJob pylint: disable=R0902
+
+    """
+    Background process with output drained by a ``ProcessGroup``
+
+    :param group: ``ProcessGroup`` instance draining output
+    :param command: Shell command string to execute
+    :param stdin: None, string of data, file-like object or file-descriptor
+    :param stdout_tee: Optional file-like object also receiving stdout
+    :param stderr_tee: Optional file-like object also receiving stderr
+    """
+
+    #: Seconds to wait for output to close after killing on timeout
+    kill_timeout = 10
+
+    def __init__(self, group, command, stdin=None, stdout_tee=None,
+                 stderr_tee=None):
+        self.group = group
+        self.command = command
+        self.stdout_file = StringIO()
+        self.stderr_file = StringIO()
+        self.stdout_lock = threading.Lock()
+        self.stderr_lock = threading.Lock()
+        self.stdout_tee = stdout_tee
+        self.stderr_tee = stderr_tee
+        self.result = utils.CmdResult(command=command)
+        self.finished = threading.Event()
+        #: Callables (without arguments) called from drain thread when
+        #: process exited and all its output was drained
+        self.finish_callbacks = []
+        self._open_streams = 2
+        if isinstance(stdin, basestring):
+            stdin_file = tempfile.TemporaryFile()
+            stdin_file.write(stdin)
+            stdin_file.seek(0)
+            stdin = stdin_file
+        self.start_time = time.time()
+        self.sp = subprocess.Popen(command, shell=True,
+                                   executable="/bin/bash",
+                                   stdin=stdin,
+                                   stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE,
+                                   close_fds=True)
+        group.register(self)
+
+    @property
+    def done(self):
+        """
+        True once process exited and all of its output was drained
+        """
+        return self.finished.is_set()
+
+    def drain(self, name, data):
+        """
+        Store data read from process's name ('stdout' or 'stderr') pipe
+        """
+        tee = getattr(self, '%s_tee' % name)
+        with getattr(self, '%s_lock' % name):
+            getattr(self, '%s_file' % name).write(data)
+            if tee is not None:
+                tee.write(data)
+
+    def stream_closed(self):
+        """
+        Record closing of one output pipe, return True if all are closed
+        """
+        self._open_streams -= 1
+        return self._open_streams <= 0
+
+    def finish(self, exit_status):
+        """
+        Fill in result after process exited and output is drained
+        """
+        self.result.exit_status = exit_status
+        self.result.duration = time.time() - self.start_time
+        self.result.stdout = self.get_stdout()
+        self.result.stderr = self.get_stderr()
+        for callback in self.finish_callbacks:
+            callback()
+        self.finished.set()
+
+    def get_stdout(self):
+        """
+        Return all stdout output drained so far
+        """
+        with self.stdout_lock:
+            return self.stdout_file.getvalue()
+
+    def get_stderr(self):
+        """
+        Return all stderr output drained so far
+        """
+        with self.stderr_lock:
+            return self.stderr_file.getvalue()
+
+    def kill_func(self):
+        """
+        Terminate process, killing it if still running after a second
+        """
+        for sig in (signal.SIGTERM, signal.SIGKILL):
+            if self.sp.poll() is not None:
+                return
+            try:
+                os.kill(self.sp.pid, sig)
+            except OSError, detail:
+                if detail.errno != errno.ESRCH:
+                    raise
+            self.finished.wait(1)
+
+    def wait_for(self, timeout=None):
+        """
+        Return result after process finishes, killing it after timeout.
+
+        :param timeout: Maximum seconds to wait, None to wait forever
+        """
+        if timeout is None:
+            self.finished.wait()
+        else:
+            self.finished.wait(max(timeout, 0))
+        if not self.finished.is_set():
+            self.kill_func()
+            self.finished.wait(self.kill_timeout)
+        if not self.finished.is_set():
+            # Output still held open (by a grand-child?), take what's there
+            self.result.exit_status = self.sp.poll()
+            self.result.duration = time.time() - self.start_time
+            self.result.stdout = self.get_stdout()
+            self.result.stderr = self.get_stderr()
+        return self.result
+
+
+class ProcessGroup(object):
+
+    """
+    Owns many ``GroupJob`` processes, draining all output from one thread
+
+    Must be ``close()``d to release its resources, or used as a context
+    manager.
+    """
+
+    #: Seconds between checks for exit of processes with closed output
+    reap_interval = 0.05
+
+    def __init__(self):
+        self.jobs = []
+        self._poller = select.poll()
+        self._fds = {}  # fd -> (job, file object, stream name)
+        self._pending = []  # jobs to register from loop thread
+        self._reaping = []  # jobs with closed output, not yet exited
+        self._lock = threading.Lock()
+        self._finished = threading.Condition(threading.Lock())
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        self._poller.register(self._wakeup_r, select.POLLIN)
+        self._thread = None
+        self._closed = False
+
+    def spawn(self, command, stdin=None, stdout_tee=None, stderr_tee=None):
+        """
+        Start command in background, return its ``GroupJob``
+
+        :param command: Shell command string to execute
+        :param stdin: None, string of data, file-like object or file desc.
+        :param stdout_tee: Optional file-like object also receiving stdout
+        :param stderr_tee: Optional file-like object also receiving stderr
+        :raises ValueError: If group was closed
+        """
+        if self._closed:
+            raise ValueError("Process group is closed")
+        return GroupJob(self, command, stdin, stdout_tee, stderr_tee)
+
+    def register(self, job):
+        """
+        Begin draining output of job's already-started process
+        """
+        with self._lock:
+            if self._closed:
+                raise ValueError("Process group is closed")
+            self.jobs.append(job)
+            self._pending.append(job)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop,
+                                                name="ProcessGroup")
+                self._thread.daemon = True
+                self._thread.start()
+            os.write(self._wakeup_w, '.')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _add_pending(self):
+        """
+        Register pipes of newly spawned jobs, from loop thread only
+        """
+        with self._lock:
+            pending = self._pending
+            self._pending = []
+        for job in pending:
+            for name in ('stdout', 'stderr'):
+                fileobj = getattr(job.sp, name)
+                self._fds[fileobj.fileno()] = (job, fileobj, name)
+                self._poller.register(fileobj.fileno(),
+                                      select.POLLIN | select.POLLPRI)
+
+    def _reap(self):
+        """
+        Finish jobs whose process exited after closing its output
+        """
+        for job in list(self._reaping):
+            exit_status = job.sp.poll()
+            if exit_status is not None:
+                self._reaping.remove(job)
+                self._finish(job, exit_status)
+
+    def _finish(self, job, exit_status):
+        """
+        Complete job and notify waiters
+        """
+        job.finish(exit_status)
+        with self._finished:
+            self._finished.notify_all()
+
+    def _read(self, fd):
+        """
+        Drain data available on fd, handle end of file
+        """
+        job, fileobj, name = self._fds[fd]
+        try:
+            data = os.read(fd, 65536)
+        except OSError, detail:
+            if detail.errno in (errno.EAGAIN, errno.EINTR):
+                return
+            data = ''
+        if data:
+            job.drain(name, data)
+            return
+        self._poller.unregister(fd)
+        del self._fds[fd]
+        fileobj.close()
+        if job.stream_closed():
+            self._reaping.append(job)
+
+    def _loop(self):
+        """
+        Poll all pipes, forever (daemon thread)
+        """
+        while True:
+            self._add_pending()
+            self._reap()
+            if self._closed and not self._fds and not self._reaping:
+                with self._lock:
+                    if not self._pending:
+                        self._close_wakeup()
+                        return
+                continue
+            if self._reaping:
+                timeout = self.reap_interval * 1000
+            else:
+                timeout = None
+            try:
+                events = self._poller.poll(timeout)
+            except select.error, detail:
+                if detail.args[0] == errno.EINTR:
+                    continue
+                raise
+            for fd, _ in events:
+                if fd == self._wakeup_r:
+                    os.read(self._wakeup_r, 4096)
+                else:
+                    self._read(fd)
+
+    @staticmethod
+    def _is_done(item):
+        """
+        Return True if GroupJob (or anything with .done) finished
+        """
+        return bool(item.done)
+
+    def wait_any(self, items=None, timeout=None):
+        """
+        Wait until at least one item finished, return list of finished ones
+
+        :param items: Iterable of ``GroupJob``, ``AsyncDockerCmd``, or any
+                      object with a ``done`` property, None for all jobs.
+        :param timeout: Maximum seconds to wait, None to wait forever
+        :return: List of finished items, empty if timeout expired
+        """
+        if items is None:
+            items = list(self.jobs)
+        else:
+            items = list(items)
+        if timeout is not None:
+            endtime = time.time() + timeout
+        with self._finished:
+            while True:
+                done = [item for item in items if self._is_done(item)]
+                if done or not items:
+                    return done
+                if timeout is None:
+                    # Also re-check non-GroupJob items periodically
+                    self._finished.wait(self.reap_interval)
+                    continue
+                remaining = endtime - time.time()
+                if remaining <= 0:
+                    return done
+                self._finished.wait(min(remaining, self.reap_interval))
+
+    def wait_all(self, items=None, timeout=None):
+        """
+        Wait until all items finished, return list of unfinished ones
+
+        :param items: Iterable of ``GroupJob``, ``AsyncDockerCmd``, or any
+                      object with a ``done`` property, None for all jobs.
+        :param timeout: Maximum seconds to wait, None to wait forever
+        :return: List of unfinished items, empty if all finished
+        """
+        if items is None:
+            items = list(self.jobs)
+        else:
+            items = list(items)
+        if timeout is not None:
+            endtime = time.time() + timeout
+        while items:
+            if timeout is None:
+                remaining = None
+            else:
+                remaining = endtime - time.time()
+                if remaining <= 0:
+                    break
+            done = self.wait_any(items, remaining)
+            items = [item for item in items if item not in done]
+        return items
+
+    def run_all(self, commands, limit=None, timeout=None):
+        """
+        Run commands with at most limit at once, return their results
+
+        :param commands: Iterable of shell command strings
+        :param limit: Maximum number of commands running at once, None for
+                      no limit.
+        :param timeout: Seconds after which each command is killed, None to
+                        wait forever.
+        :return: List of ``CmdResult`` instances, in order of commands
+        """
+        pending = list(enumerate(commands))
+        pending.reverse()
+        results = [None] * len(pending)
+        running = {}  # GroupJob -> index
+        while pending or running:
+            while pending and (limit is None or len(running) < limit):
+                index, command = pending.pop()
+                running[self.spawn(command)] = index
+            for job in self.wait_any(running, self.reap_interval):
+                results[running.pop(job)] = job.result
+            if timeout is not None:
+                for job in running:
+                    if time.time() - job.start_time > timeout:
+                        job.kill_func()
+        return results
+
+    def _close_wakeup(self):
+        """
+        Close wakeup pipe, with lock held
+        """
+        os.close(self._wakeup_r)
+        os.close(self._wakeup_w)
+        self._wakeup_r = self._wakeup_w = None
+
+    def close(self):
+        """
+        Stop drain thread once all current jobs finish, refuse new jobs
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            if self._thread is None:
+                self._close_wakeup()
+            else:
+                os.write(self._wakeup_w, '.')
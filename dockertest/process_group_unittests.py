@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+
+# Pylint runs from a different directory, it's fine to import this way
+# pylint: disable=W0403
+
+import sys
+import threading
+import time
+import types
+import unittest
+
+
+# DO NOT allow this function to get loose in the wild!
+def mock(mod_path):
+    """
+    Recursively inject tree of mocked modules from entire mod_path
+    """
+    name_list = mod_path.split('.')
+    child_name = name_list.pop()
+    child_mod = sys.modules.get(mod_path, types.ModuleType(child_name))
+    if len(name_list) == 0:  # child_name is left-most basic module
+        if child_name not in sys.modules:
+            sys.modules[child_name] = child_mod
+        return sys.modules[child_name]
+    else:
+        # New or existing child becomes parent
+        recurse_path = ".".join(name_list)
+        parent_mod = mock(recurse_path)
+        if not hasattr(sys.modules[recurse_path], child_name):
+            setattr(parent_mod, child_name, child_mod)
+            # full-name also points at child module
+            sys.modules[mod_path] = child_mod
+        return sys.modules[mod_path]
+
+
+class FakeCmdResult(object):
+
+    stdout = None
+    stderr = None
+    exit_status = None
+    duration = None
+
+    def __init__(self, **dargs):
+        for key, val in dargs.items():
+            setattr(self, key, val)
+
+setattr(mock('autotest.client.utils'), 'CmdResult', FakeCmdResult)
+
+
+class ProcessGroupTest(unittest.TestCase):
+
+    def setUp(self):
+        import process_group
+        self.process_group = process_group
+        self.group = process_group.ProcessGroup()
+
+    def tearDown(self):
+        self.group.close()
+        # Don't let drain thread outlive interpreter
+        if self.group._thread is not None:
+            self.group._thread.join(5)
+
+    def test_many(self):
+        before = threading.active_count()
+        jobs = [self.group.spawn("echo out%d; echo err%d >&2; exit %d"
+                                 % (index, index, index % 2))
+                for index in xrange(50)]
+        # One drain thread for all processes
+        self.assertEqual(threading.active_count(), before + 1)
+        self.assertEqual(self.group.wait_all(timeout=30), [])
+        for index, job in enumerate(jobs):
+            result = job.wait_for(1)
+            self.assertEqual(result.stdout, "out%d\n" % index)
+            self.assertEqual(result.stderr, "err%d\n" % index)
+            self.assertEqual(result.exit_status, index % 2)
+            self.assertTrue(result.duration >= 0)
+
+    def test_wait_any(self):
+        slow = self.group.spawn("sleep 5")
+        fast = self.group.spawn("cat", stdin="foo")
+        self.assertEqual(self.group.wait_any(timeout=5), [fast])
+        self.assertEqual(fast.get_stdout(), "foo")
+        self.assertEqual(self.group.wait_all([slow], 0.1), [slow])
+        start = time.time()
+        result = slow.wait_for(0)  # Killed on timeout
+        self.assertTrue(time.time() - start < 5)
+        self.assertNotEqual(result.exit_status, 0)
+        self.assertTrue(slow.done)
+
+    def test_tee(self):
+        class Tee(object):
+            data = ''
+
+            def write(self, data):
+                self.data += data
+        tee = Tee()
+        job = self.group.spawn("printf foo", stdout_tee=tee)
+        job.wait_for(10)
+        self.assertEqual(tee.data, "foo")
+
+    def test_run_all(self):
+        commands = ["echo %d; exit %d" % (index, index % 2)
+                    for index in xrange(10)]
+        results = self.group.run_all(commands, limit=3)
+        self.assertEqual([result.stdout for result in results],
+                         ["%d\n" % index for index in xrange(10)])
+        self.assertEqual([result.exit_status for result in results],
+                         [index % 2 for index in xrange(10)])
+        start = time.time()
+        result = self.group.run_all(["sleep 5"], timeout=0.1)[0]
+        self.assertTrue(time.time() - start < 4)
+        self.assertNotEqual(result.exit_status, 0)
+
+    def test_finish_callbacks(self):
+        called = []
+        job = self.group.spawn("sleep 0.2; echo hi")
+        job.finish_callbacks.append(lambda: called.append(job.result.stdout))
+        job.wait_for(5)
+        self.assertEqual(called, ["hi\n"])
+
+    def test_closed(self):
+        self.group.close()
+        self.assertRaises(ValueError, self.group.spawn, "true")
+        self.group.close()
+
+    def test_fds(self):
+        import os
+        before = len(os.listdir('/proc/self/fd'))
+        for _ in xrange(3):
+            unused = self.process_group.ProcessGroup()
+            unused.close()
+            with self.process_group.ProcessGroup() as group:
+                group.spawn("true").wait_for(5)
+            group._thread.join(5)
+        self.assertEqual(len(os.listdir('/proc/self/fd')), before)
+
+
+if __name__ == '__main__':
+    unittest.main()
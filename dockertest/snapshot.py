@@ -0,0 +1,227 @@
+"""
+Point-in-time sets of docker resources, for before/after accounting
+
+Checking what a test created or left behind usually means listing
+containers or images before, listing them again after, and comparing
+lengths or scanning for leftovers.  A ``Snapshot`` records, per resource
+category, every resource's key (ID, name or mount point) along with a
+little state (names, running/exited).  Two snapshots ``diff()`` into a
+``SnapshotDiff`` report of added, removed and changed resources.
+
+When the ``docker_snapshot`` option is enabled, every ``Subtest`` takes
+one snapshot in ``initialize()`` (its ``initial_snapshot``), and logs a
+warning about anything added or removed by the time of ``cleanup()``.
+"""
+
+# Pylint runs from a different directory, it's fine to import this way
+# pylint: disable=W0403
+
+import httplib
+import socket
+import time
+import docker_api
+
+
+#: Resource categories a ``Snapshot`` may hold, in report order
+CATEGORIES = ('containers', 'images', 'volumes', 'networks', 'mounts')
+
+#: Path to kernel's table of mounted filesystems
+PROC_MOUNTS = '/proc/mounts'
+
+
+class Snapshot(object):
+
+    """
+    Immutable record of resource keys and their states, per category
+
+    :param categories: Keyword arguments of category name (from
+                       ``CATEGORIES``) to dictionary of resource key to
+                       comparable state.  Categories not passed were not
+                       collected.
+    :raises ValueError: On unknown category name
+    """
+
+    def __init__(self, **categories):
+        unknown = set(categories) - set(CATEGORIES)
+        if unknown:
+            raise ValueError("Unknown snapshot categories: %s"
+                             % ', '.join(sorted(unknown)))
+        self._categories = dict((name, dict(resources))
+                                for name, resources in categories.items())
+        #: Unix time when snapshot was created
+        self.timestamp = time.time()
+
+    def __contains__(self, category):
+        return category in self._categories
+
+    @property
+    def categories(self):
+        """
+        List of collected category names, in ``CATEGORIES`` order
+        """
+        return [name for name in CATEGORIES if name in self._categories]
+
+    def keys(self, category):
+        """
+        Return frozenset of resource keys in category
+
+        :raises KeyError: If category was not collected
+        """
+        return frozenset(self._categories[category])
+
+    def state(self, category, key):
+        """
+        Return recorded state of resource key in category
+
+        :raises KeyError: If category was not collected or key not in it
+        """
+        return self._categories[category][key]
+
+    def diff(self, after):
+        """
+        Return ``SnapshotDiff`` of changes from this snapshot to after
+
+        :param after: Later ``Snapshot`` instance
+        """
+        return SnapshotDiff(self, after)
+
+
+class SnapshotDiff(object):
+
+    """
+    Resources added, removed or changed between two snapshots, in
+    categories collected by both.  Dictionaries ``added``, ``removed``
+    and ``changed`` map category names to sorted lists of resource keys.
+    Instances are False when nothing differs.
+
+    :param before: Earlier ``Snapshot`` instance
+    :param after: Later ``Snapshot`` instance
+    """
+
+    def __init__(self, before, after):
+        self.before = before
+        self.after = after
+        self.added = {}
+        self.removed = {}
+        self.changed = {}
+        for category in before.categories:
+            if category not in after:
+                continue
+            old = before.keys(category)
+            new = after.keys(category)
+            self.added[category] = sorted(new - old)
+            self.removed[category] = sorted(old - new)
+            self.changed[category] = sorted(
+                key for key in old & new
+                if before.state(category, key) != after.state(category, key))
+
+    def __nonzero__(self):
+        for report in (self.added, self.removed, self.changed):
+            for keys in report.values():
+                if keys:
+                    return True
+        return False
+
+    def __str__(self):
+        lines = []
+        for category in CATEGORIES:
+            for label, report in (('added', self.added),
+                                  ('removed', self.removed),
+                                  ('changed', self.changed)):
+                keys = report.get(category)
+                if keys:
+                    lines.append("%s %s: %s" % (category, label,
+                                                ', '.join(keys)))
+        return '\n'.join(lines)
+
+
+def take(subtest, categories=CATEGORIES):
+    """
+    Return new ``Snapshot`` of categories collected through subtest's config.
+
+    Containers and images are listed through the ``docker_interface``
+    (sharing ``docker_inventory`` listings, if enabled).  Volumes and
+    networks are read from the remote API at ``docker_socket``, they're
+    left out if it doesn't answer (e.g. older daemons).  Mounts are
+    filesystems mounted where path includes 'docker'.
+
+    :param subtest: A subtest.SubBase subclass instance
+    :param categories: Iterable of category names to collect
+    """
+    # containers and images modules import this module's importer
+    from containers import DockerContainers
+    from images import DockerImages
+    categories = list(categories)
+    interface_name = subtest.config.get('docker_interface', 'cli')
+    if interface_name not in DockerContainers.interfaces:
+        interface_name = 'cli'
+    collected = {}
+    if 'containers' in categories:
+        dcs = DockerContainers(subtest, interface_name)
+        # Status like "Up 5 seconds" or "Exited (0) 1 minute ago"
+        collected['containers'] = dict(
+            (cnt.long_id, (cnt.container_name, cnt.status.split(' ')[0]))
+            for cnt in dcs.list_containers())
+    if 'images' in categories:
+        images = {}
+        for img in DockerImages(subtest, interface_name).list_imgs():
+            images.setdefault(img.long_id, set()).add(img.full_name)
+        collected['images'] = dict((long_id, tuple(sorted(names)))
+                                   for long_id, names in images.items())
+    for category, resource, parse in (('volumes', '/volumes',
+                                       _volumes_from_json),
+                                      ('networks', '/networks',
+                                       _networks_from_json)):
+        if category not in categories:
+            continue
+        client, available = docker_api.get_config_client(subtest.config)
+        if available is False:
+            continue  # Already known unreachable
+        try:
+            response = docker_api.get_json(client, resource,
+                                           subtest.config['docker_timeout'])
+        except (socket.error, httplib.HTTPException, ValueError), detail:
+            subtest.logdebug("Not taking snapshot of %s: %s",
+                             category, detail)
+            continue
+        collected[category] = parse(response)
+    if 'mounts' in categories:
+        collected['mounts'] = read_mounts()
+    return Snapshot(**collected)
+
+
+def read_mounts(path_part='docker'):
+    """
+    Return dictionary of mount point to (device, type) from ``PROC_MOUNTS``
+
+    :param path_part: Substring of mount points to include
+    """
+    mounts = {}
+    try:
+        proc_mounts = open(PROC_MOUNTS, 'rb')
+    except IOError:
+        return mounts
+    try:
+        for line in proc_mounts:
+            fields = line.split()
+            if len(fields) >= 3 and path_part in fields[1]:
+                mounts[fields[1]] = (fields[0], fields[2])
+    finally:
+        proc_mounts.close()
+    return mounts
+
+
+# private functions don't need docstrings
+def _volumes_from_json(response):  # pylint: disable=C0111
+    # {"Volumes": [{"Name":..., "Driver":..., "Mountpoint":...}, ...]}
+    return dict((volume['Name'], (volume.get('Driver'),
+                                  volume.get('Mountpoint')))
+                for volume in response.get('Volumes') or [])
+
+
+# private functions don't need docstrings
+def _networks_from_json(response):  # pylint: disable=C0111
+    # [{"Name":..., "Id":..., "Driver":...}, ...]
+    return dict((network['Id'], (network.get('Name'),
+                                 network.get('Driver')))
+                for network in response or [])
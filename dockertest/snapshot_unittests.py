@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+
+# Pylint runs from a different directory, it's fine to import this way
+# pylint: disable=W0403
+
+import os
+import sys
+import tempfile
+import types
+import unittest
+
+
+# DO NOT allow this function to get loose in the wild!
+def mock(mod_path):
+    """
+    Recursively inject tree of mocked modules from entire mod_path
+    """
+    name_list = mod_path.split('.')
+    child_name = name_list.pop()
+    child_mod = sys.modules.get(mod_path, types.ModuleType(child_name))
+    if len(name_list) == 0:  # child_name is left-most basic module
+        if child_name not in sys.modules:
+            sys.modules[child_name] = child_mod
+        return sys.modules[child_name]
+    else:
+        # New or existing child becomes parent
+        recurse_path = ".".join(name_list)
+        parent_mod = mock(recurse_path)
+        if not hasattr(sys.modules[recurse_path], child_name):
+            setattr(parent_mod, child_name, child_mod)
+            # full-name also points at child module
+            sys.modules[mod_path] = child_mod
+        return sys.modules[mod_path]
+
+mock('autotest.client.utils')
+setattr(mock('autotest.client.shared.error'), 'CmdError', Exception)
+setattr(mock('autotest.client.shared.error'), 'TestFail', Exception)
+setattr(mock('autotest.client.shared.error'), 'TestError', Exception)
+setattr(mock('autotest.client.shared.error'), 'TestNAError', Exception)
+setattr(mock('autotest.client.shared.error'), 'AutotestError', Exception)
+mock('autotest.client.shared.service')
+
+
+class SnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        import snapshot
+        self.snapshot = snapshot
+        self.before = snapshot.Snapshot(
+            containers={'c1': ('one', 'Up'), 'c2': ('two', 'Up')},
+            images={'i1': ('foo:latest',)})
+
+    def test_snapshot(self):
+        self.assertEqual(self.before.categories, ['containers', 'images'])
+        self.assertTrue('images' in self.before)
+        self.assertFalse('volumes' in self.before)
+        self.assertEqual(self.before.keys('containers'),
+                         frozenset(['c1', 'c2']))
+        self.assertEqual(self.before.state('images', 'i1'), ('foo:latest',))
+        self.assertRaises(KeyError, self.before.keys, 'volumes')
+        self.assertRaises(ValueError, self.snapshot.Snapshot, bogus={})
+
+    def test_diff(self):
+        after = self.snapshot.Snapshot(
+            containers={'c1': ('one', 'Exited'), 'c3': ('three', 'Up')},
+            images={'i1': ('foo:latest',)},
+            volumes={'v1': ('local', '/v1')})
+        diff = self.before.diff(after)
+        self.assertTrue(diff)
+        self.assertEqual(diff.added, {'containers': ['c3'], 'images': []})
+        self.assertEqual(diff.removed['containers'], ['c2'])
+        self.assertEqual(diff.changed['containers'], ['c1'])
+        self.assertEqual(str(diff), "containers added: c3\n"
+                                    "containers removed: c2\n"
+                                    "containers changed: c1")
+        self.assertFalse(self.before.diff(self.before))
+
+    def test_read_mounts(self):
+        osfd, filename = tempfile.mkstemp()
+        os.write(osfd, "proc /proc proc rw 0 0\n"
+                       "/dev/dm-1 /var/lib/docker/devicemapper/mnt/abc "
+                       "xfs rw 0 0\n")
+        os.close(osfd)
+        proc_mounts = self.snapshot.PROC_MOUNTS
+        self.snapshot.PROC_MOUNTS = filename
+        try:
+            self.assertEqual(self.snapshot.read_mounts(),
+                             {'/var/lib/docker/devicemapper/mnt/abc':
+                              ('/dev/dm-1', 'xfs')})
+            os.unlink(filename)
+            self.assertEqual(self.snapshot.read_mounts(), {})
+        finally:
+            self.snapshot.PROC_MOUNTS = proc_mounts
+
+    def test_from_json(self):
+        self.assertEqual(self.snapshot._volumes_from_json(
+            {'Volumes': [{'Name': 'v1', 'Driver': 'local',
+                          'Mountpoint': '/v1'}]}),
+            {'v1': ('local', '/v1')})
+        self.assertEqual(self.snapshot._volumes_from_json({'Volumes': None}),
+                         {})
+        self.assertEqual(self.snapshot._networks_from_json(
+            [{'Id': 'n1', 'Name': 'bridge', 'Driver': 'bridge'}]),
+            {'n1': ('bridge', 'bridge')})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -23,6 +23,8 @@ from autotest.client.shared.version import get_version
 from autotest.client import test
 import version
 import config
+import metrics
+import snapshot
 from xceptions import DockerTestFail
 from xceptions import DockerTestNAError
 from xceptions import DockerTestError
@@ -220,6 +222,10 @@ class Subtest(SubBase, test.test):
     #: can reassign it to any type needed.
     stuff = None
 
+    #: ``snapshot.Snapshot`` taken by ``initialize()`` when the
+    #: ``docker_snapshot`` option is enabled, otherwise None.
+    initial_snapshot = None
+
     #: Private cache of control.ini's [Control] section contents (do not use!)
     _control_ini = None
 
@@ -298,6 +304,13 @@ class Subtest(SubBase, test.test):
         super(Subtest, self).execute(iterations=self.iterations,
                                      *args, **dargs)
 
+    def _exec(self, args, dargs):
+        """**Do not override**, call ``final_cleanup()`` after cleanup"""
+        try:
+            super(Subtest, self)._exec(args, dargs)
+        finally:
+            self.final_cleanup()
+
     # These methods can optionally be overridden by subclasses
 
     def setup(self):
@@ -316,6 +329,8 @@ class Subtest(SubBase, test.test):
         for key, value in self.config.items():
             msg += '\t\t%s = "%s"\n' % (key, value)
         self.logdebug(msg)
+        if self.config.get('docker_snapshot', False):
+            self.initial_snapshot = snapshot.take(self)
 
     def postprocess_iteration(self):
         """
@@ -324,6 +339,46 @@ class Subtest(SubBase, test.test):
         self.loginfo("postprocess_iteration() #%d of #%d",
                      self.iteration, self.iterations)
 
+    def final_cleanup(self):
+        """
+        Called after ``cleanup()`` of this and all sub-subtests finished,
+        so removed resources and their removal commands are accounted for.
+        """
+        try:
+            self.check_snapshot()
+        finally:
+            self.write_metrics()
+
+    def check_snapshot(self):
+        """
+        Log a warning about docker resources added, removed or changed
+        since ``initial_snapshot``, if one was taken.
+        """
+        if self.initial_snapshot is None:
+            return
+        after = snapshot.take(self, self.initial_snapshot.categories)
+        diff = self.initial_snapshot.diff(after)
+        if diff:
+            self.logwarning("Docker resources differ from before subtest:"
+                            "\n%s", diff)
+
+    def write_metrics(self):
+        """
+        Save docker command latency metrics into results dir., then reset
+        them so the next subtest starts fresh.
+        """
+        if len(metrics.registry) == 0:
+            return
+        path = os.path.join(self.resultsdir, 'docker_metrics.json')
+        try:
+            try:
+                metrics.registry.write_json(path)
+            except (IOError, OSError), detail:
+                self.logwarning("Failed to write %s: %s", path, detail)
+            self.write_test_keyval(metrics.registry.keyvals())
+        finally:
+            metrics.registry.reset()
+
     @property
     def control_config(self):
         """
@@ -29,6 +29,7 @@ import os.path
 import re
 import shutil
 from urllib2 import urlopen
+from dockertest import snapshot
 from dockertest import subtest
 from dockertest.containers import DockerContainers
 from dockertest.dockercmd import DockerCmd, NoFailDockerCmd
@@ -95,11 +96,11 @@ class build_base(subtest.SubSubtest):
 
     def initialize(self):
         super(build_base, self).initialize()
-        # Get the latest container (remove all newly created in cleanup
-        self.sub_stuff['dc'] = dcont = DockerContainers(self)
-        self.sub_stuff['existing_containers'] = dcont.list_container_ids()
+        # Existing resources (remove all newly created in cleanup)
+        self.sub_stuff['dc'] = DockerContainers(self)
         self.sub_stuff['di'] = dimg = DockerImages(self)
-        self.sub_stuff['existing_images'] = dimg.list_imgs_ids()
+        self.sub_stuff['snapshot'] = snapshot.take(self, ('containers',
+                                                          'images'))
         img_name = dimg.get_unique_name()
         # Build definition:
         # build['image_name'] - name
@@ -168,14 +169,12 @@ class build_base(subtest.SubSubtest):
                         "%s" % (build_def['image_name'],
                                 dkrimgs.list_imgs_full_name()))
         # Intermediary images
-        dkrimgs.images_args += " -a"    # list all
-        images = dkrimgs.list_imgs()
-        dkrimgs.images_args = dkrimgs.images_args[:-3]
+        graph = dkrimgs.get_image_graph()
         created_images = RE_IMAGES.findall(build_def['result'].stdout)
         for img_id in created_images:
-            imgs = [_.long_id for _ in images if _.cmp_id(img_id)]
-            self.failif(len(imgs) != 1, "Intermediary image '%s' not present "
-                        "once in images\n%s" % (img_id, images))
+            self.failif(graph.resolve(img_id) is None, "Intermediary image "
+                        "'%s' not present once in images\n%s"
+                        % (img_id, graph.long_ids))
         self.logdebug("%s:\tMain image + %s intermediary images\tOK",
                       build_def['image_name'], len(created_images))
 
@@ -184,30 +183,30 @@ class build_base(subtest.SubSubtest):
         Check that used containers were (not) removed
         """
         # Intermediary containers
-        containers = self.sub_stuff['dc'].list_containers()
+        index = self.sub_stuff['dc'].index_containers()
+        containers = index.items
         created_containers = RE_CONTAINERS.findall(build_def['result'].stdout)
         if build_def.get('intermediary_containers') == 'LAST':
             # Only last one should be present (use this when build fails)
             for cont in created_containers[:-1]:     # All but one exist
-                conts = [_.long_id for _ in containers if _.cmp_id(cont)]
+                conts = index.with_id(cont)
                 self.failif(len(conts) != 0, "Intermediary container '%s' is "
                             "present although it should been removed by build"
                             "\n%s" % (cont, containers))
             # Last one should not
-            conts = [_.long_id for _ in containers
-                     if _.cmp_id(created_containers[-1])]
+            conts = index.with_id(created_containers[-1])
             self.failif(len(conts) != 1, "Intermediary container '%s' not "
                         "present once in containers\n%s"
                         % (created_containers[-1], containers))
         elif build_def.get('intermediary_containers'):    # should be preserved
             for cont in created_containers:
-                conts = [_.long_id for _ in containers if _.cmp_id(cont)]
+                conts = index.with_id(cont)
                 self.failif(len(conts) != 1, "Intermediary container '%s' not "
                             "present once in containers\n%s" % (cont,
                                                                 containers))
         else:   # should not be present
             for cont in created_containers:
-                conts = [_.long_id for _ in containers if _.cmp_id(cont)]
+                conts = index.with_id(cont)
                 self.failif(len(conts) != 0, "Intermediary container '%s' is "
                             "present although it should been removed by build"
                             "\n%s" % (cont, containers))
@@ -233,11 +232,11 @@ class build_base(subtest.SubSubtest):
         """
         Check that during test run expected number of containers were created
         """
-        containers_pre = self.sub_stuff['existing_containers']
-        containers_post = self.sub_stuff['dc'].list_container_ids()
+        changes = self.containers_changed()
         _all = self.config.get('dockerfile_all_containers', 0)
         _new = self.config.get('dockerfile_new_containers', 0)
-        diff = len(containers_post) - len(containers_pre)
+        diff = (len(changes.added['containers']) -
+                len(changes.removed['containers']))
         if _new != 0:
             # No new containers
             self.failif(diff == 0, "No new containers created in build "
@@ -251,10 +250,16 @@ class build_base(subtest.SubSubtest):
         # Other count
         self.failif(diff != _new, "Number of containers before and after "
                     "second build (--rm=False) is not of %s containers higher."
-                    " That's really weird...).\nBefore: %s\nAfter: %s"
-                    % (_new, containers_pre, containers_post))
+                    " That's really weird...).\n%s" % (_new, changes))
         self.logdebug("ALL:\tNumber of created containers\tOK")
 
+    def containers_changed(self):
+        """
+        Return ``snapshot.SnapshotDiff`` of containers since initialize()
+        """
+        after = snapshot.take(self, ('containers',))
+        return self.sub_stuff['snapshot'].diff(after)
+
     def _postprocess_result(self, build_def):
         """
         Go through results and check all containers were created
@@ -274,19 +279,16 @@ class build_base(subtest.SubSubtest):
         super(build_base, self).cleanup()
         # Auto-converts "yes/no" to a boolean
         if self.config['try_remove_after_test']:
-            # Remove all previously non-existing containers
-            for cid in self.sub_stuff['dc'].list_container_ids():
-                if cid in self.sub_stuff['existing_containers']:
-                    continue    # don't remove previously existing ones
-                dcmd = DockerCmd(self, 'rm', ['--force', '--volumes', cid],
-                                 verbose=False)
-                dcmd.execute()
-            dimg = self.sub_stuff['di']
-            # Remove all previously non-existing images
-            for img in dimg.list_imgs_ids():
-                if img in self.sub_stuff['existing_images']:
-                    continue
-                dimg.remove_image_by_id(img)
+            # Remove all previously non-existing containers and images
+            after = snapshot.take(self, ('containers', 'images'))
+            changes = self.sub_stuff['snapshot'].diff(after)
+            removed = self.sub_stuff['dc'].remove_many(
+                changes.added['containers'])
+            removed.update(self.sub_stuff['di'].remove_many(
+                changes.added['images']))
+            for cmdresult in removed.values():
+                if cmdresult is not None and cmdresult.exit_status:
+                    self.logwarning("Cleanup failed: %s", cmdresult)
 
 
 class local_path(build_base):
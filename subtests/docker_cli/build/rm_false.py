@@ -22,11 +22,10 @@ class rm_false(build_base):
 
     def run_once(self):
         super(rm_false, self).run_once()
-        containers_pre = self.sub_stuff['existing_containers']
-        containers_post = self.sub_stuff['dc'].list_container_ids()
-        self.failif(len(containers_pre) != len(containers_post),
+        changes = self.containers_changed()
+        self.failif(len(changes.added['containers']) !=
+                    len(changes.removed['containers']),
                     "Number of containers before and after first build "
-                    "(--rm=True) is not the same.\nBefore: %s\nAfter: %s"
-                    % (containers_pre, containers_post))
+                    "(--rm=True) is not the same.\n%s" % changes)
         self._build_container(self.sub_stuff['builds'][1],
                               [self.config['docker_build_options2']])
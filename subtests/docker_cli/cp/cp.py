@@ -30,6 +30,7 @@ from dockertest.subtest import SubSubtest
 from dockertest.subtest import SubSubtestCaller
 from dockertest.dockercmd import NoFailDockerCmd
 from dockertest.dockercmd import DockerCmd
+from dockertest.dockercmd import DockerCmdBatch
 from dockertest.images import DockerImage
 from dockertest.images import DockerImages
 from dockertest.containers import DockerContainers
@@ -170,20 +171,24 @@ class every_last(CpBase):
         self.sub_stuff['expected_total'] = total
         self.loginfo("Testing copy of %d files from container" % total)
         self.sub_stuff['results'] = {}  # cont_path -> cmdresult
-        # Avoid excessive logging
-        nfdc = NoFailDockerCmd(self, 'cp', verbose=False)
-        nfdc.quiet = True
-        nfiles = 0
-        for index, srcfile in enumerate(self.sub_stuff['lastfiles']):
-            if index % 100 == 0:
-                self.loginfo("Copied %d of %d", index, total)
+        srcfiles = self.sub_stuff['lastfiles'][:self.config['max_files']]
+        cmds = []
+        host_paths = []
+        for index, srcfile in enumerate(srcfiles):
             cont_path = "%s:%s" % (self.sub_stuff['container_name'], srcfile)
-            host_path = self.tmpdir
-            host_fullpath = os.path.join(host_path, os.path.basename(srcfile))
-            nfdc.subargs = [cont_path, host_path]
-            nfdc.execute()
+            # Files of same basename must not race into one directory
+            host_path = os.path.join(self.tmpdir, str(index))
+            os.mkdir(host_path)
+            host_paths.append(host_path)
+            # Avoid excessive logging
+            nfdc = NoFailDockerCmd(self, 'cp', [cont_path, host_path],
+                                   verbose=False)
+            nfdc.quiet = True
+            cmds.append(nfdc)
+        DockerCmdBatch(cmds, fail_fast=True).execute()
+        self.loginfo("Copied %d of %d", len(cmds), total)
+        for srcfile, host_path in zip(srcfiles, host_paths):
+            host_fullpath = os.path.join(host_path,
+                                         os.path.basename(srcfile))
             self.failif(not os.path.isfile(host_fullpath),
                         "Not a file: '%s'" % host_fullpath)
-            nfiles += 1
-            if nfiles >= self.config['max_files']:
-                break
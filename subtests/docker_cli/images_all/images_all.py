@@ -16,15 +16,14 @@ Operational Summary
 #.  Untag test_a1 (verify intermediary images were removed too)
 #.  Untag test_b1 (verify test_b was preserved)
 
-*  Between steps 4-7 verify `docker images` and `docker history`
+*  Between steps 4-7 verify `docker images` and image parents
 """
 
 from dockertest import config, xceptions
 from dockertest.containers import DockerContainers
-from dockertest.dockercmd import DockerCmd, NoFailDockerCmd
+from dockertest.dockercmd import NoFailDockerCmd
 from dockertest.images import DockerImage, DockerImages
 from dockertest.subtest import SubSubtestCaller, SubSubtest
-from autotest.client.shared import error
 
 
 class images_all(SubSubtestCaller):
@@ -79,7 +78,7 @@ class images_all_base(SubSubtest):
         For each test_image from test_images verifies:
         1. Presence in `docker images`
         2. Presence in `docker images --all`
-        3. Presence of parent in `docker history`
+        3. Presence of parent among image's ancestors
 
         test_image compounded of [$long_id, $name, $exists, $tagged, $parents]
         exists, tagged are bools set by test developer
@@ -106,6 +105,8 @@ class images_all_base(SubSubtest):
             return long_id in (_.long_id for _ in images)
         images = self.sub_stuff['di'].list_imgs()
         imagesall = self.sub_stuff['dia'].list_imgs()
+        # Parents of all images, instead of `docker history` of each
+        graph = self.sub_stuff['di'].get_image_graph()
         err_str = lambda: format_err_str(test_images, images, imagesall)
         for image in test_images:
             if image[2:4] == [False, False]:   # Non existing (nowhere)
@@ -134,48 +135,34 @@ class images_all_base(SubSubtest):
                             "'%s' not found in images all:\n%s"
                             % (image[1], err_str()))
             if image[3] and image[4] is not None:
-                history = NoFailDockerCmd(self, 'history',
-                                          ['--no-trunc', '-q', image[0]],
-                                          verbose=False).execute().stdout
+                ancestors = graph.ancestors(image[0])
                 for parent in image[4]:
-                    self.failif(parent not in history, "Parent image '%s' of "
-                                "image '%s' was not found in `docker history`:"
-                                "\n%s\n%s" % (parent, image[0], history,
-                                              err_str()))
+                    self.failif(parent not in ancestors, "Parent image '%s' "
+                                "of image '%s' was not found among its "
+                                "ancestors:\n%s\n%s" % (parent, image[0],
+                                                         ancestors,
+                                                         err_str()))
 
     def _cleanup_containers(self):
         """
         Cleanup the containers defined in self.sub_stuff['containers']
         """
-        for name in self.sub_stuff['containers']:
-            # This test might set this to True, ensure it's false
-            self.sub_stuff['dc'].get_size = False
-            conts = self.sub_stuff['dc'].list_containers_with_name(name)
-            if conts == []:
-                return  # Docker was already removed
-            elif len(conts) > 1:
-                msg = ("Multiple containers match name '%s', not removing any"
-                       " of them...", name)
-                raise xceptions.DockerTestError(msg)
-            DockerCmd(self, 'rm', ['--force', '--volumes', name],
-                      verbose=False).execute()
+        # This test might set this to True, ensure it's false
+        self.sub_stuff['dc'].get_size = False
+        self.sub_stuff['dc'].remove_many(self.sub_stuff['containers'])
 
     def _cleanup_images(self):
         """
         Cleanup the images defined in self.sub_stuff['images']
         """
-        images = self.sub_stuff['di']
-        for image in self.sub_stuff["images"]:
-            all_imgs = (images.list_imgs_full_name() +
-                        images.list_imgs_ids())
-            if image not in all_imgs:
-                continue    # Image already removed
-            try:
-                images.remove_image_by_full_name(image)
-            except error.CmdError, exc:
-                error_text = "tagged in multiple repositories"
-                if error_text not in exc.result_obj.stderr:
-                    raise
+        # Children are removed before parents
+        removed = self.sub_stuff['di'].remove_many(self.sub_stuff["images"])
+        error_text = "tagged in multiple repositories"
+        for cmdresult in removed.values():
+            if (cmdresult is not None and cmdresult.exit_status and
+                    error_text not in cmdresult.stderr):
+                raise xceptions.DockerTestError("Failed removing test image:"
+                                                " %s" % cmdresult)
 
     def cleanup(self):
         super(images_all_base, self).cleanup()
@@ -193,7 +180,7 @@ class two_images_with_parents(images_all_base):
     5. Untag test_a
     6. Untag test_a1 (verify intermediary images were removed too)
     7. Untag test_b1 (verify test_b was preserved)
-    :note: Between steps 4-7 verify `docker images` and `docker history`
+    :note: Between steps 4-7 verify `docker images` and image parents
     """
 
     def initialize(self):
@@ -52,6 +52,8 @@ class import_export_base(SubSubtest):
         export_args.append(import_dkrcmd.command)
         export_import_dkrcmd = NoFailDockerCmd(self, "export", export_args)
         export_import_dkrcmd.verbose = True
+        # Don't hold image in memory, if export_cmd_args doesn't pipe it
+        export_import_dkrcmd.spool_threshold = 1024 * 1024
         self.sub_stuff['export_import_dkrcmd'] = export_import_dkrcmd
 
     def initialize(self):
@@ -68,27 +70,24 @@ class import_export_base(SubSubtest):
         super(import_export_base, self).cleanup()
         # Auto-converts "yes/no" to a boolean
         if self.config['remove_after_test']:
-            for cont in self.sub_stuff["containers"]:
-                dkrcmd = DockerCmd(self, "rm", ['--volumes', '--force', cont])
-                cmdresult = dkrcmd.execute()
+            removed = self.sub_stuff["cont"].remove_many(
+                self.sub_stuff["containers"])
+            for cont, cmdresult in removed.items():
                 msg = (" removed test container: %s" % cont)
-                if cmdresult.exit_status == 0:
+                if cmdresult is None or cmdresult.exit_status == 0:
                     self.logdebug("Successfully" + msg)
                 else:
                     self.logwarning("Failed" + msg)
-            for image in self.sub_stuff["images"]:
-                try:
-                    di = DockerImages(self.parent_subtest)
-                    self.logdebug("Removing image %s", image)
-                    di.remove_image_by_full_name(image)
+            di = DockerImages(self.parent_subtest)
+            removed = di.remove_many(self.sub_stuff["images"])
+            error_text = "tagged in multiple repositories"
+            for image, cmdresult in removed.items():
+                if cmdresult is None or cmdresult.exit_status == 0:
                     self.logdebug("Successfully removed test image: %s",
                                   image)
-                except xceptions.DockerCommandError, e:
-                    error_text = "tagged in multiple repositories"
-                    if error_text not in e.result_obj.stderr:
-                        raise
-                except xceptions.DockerTestError:
-                    pass  # best effort removal, maybe image wasn't there
+                elif error_text not in cmdresult.stderr:
+                    raise xceptions.DockerTestError("Failed removing test "
+                                                    "image: %s" % cmdresult)
 
 
 class simple(import_export_base):
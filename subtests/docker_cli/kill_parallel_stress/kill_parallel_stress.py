@@ -133,18 +133,18 @@ class parallel_stress(kill_base):
         endtime = time.time() + self.config['stress_cmd_timeout']
         line = None
         out = None
+        container_out = Output(container_cmd, 0)
         while endtime > time.time():
             try:
-                out = container_cmd.stdout.splitlines()
+                out = container_out.get(0)
                 for line in [_check % sig for sig in signals_set]:
                     # out is always list in this branch, disable false E1103
                     out.remove(line)    # pylint: disable=E1103
                 break
             except ValueError:
-                pass
+                time.sleep(0.01)
         else:
-            self.fail_missing(_check, signals_set, Output(container_cmd, 0),
-                              line)
+            self.fail_missing(_check, signals_set, container_out, line)
 
     def _destroy_container(self, container_cmd):
         """
@@ -115,17 +115,17 @@ class stress(kill_base):
         endtime = time.time() + timeout
         line = None
         out = None
+        container_out = Output(container_cmd, 0)
         while endtime > time.time():
             try:
-                out = container_cmd.stdout.splitlines()
+                out = container_out.get(0)
                 for line in [_check % sig for sig in signals_set]:
                     out.remove(line)
                 break
             except ValueError:
-                pass
+                time.sleep(0.01)
         else:
-            self.fail_missing(_check, signals_set, Output(container_cmd, 0),
-                              line)
+            self.fail_missing(_check, signals_set, container_out, line)
         # Kill -9
         if kill_cmds[1] is not False:   # Custom kill command
             self.sub_stuff['kill_results'].append(kill_cmds[1].execute())
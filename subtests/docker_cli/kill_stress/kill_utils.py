@@ -28,13 +28,15 @@ SIGNAL_MAP = {1: 'HUP', 2: 'INT', 3: 'QUIT', 4: 'ILL', 5: 'TRAP', 6: 'ABRT',
 class Output(object):   # only containment pylint: disable=R0903
 
     """
-    Wraps object with `.stdout` method and returns only new chars out of it
+    Wraps AsyncDockerCmd and returns only new lines of its stdout
     """
 
     def __init__(self, stuff, idx=None):
         self.stuff = stuff
+        self.cursor = stuff.cursor()
+        self.lines = self.cursor.read_lines()
         if idx is None:
-            self.idx = len(stuff.stdout.splitlines())
+            self.idx = len(self.lines)
         else:
             self.idx = idx
 
@@ -45,9 +47,9 @@ class Output(object):   # only containment pylint: disable=R0903
         """
         if idx is None:
             idx = self.idx
-        out = self.stuff.stdout.splitlines()
-        self.idx = len(out)
-        return out[idx:]
+        self.lines.extend(self.cursor.read_lines())
+        self.idx = len(self.lines)
+        return self.lines[idx:]
 
 
 class kill_base(subtest.SubSubtest):
@@ -350,7 +352,7 @@ class kill_check_base(kill_base):
                         out.remove(line)
                     break
                 except ValueError:
-                    pass
+                    time.sleep(0.01)
             else:
                 self.fail_missing(_check, stopped_log, container_out, line)
 
@@ -362,7 +364,7 @@ class kill_check_base(kill_base):
         check = _check % signal
         output_matches = lambda: check in container_out.get(_idx)
         # Wait until the signal gets logged
-        if wait_for(output_matches, timeout, step=0) is None:
+        if wait_for(output_matches, timeout, step=0.01) is None:
             msg = ("Signal %s not handled inside container.\nExpected "
                    "output:\n  %s\nActual container output:\n  %s"
                    % (signal, check,
@@ -20,7 +20,7 @@ Operational Summary
 import os
 import time
 from autotest.client import utils
-from dockertest import config, xceptions
+from dockertest import config
 from dockertest.containers import DockerContainers
 from dockertest.dockercmd import DockerCmd, AsyncDockerCmd
 from dockertest.images import DockerImage
@@ -75,16 +75,20 @@ class InteractiveAsyncDockerCmd(AsyncDockerCmd):
 class Output(object):   # only containment pylint: disable=R0903
 
     """
-    Wraps object with `.stdout` method and returns only new chars out of it
+    Wraps AsyncDockerCmd and returns only new lines of its stdout/stderr
     """
 
     def __init__(self, stuff, idx=None):
         self.stuff = stuff
+        self.cursor = stuff.cursor()
+        self.errcursor = stuff.cursor(stderr=True)
+        self.lines = self.cursor.read_lines()
+        self.errlines = self.errcursor.read_lines()
         if idx is None:
-            self.idx = len(stuff.stdout.splitlines())
+            self.idx = len(self.lines)
         else:
             self.idx = idx
-        self.erridx = len(stuff.stderr.splitlines())
+        self.erridx = len(self.errlines)
 
     def get(self, idx=None):
         """
@@ -93,20 +97,20 @@ class Output(object):   # only containment pylint: disable=R0903
         """
         if idx is None:
             idx = self.idx
-        out = self.stuff.stdout.splitlines()
-        self.idx = len(out)
-        return out[idx:]
+        self.lines.extend(self.cursor.read_lines())
+        self.idx = len(self.lines)
+        return self.lines[idx:]
 
     def geterr(self, idx=None):
         """
         :param idx: Override last index
-        :return: Output of stuff.stdout from idx (or last read)
+        :return: Output of stuff.stderr from idx (or last read)
         """
         if idx is None:
             idx = self.erridx
-        out = self.stuff.stderr.splitlines()
-        self.erridx = len(out)
-        return out[idx:]
+        self.errlines.extend(self.errcursor.read_lines())
+        self.erridx = len(self.errlines)
+        return self.errlines[idx:]
 
 
 class logs_follow(SubSubtestCaller):
@@ -145,16 +149,7 @@ class logs_follow_base(SubSubtest):
         """
         Cleanup the containers defined in self.sub_stuff['containers']
         """
-        for name in self.sub_stuff['containers']:
-            conts = self.sub_stuff['dc'].list_containers_with_name(name)
-            if conts == []:
-                return  # Docker was already removed
-            elif len(conts) > 1:
-                msg = ("Multiple containers match name '%s', not removing any"
-                       " of them...", name)
-                raise xceptions.DockerTestError(msg)
-            DockerCmd(self, 'rm', ['--force', '--volumes', name],
-                      verbose=False).execute()
+        self.sub_stuff['dc'].remove_many(self.sub_stuff['containers'])
 
     def _cleanup_async_processes(self):
         """
@@ -265,6 +260,7 @@ class simple_base(logs_follow_base):
                         % (line, error_msg(log_us)))
         # Start docker logs without follow and compare output
         log2 = DockerCmd(self, 'logs', [name], verbose=False)
+        log2.spool_threshold = 1024 * 1024
         log_us['log2'] = log2
         log2.execute()
         match = lambda: _output_matches(log1, log2)
@@ -291,6 +287,7 @@ class simple_base(logs_follow_base):
         log1.wait(10)
         # Start docker logs without follow and compare output
         log3 = DockerCmd(self, 'logs', [name], verbose=False)
+        log3.spool_threshold = 1024 * 1024
         log_us['log3'] = log3
         log3.execute()
         match = lambda: _output_matches(log1, log3)
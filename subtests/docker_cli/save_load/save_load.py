@@ -20,7 +20,7 @@ from autotest.client import utils
 from autotest.client.shared import error
 from dockertest import subtest, xceptions
 from dockertest.containers import DockerContainers
-from dockertest.dockercmd import DockerCmd, NoFailDockerCmd
+from dockertest.dockercmd import DockerCmd
 from dockertest.images import DockerImage, DockerImages
 from dockertest.output import OutputGood
 from dockertest.subtest import SubSubtest
@@ -91,29 +91,21 @@ class save_load_base(SubSubtest):
     def cleanup(self):
         super(save_load_base, self).cleanup()
         # Auto-converts "yes/no" to a boolean
-        containers = self.sub_stuff['cont']
         if self.config['remove_after_test']:
-            for cont in self.sub_stuff["containers"]:
-                conts = containers.list_containers_with_name(cont)
-                if conts == []:
-                    return  # container doesn't exist, clean
-                elif len(conts) > 1:
-                    msg = ("Multiple containers matches name %s, not "
-                           "removing any of them...", cont)
-                    raise xceptions.DockerTestError(msg)
-                NoFailDockerCmd(self, 'rm', ['--force', '--volumes', cont],
-                                verbose=False).execute()
-            for image in self.sub_stuff["images"]:
-                try:
-                    dkrimg = self.sub_stuff['img']
-                    self.logdebug("Removing image %s", image)
-                    dkrimg.remove_image_by_full_name(image)
-                    self.logdebug("Successfully removed test image: %s",
-                                  image)
-                except error.CmdError, exc:
-                    error_text = "tagged in multiple repositories"
-                    if error_text not in exc.result_obj.stderr:
-                        raise
+            # Containers and images may share names, keep both results
+            cmdresults = self.sub_stuff['cont'].remove_many(
+                self.sub_stuff["containers"]).values()
+            cmdresults += self.sub_stuff['img'].remove_many(
+                self.sub_stuff["images"]).values()
+            error_text = "tagged in multiple repositories"
+            failed = [cmdresult for cmdresult in cmdresults
+                      if cmdresult is not None and cmdresult.exit_status and
+                      error_text not in cmdresult.stderr]
+            if failed:
+                raise xceptions.DockerTestError("Cleanup failed:\n%s"
+                                                % "\n".join(str(cmdresult)
+                                                            for cmdresult
+                                                            in failed))
 
 
 class simple(save_load_base):
@@ -170,6 +162,8 @@ class simple(save_load_base):
                            [self.sub_stuff['save_ar']],
                            verbose=True)
         dkrcmd.verbose = True
+        # Don't hold image in memory, if save_cmd doesn't redirect it
+        dkrcmd.spool_threshold = 1024 * 1024
         self.sub_stuff['cmdresult_save'] = dkrcmd.execute()
 
         if self.sub_stuff['cmdresult_save'].exit_status != 0:
@@ -305,6 +299,8 @@ class stressed_load(save_load_base):
             save_cmd = self.config['save_cmd']
             subargs = [save_cmd % {"image": rand_name, "tmpdir": self.tmpdir}]
             dkrcmd = DockerCmd(self, 'save', subargs, verbose=False)
+            # Don't hold image in memory, if save_cmd doesn't redirect it
+            dkrcmd.spool_threshold = 1024 * 1024
             self.sub_stuff['cmdresults_save'].append(dkrcmd.execute())
             if self.sub_stuff['cmdresults_save'][-1].exit_status != 0:
                 # Pass error to postprocess